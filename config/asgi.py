@@ -3,6 +3,9 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run with an ASGI server (e.g. ``uvicorn config.asgi:application``) to serve
+the streaming endpoints such as the staff requests badge.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
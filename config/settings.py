@@ -21,6 +21,56 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 GIGACHAT_CERTS = os.path.join(BASE_DIR, 'certs', 'russian_trusted_root_ca.cer')
 GIGACHAT_TIMEOUT = 30  # секунд
+GIGACHAT_SCOPE = "GIGACHAT_API_PERS"
+GIGACHAT_BASE_URL = os.getenv("GIGACHAT_BASE_URL")  # по умолчанию - адрес из SDK
+GIGACHAT_AUTH_URL = os.getenv("GIGACHAT_AUTH_URL")
+GIGACHAT_MAX_CONNECTIONS = 20  # соединений в пуле клиента на процесс
+SYMPTOM_CHECKER_ASYNC = os.getenv("SYMPTOM_CHECKER_ASYNC") == "1"  # включать под ASGI
+
+# Кэш ответов ИИ по нормализованной жалобе
+SYMPTOM_CACHE_SIZE = 1000  # записей в памяти процесса (LRU)
+SYMPTOM_CACHE_TTL = 7 * 24 * 60 * 60  # секунд; так же ограничивается поиск в SymptomAnalysis
+# отбрасывать окончания слов при нормализации; после изменения сохранённые хэши жалоб
+# не совпадут с новыми - пересчитать: python manage.py rehash_symptom_queries
+SYMPTOM_CACHE_STEMMING = True
+SYMPTOM_CACHE_REPORT_EVERY = 100  # раз в сколько запросов писать в лог hit/miss
+
+# Локальный классификатор жалоб (до обращения к GigaChat)
+TRIAGE_LOCAL_ENABLED = True
+TRIAGE_MIN_SCORE = 0.5  # минимальное косинусное сходство с профилем специалиста
+TRIAGE_MIN_MARGIN = 0.3  # отрыв от второго по сходству специалиста
+TRIAGE_MIN_EXAMPLES = 5  # сколько ответов ИИ по специалисту нужно в истории
+TRIAGE_HISTORY_LIMIT = 10000  # последних записей SymptomAnalysis для обучения
+TRIAGE_MODEL_TTL = 60 * 60  # секунд до перестроения модели
+
+# Подбор врачей по рекомендации ИИ
+SPECIALIZATION_INDEX_TTL = 10 * 60  # секунд до перестроения индекса специальностей
+SYMPTOM_CHECKER_SLOTS_PER_DOCTOR = 3  # ближайших свободных слотов на врача
+
+# Ограничение одновременных обращений к ИИ (слоты общие для процессов через CACHES)
+LLM_MAX_CONCURRENT = 8  # на все процессы
+LLM_MAX_CONCURRENT_PER_PROCESS = 4
+LLM_QUEUE_SIZE = 8  # ожидающих запросов на процесс, сверх - сразу 503
+LLM_QUEUE_TIMEOUT = 5  # секунд ожидания свободного слота
+LLM_SLOT_LEASE = GIGACHAT_TIMEOUT * 2  # слот упавшего процесса освобождается сам
+LLM_RETRY_AFTER = 10  # секунд, значение Retry-After при перегрузке
+# Квоты (token bucket): (запросов в запасе, секунд на полное восстановление)
+LLM_QUOTA_PER_IP = (10, 10 * 60)
+LLM_QUOTA_PER_USER = (20, 60 * 60)
+
+# Админский список расписания: слотов на страницу (листание по ключу врач/дата/время)
+ADMIN_SCHEDULE_PAGE_SIZE = 200
+ADMIN_PATIENTS_PAGE_SIZE = 50  # пациентов на странице списка
+PATIENT_SEARCH_CANDIDATES = 200  # совпадений поиска (самых новых), среди которых идёт ранжирование
+
+# Свободное время для записи пациента: страница по неделям и API для календаря
+PATIENT_SCHEDULE_DAYS = 7  # дней на странице свободного времени
+AVAILABILITY_API_MAX_DAYS = 31  # дней в одном ответе
+AVAILABILITY_API_MAX_AGE = 30  # секунд, Cache-Control
+
+# Кэш страниц сайта (ключи по версиям моделей, см. core/utils/page_cache.py)
+HOME_CACHE_TIMEOUT = 24 * 60 * 60  # секунд, карточки главной страницы
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60  # секунд, списки врачей, услуг, акций и контакты
 
 LOGGING = {
     'version': 1,
@@ -34,6 +84,10 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'INFO',
         },
+        'core.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
     },
 }
 
@@ -68,6 +122,7 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'core.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,6 +133,12 @@ MIDDLEWARE = [
     'allauth.account.middleware.AccountMiddleware',
 ]
 
+# Замеры запросов (SQL, шаблоны, внешние вызовы): заголовок Server-Timing и лог core.profiling
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING") == "1"
+REQUEST_PROFILING_SAMPLE_RATE = float(os.getenv("REQUEST_PROFILING_SAMPLE_RATE", "1"))  # доля запросов
+REQUEST_PROFILING_SLOW_MS = 500  # медленные запросы пишутся в лог как WARNING
+REQUEST_PROFILING_HEADERS = DEBUG  # Server-Timing раскрывает внутренности - только для отладки
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -109,6 +170,29 @@ DATABASES = {
 }
 
 
+# Кэш общий для всех процессов: счётчик заявок, слоты и квоты ИИ, версии закэшированных страниц.
+# REDIS_URL (нужен пакет redis) - Redis; иначе таблица django_cache в БД (создаётся миграцией core).
+# С таблицей в БД каждое чтение кэша - SQL-запрос: страница из кэша - 2 SELECT, ответ 304
+# счётчика заявок - 1 SELECT, поток SSE - 1 SELECT за опрос на вкладку. Для продакшена нужен Redis
+# (python manage.py check --deploy предупреждает). Кэш в памяти процесса (LocMemCache) не подходит:
+# изменения видны только в своём процессе
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -200,5 +284,24 @@ MESSAGE_TAGS = {
 
 TELEGRAM_BOT_TOKEN=os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID=os.getenv("TELEGRAM_CHAT_ID")
-
-GIGACHAT_CREDENTIALS=os.getenv("GIGACHAT_KEY")
\ No newline at end of file
+TELEGRAM_API_URL=os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = 5  # секунд
+
+# Очередь уведомлений Telegram (команда telegram_worker)
+TELEGRAM_OUTBOX_MAX_ATTEMPTS = 8
+TELEGRAM_DIGEST_THRESHOLD = 3  # с какого числа заявок слать одним дайджестом
+TELEGRAM_BACKOFF_BASE = 5  # секунд, удваивается с каждой попыткой
+TELEGRAM_BACKOFF_MAX = 600
+TELEGRAM_OUTBOX_LEASE = 300  # секунд на отправку пачки; потом её может забрать другой обработчик
+
+# Рассылки акций (команда send_promotions)
+PROMOTION_CAMPAIGN_LEASE = 600  # секунд на пачку писем; потом рассылку может продолжить другой обработчик
+
+GIGACHAT_CREDENTIALS=os.getenv("GIGACHAT_KEY")
+
+# Поток заявок для бейджа (SSE, только под ASGI: uvicorn config.asgi:application).
+# Версия и число заявок - в общем кэше (CACHES), изменения видны всем процессам
+# секунд между проверками версии в кэше; с таблицей в БД реже - каждая проверка это запрос
+REQUESTS_STREAM_POLL_INTERVAL = 1 if REDIS_URL else 10
+REQUESTS_STREAM_HEARTBEAT = 25  # секунд между keep-alive комментариями
+REQUESTS_STREAM_LIFETIME = 300  # секунд, после чего браузер переподключается
\ No newline at end of file
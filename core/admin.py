@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (HeroCard, SmallCard, SquareCard, 
                      Doctor, Services, Promotion, 
                      Contacts, Schedule, Review,
-                     SymptomAnalysis
+                     SymptomAnalysis, TelegramOutbox,
+                     PromotionCampaign, ShiftTemplate
                      )
 
 admin.site.register(HeroCard)
@@ -17,11 +18,30 @@ admin.site.register(Review)
 
 @admin.register(SymptomAnalysis)
 class SymptomAnalysisAdmin(admin.ModelAdmin):
-    list_display = ("created_at", "user_query_short", "recommended_doctor")
-    list_filter = ("created_at", "recommended_doctor")
+    list_display = ("created_at", "user_query_short", "recommended_doctor", "source")
+    list_filter = ("created_at", "source", "recommended_doctor")
     readonly_fields = ("created_at", "user_query", "ai_result")
 
     def user_query_short(self, obj):
         return obj.user_query[:50] + "..."
     user_query_short.short_description = "Жалоба"
 
+
+@admin.register(TelegramOutbox)
+class TelegramOutboxAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    readonly_fields = ("created_at", "sent_at", "last_error")
+
+
+@admin.register(PromotionCampaign)
+class PromotionCampaignAdmin(admin.ModelAdmin):
+    list_display = ("promotion", "status", "sent_count", "failed_count", "started_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = ("last_user_id", "sent_count", "failed_count", "started_at", "finished_at")
+
+
+@admin.register(ShiftTemplate)
+class ShiftTemplateAdmin(admin.ModelAdmin):
+    list_display = ("doctor", "weekday", "start_time", "end_time", "slot_minutes", "break_start", "break_end")
+    list_filter = ("weekday", "doctor")
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+# Счётчик заявок, слоты ИИ и версии закэшированных страниц должны быть общими для процессов
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG or backend not in LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"Кэш {backend} не общий для процессов сервера",
+            hint="Укажите REDIS_URL или используйте DatabaseCache (CACHES в config/settings.py)",
+            id="core.W001",
+        )
+    ]
+
+
+# Таблица кэша в БД работает, но каждое чтение кэша - SQL-запрос (см. CACHES в config/settings.py)
+@register(Tags.caches, deploy=True)
+def database_cache_check(app_configs, **kwargs):
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend != "django.core.cache.backends.db.DatabaseCache":
+        return []
+    return [
+        Warning(
+            "Кэш в таблице БД: каждое чтение кэша - SQL-запрос (страница из кэша - 2 SELECT, "
+            "поток заявок - SELECT за опрос на каждую вкладку)",
+            hint="Укажите REDIS_URL",
+            id="core.W002",
+        )
+    ]
@@ -0,0 +1,133 @@
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Doctor, Schedule
+from users.models import CustomUser
+
+
+DEFAULT_BASELINE = settings.BASE_DIR / "benchmarks" / "views_baseline.json"
+
+
+class Command(BaseCommand):
+    help = "Замеряет время ответа (p50/p95) и число SQL-запросов ключевых страниц"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Замеров на страницу")
+        parser.add_argument("--warmup", type=int, default=2, help="Прогревочных запросов (не учитываются)")
+        parser.add_argument("--views", nargs="+", help="Только указанные страницы")
+        parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Файл с эталонными результатами")
+        parser.add_argument("--save-baseline", action="store_true", help="Записать результаты как эталон")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимый рост p95 (доля)")
+
+    def handle(self, *args, **options):
+        pages = self.pages()
+        if options["views"]:
+            unknown = set(options["views"]) - set(pages)
+            if unknown:
+                raise CommandError(f"Неизвестные страницы: {', '.join(sorted(unknown))}. Доступны: {', '.join(pages)}")
+            pages = {name: pages[name] for name in options["views"]}
+
+        # Тестовый клиент обращается к хосту testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            results = {name: self.measure(*page, options) for name, page in pages.items()}
+
+        baseline = self.load_baseline(options["baseline"])
+        regressions = self.report(results, baseline, options["tolerance"])
+
+        if options["save_baseline"]:
+            path = Path(options["baseline"])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump({**baseline, **results}, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Эталон записан: {options['baseline']}")
+        elif regressions:
+            raise CommandError(f"Регресс относительно эталона: {', '.join(regressions)}")
+
+    # Страница -> (URL, пользователь или None)
+    def pages(self):
+        doctor = Doctor.objects.annotate(slots=Count("schedules")).order_by("-slots").first()
+        staff = CustomUser.objects.filter(is_staff=True).order_by("id").first()
+        patient_id = (
+            Schedule.objects.filter(booked_by__isnull=False)
+            .values("booked_by").annotate(visits=Count("id")).order_by("-visits")
+            .values_list("booked_by", flat=True).first()
+        )
+        patient = CustomUser.objects.filter(id=patient_id).first() or staff
+
+        if not doctor or not staff:
+            raise CommandError("Нет врачей или администратора - сначала выполните generate_clinic_data")
+
+        return {
+            "home": (reverse("home"), None),
+            "doctors_list": (reverse("doctors_list"), None),
+            "doctor_detail": (reverse("doctor_detail", args=[doctor.slug]), None),
+            "available_schedule": (reverse("users:available_schedule"), patient),
+            "admin_schedule_list": (reverse("users:admin_schedule_list"), staff),
+            "patient_search": (reverse("users:search_patients") + "?q=Иван", staff),
+            "my_appointments": (reverse("users:my_appointments"), patient),
+        }
+
+    def measure(self, url, user, options):
+        client = Client()
+        if user:
+            client.force_login(user)
+
+        for _ in range(options["warmup"]):
+            client.get(url)
+
+        timings = []
+        queries = 0
+        for _ in range(options["repeat"]):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url}: ответ {response.status_code}")
+            queries = len(context.captured_queries)
+
+        return {
+            "p50": round(statistics.median(timings), 2),
+            "p95": round(percentile(timings, 95), 2),
+            "queries": queries,
+        }
+
+    def load_baseline(self, path):
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def report(self, results, baseline, tolerance):
+        regressions = []
+        self.stdout.write(f"{'Страница':<22}{'p50, мс':>10}{'p95, мс':>10}{'SQL':>6}  Эталон")
+        for name, result in results.items():
+            line = f"{name:<22}{result['p50']:>10.1f}{result['p95']:>10.1f}{result['queries']:>6}"
+            base = baseline.get(name)
+            if base:
+                change = (result["p95"] - base["p95"]) / base["p95"] if base["p95"] else 0
+                line += f"  p95 {change:+.0%}, SQL {result['queries'] - base['queries']:+d}"
+                if change > tolerance or result["queries"] > base["queries"]:
+                    regressions.append(name)
+                    line += "  РЕГРЕСС"
+            self.stdout.write(line)
+        return regressions
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * percent / 100
+    lower = int(index)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (index - lower)
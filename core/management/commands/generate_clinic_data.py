@@ -0,0 +1,242 @@
+import random
+import time as time_module
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Doctor, Review, Schedule, SymptomAnalysis
+from core.utils.availability import refresh_doctor_availability
+from core.utils.pending_requests import reconcile_pending_count
+from core.utils.ratings import recompute_doctor_ratings
+from core.utils.symptom_cache import query_hash
+from users.models import CustomUser
+
+
+# Синтетические записи помечаются префиксом (для повторной генерации с --clear)
+PREFIX = "synthetic"
+
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Фёдоров"]
+FIRST_NAMES = {
+    "male": ["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Иван", "Михаил"],
+    "female": ["Анна", "Мария", "Елена", "Ольга", "Наталья", "Татьяна", "Ирина", "Екатерина"],
+}
+PATRONYMICS = {
+    "male": ["Александрович", "Дмитриевич", "Сергеевич", "Андреевич", "Иванович"],
+    "female": ["Александровна", "Дмитриевна", "Сергеевна", "Андреевна", "Ивановна"],
+}
+SPECIALIZATIONS = ["Терапевт", "ЛОР", "Невролог", "Кардиолог", "Хирург", "Офтальмолог", "Дерматолог", "Гастроэнтеролог"]
+COMPLAINTS = {
+    "Терапевт": ["температура и слабость", "кашель и насморк третий день", "ломит всё тело, знобит"],
+    "ЛОР": ["болит горло при глотании", "заложен нос и стреляет в ухе", "осип голос"],
+    "Невролог": ["часто болит голова", "немеют пальцы рук", "головокружение по утрам"],
+    "Кардиолог": ["колет в груди при нагрузке", "скачет давление", "сильное сердцебиение"],
+    "Хирург": ["болит живот справа внизу", "нарывает палец", "ушиб колена, отёк"],
+    "Офтальмолог": ["слезятся и краснеют глаза", "ухудшилось зрение", "песок в глазах"],
+    "Дерматолог": ["сыпь на руках и зуд", "шелушится кожа", "появилось пятно на спине"],
+    "Гастроэнтеролог": ["изжога после еды", "тяжесть в желудке", "горечь во рту по утрам"],
+}
+REVIEW_COMMENTS = ["Внимательный врач", "Всё объяснил", "Помогло лечение", "Долго ждал приёма", ""]
+
+# Доли статусов: прошедшие слоты и будущие
+PAST_STATUSES = (["completed", "cancelled", "closed", "available"], [70, 10, 5, 15])
+FUTURE_STATUSES = (["available", "booked", "confirmed", "closed"], [65, 10, 20, 5])
+SLOT_MINUTES = 30
+WORK_HOURS = (9, 18)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Заполняет базу синтетическими данными клиники для нагрузочных замеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=30)
+        parser.add_argument("--patients", type=int, default=200000)
+        parser.add_argument("--years", type=float, default=2, help="Глубина графика в прошлое (лет); вперёд - 60 дней")
+        parser.add_argument("--reviews", type=int, default=20000)
+        parser.add_argument("--analyses", type=int, default=20000)
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Строк на один bulk_create")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--clear", action="store_true", help="Удалить ранее сгенерированные данные")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.chunk_size = options["chunk_size"]
+
+        if options["clear"]:
+            self.clear()
+
+        started = time_module.perf_counter()
+        self.create_staff()
+        patient_ids = self.create_patients(options["patients"])
+        doctors = self.create_doctors(options["doctors"])
+        visits = self.create_schedule(doctors, patient_ids, options["years"])
+        self.create_reviews(visits, options["reviews"])
+        self.create_analyses(options["analyses"])
+
+        # bulk_create не вызывает сигналы - пересчитываем число заявок, сводку и рейтинги врачей
+        reconcile_pending_count()
+        refresh_doctor_availability()
+        recompute_doctor_ratings()
+        self.stdout.write(f"Готово за {time_module.perf_counter() - started:.1f} с")
+
+    def report(self, name, count, started):
+        self.stdout.write(f"{name}: {count} ({time_module.perf_counter() - started:.1f} с)")
+
+    def bulk_create(self, model, objects):
+        count = 0
+        for chunk in chunked(objects, self.chunk_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.chunk_size)
+            count += len(chunk)
+        return count
+
+    def clear(self):
+        # Слоты, отзывы и анализы удаляются каскадно или по пометке
+        Doctor.objects.filter(slug__startswith=f"{PREFIX}-").delete()
+        CustomUser.objects.filter(username__startswith=f"{PREFIX}_").delete()
+        SymptomAnalysis.objects.filter(user_query__startswith=f"[{PREFIX}]").delete()
+        self.stdout.write("Ранее сгенерированные данные удалены")
+
+    def create_staff(self):
+        CustomUser.objects.get_or_create(
+            username=f"{PREFIX}_admin",
+            defaults={"role": "admin", "is_staff": True, "password": make_password(f"{PREFIX}_admin")},
+        )
+
+    def create_patients(self, count):
+        started = time_module.perf_counter()
+        first_id = CustomUser.objects.filter(username__startswith=f"{PREFIX}_patient_").count()
+        # Хэш пароля считается один раз - иначе генерация упирается в PBKDF2
+        password = make_password(f"{PREFIX}_patient")
+        today = timezone.localdate()
+
+        def patients():
+            for number in range(first_id, first_id + count):
+                gender = self.random.choice(["male", "female"])
+                last_name = self.random.choice(LAST_NAMES) + ("а" if gender == "female" else "")
+                yield CustomUser(
+                    username=f"{PREFIX}_patient_{number}",
+                    email=f"{PREFIX}_patient_{number}@example.com",
+                    password=password,
+                    role="patient",
+                    last_name=last_name,
+                    first_name=self.random.choice(FIRST_NAMES[gender]),
+                    patronymic=self.random.choice(PATRONYMICS[gender]),
+                    gender=gender,
+                    birth_date=today - timedelta(days=self.random.randint(18 * 365, 85 * 365)),
+                    phone=f"+7900{number:07d}",
+                    phone_key=f"+7900{number:07d}",
+                    subscribe_promotions=self.random.random() < 0.3,
+                )
+
+        self.report("Пациенты", self.bulk_create(CustomUser, patients()), started)
+        return list(
+            CustomUser.objects.filter(username__startswith=f"{PREFIX}_patient_").values_list("id", flat=True)
+        )
+
+    def create_doctors(self, count):
+        started = time_module.perf_counter()
+        first_id = Doctor.objects.filter(slug__startswith=f"{PREFIX}-").count()
+        doctors = []
+        for number in range(first_id, first_id + count):
+            gender = self.random.choice(["male", "female"])
+            doctors.append(Doctor(
+                last_name=self.random.choice(LAST_NAMES) + ("а" if gender == "female" else ""),
+                first_name=self.random.choice(FIRST_NAMES[gender]),
+                patronymic=self.random.choice(PATRONYMICS[gender]),
+                specialization=SPECIALIZATIONS[number % len(SPECIALIZATIONS)],
+                start_work_year=self.random.randint(1985, 2020),
+                # slug задаётся явно: Doctor.save() при bulk_create не вызывается
+                slug=f"{PREFIX}-doctor-{number}",
+            ))
+        Doctor.objects.bulk_create(doctors)
+        self.report("Врачи", count, started)
+        return list(Doctor.objects.filter(slug__in=[doctor.slug for doctor in doctors]))
+
+    def create_schedule(self, doctors, patient_ids, years):
+        started = time_module.perf_counter()
+        today = timezone.localdate()
+        first_day = today - timedelta(days=int(years * 365))
+        last_day = today + timedelta(days=60)
+        times = []
+        current = datetime.combine(today, time(WORK_HOURS[0]))
+        while current.hour < WORK_HOURS[1]:
+            end = current + timedelta(minutes=SLOT_MINUTES)
+            times.append((current.time(), end.time()))
+            current = end
+
+        # (врач, пациент) завершённых приёмов - для правдоподобных отзывов
+        visits = []
+
+        def slots():
+            for doctor in doctors:
+                day = first_day
+                while day <= last_day:
+                    # Выходные врача
+                    if day.weekday() < 5 or doctor.id % 3 == 0:
+                        statuses, weights = PAST_STATUSES if day < today else FUTURE_STATUSES
+                        for start_time, end_time in times:
+                            status = self.random.choices(statuses, weights)[0]
+                            booked_by = None
+                            if status in ("completed", "cancelled", "booked", "confirmed") and patient_ids:
+                                booked_by = self.random.choice(patient_ids)
+                                if status == "completed":
+                                    visits.append((doctor.id, booked_by))
+                            yield Schedule(
+                                doctor=doctor,
+                                date=day,
+                                start_time=start_time,
+                                end_time=end_time,
+                                status=status,
+                                booked_by_id=booked_by,
+                                completed_at=(
+                                    timezone.make_aware(datetime.combine(day, end_time))
+                                    if status == "completed" else None
+                                ),
+                            )
+                    day += timedelta(days=1)
+
+        self.report("Слоты графика", self.bulk_create(Schedule, slots()), started)
+        return visits
+
+    def create_reviews(self, visits, count):
+        started = time_module.perf_counter()
+        if not visits:
+            return
+        picked = self.random.sample(visits, min(count, len(visits)))
+        reviews = (
+            Review(
+                doctor_id=doctor_id,
+                patient_id=patient_id,
+                rating=self.random.choices([5, 4, 3, 2, 1], [55, 25, 10, 5, 5])[0],
+                comment=self.random.choice(REVIEW_COMMENTS),
+                verified=True,
+            )
+            for doctor_id, patient_id in picked
+        )
+        self.report("Отзывы", self.bulk_create(Review, reviews), started)
+
+    def create_analyses(self, count):
+        started = time_module.perf_counter()
+
+        def analyses():
+            for _ in range(count):
+                doctor = self.random.choice(SPECIALIZATIONS)
+                complaint = f"[{PREFIX}] {self.random.choice(COMPLAINTS[doctor])}"
+                yield SymptomAnalysis(
+                    user_query=complaint,
+                    ai_result=f"Рекомендуем обратиться к специалисту: {doctor}",
+                    recommended_doctor=doctor,
+                    query_hash=query_hash(complaint),
+                )
+
+        self.report("Анализы симптомов", self.bulk_create(SymptomAnalysis, analyses()), started)
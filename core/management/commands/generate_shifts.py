@@ -0,0 +1,54 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import Doctor
+from core.utils.shifts import generate_shift_slots
+
+
+class Command(BaseCommand):
+    help = "Создаёт слоты графика по недельным шаблонам смен (существующие слоты не меняются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Первый день (по умолчанию сегодня)")
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Последний день включительно")
+        parser.add_argument("--weeks", type=int, default=4, help="Сколько недель, если не указан --to")
+        parser.add_argument("--doctor", nargs="+", help="Только врачи с этими slug")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Строк на один bulk_create")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет создано")
+
+    def handle(self, *args, **options):
+        date_from = options["date_from"] or timezone.localdate()
+        date_to = options["date_to"] or date_from + timedelta(weeks=options["weeks"], days=-1)
+        if date_to < date_from:
+            raise CommandError("Дата окончания раньше даты начала")
+
+        doctors = Doctor.objects.all()
+        if options["doctor"]:
+            doctors = doctors.filter(slug__in=options["doctor"])
+            missing = set(options["doctor"]) - set(doctors.values_list("slug", flat=True))
+            if missing:
+                raise CommandError(f"Нет врачей: {', '.join(sorted(missing))}")
+        names = {doctor.id: str(doctor) for doctor in doctors}
+
+        started = time.perf_counter()
+        result = generate_shift_slots(
+            date_from, date_to,
+            doctor_ids=list(names) if options["doctor"] else None,
+            dry_run=options["dry_run"],
+            chunk_size=options["chunk_size"],
+        )
+
+        self.stdout.write(f"Период: {date_from} - {date_to}")
+        for doctor_id in sorted(result["to_create"].keys() | result["skipped"].keys(), key=lambda pk: names.get(pk, "")):
+            self.stdout.write(
+                f"{names.get(doctor_id, doctor_id)}: +{result['to_create'][doctor_id]}, "
+                f"уже есть {result['skipped'][doctor_id]}"
+            )
+        total = sum(result["to_create"].values())
+        if options["dry_run"]:
+            self.stdout.write(f"Будет создано слотов: {total} (пробный запуск, база не изменена)")
+        else:
+            self.stdout.write(f"Создано слотов: {result['created']} за {time.perf_counter() - started:.1f} с")
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import CampaignFailure, Review, Schedule
+from core.utils.phones import normalize_phone
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Приводит телефоны пациентов к виду +7XXXXXXXXXX, заполняет phone_key "
+        "и сливает гостевые записи с одинаковым номером"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Строк на один bulk_update")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет изменено")
+
+    def handle(self, *args, **options):
+        self.dry_run = options["dry_run"]
+        groups = self.patient_groups(options["chunk_size"])
+
+        merged = 0
+        conflicts = {}
+        for key, patients in groups.items():
+            if len(patients) < 2:
+                continue
+            survivor, duplicates, active = self.split(patients)
+            if duplicates:
+                merged += len(duplicates)
+                self.stdout.write(f"{key}: записи {', '.join(str(pk) for pk in duplicates)} -> {survivor}")
+                if not self.dry_run:
+                    self.merge(survivor, duplicates)
+            # Несколько активных пациентов с одним номером сливать нельзя - ключ остаётся у старшего
+            for pk in active[1:]:
+                conflicts[pk] = key
+
+        updated = self.fill_keys(options["chunk_size"], conflicts)
+
+        for pk, key in conflicts.items():
+            self.stdout.write(self.style.WARNING(f"Пациент {pk}: номер {key} уже у другого активного пациента"))
+        prefix = "Будет" if self.dry_run else "Готово:"
+        self.stdout.write(f"{prefix} обновлено записей: {updated}, слито дублей: {merged}, конфликтов: {len(conflicts)}")
+
+    # Ключ телефона -> [(id, активен)] для всех пациентов (по id, порциями)
+    def patient_groups(self, chunk_size):
+        groups = {}
+        rows = CustomUser.objects.filter(role="patient").order_by("id").values_list("id", "phone", "is_active")
+        for pk, phone, is_active in rows.iterator(chunk_size=chunk_size):
+            key = normalize_phone(phone)
+            if key:
+                groups.setdefault(key, []).append((pk, is_active))
+        return groups
+
+    # Остаётся старший активный пациент, иначе старшая гостевая запись; сливаются только гостевые
+    def split(self, patients):
+        active = [pk for pk, is_active in patients if is_active]
+        guests = [pk for pk, is_active in patients if not is_active]
+        survivor = active[0] if active else guests[0]
+        return survivor, [pk for pk in guests if pk != survivor], active
+
+    def merge(self, survivor, duplicates):
+        with transaction.atomic():
+            Schedule.objects.filter(booked_by_id__in=duplicates).update(booked_by_id=survivor)
+            Review.objects.filter(patient_id__in=duplicates).update(patient_id=survivor)
+            CampaignFailure.objects.filter(user_id__in=duplicates).update(user_id=survivor)
+            CustomUser.objects.filter(id__in=duplicates).delete()
+
+    # Номер в едином виде и phone_key для всех пользователей, где они отличаются (порциями по id)
+    def fill_keys(self, chunk_size, conflicts):
+        updated = 0
+        last_id = 0
+        rows = CustomUser.objects.order_by("id").values_list("id", "phone", "phone_key")
+        while chunk := list(rows.filter(id__gt=last_id)[:chunk_size]):
+            last_id = chunk[-1][0]
+            changed = []
+            for pk, phone, phone_key in chunk:
+                key = normalize_phone(phone)
+                new_key = None if pk in conflicts else key
+                if (key or phone, new_key) != (phone, phone_key):
+                    changed.append(CustomUser(id=pk, phone=key or phone, phone_key=new_key))
+            if changed:
+                updated += self.save_chunk(changed)
+        return updated
+
+    def save_chunk(self, users):
+        if not self.dry_run:
+            with transaction.atomic():
+                CustomUser.objects.bulk_update(users, ["phone", "phone_key"])
+        return len(users)
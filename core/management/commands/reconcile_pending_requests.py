@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.utils.pending_requests import reconcile_pending_count
+
+
+class Command(BaseCommand):
+    help = "Сверяет закэшированное число заявок с БД (запускать периодически)"
+
+    def handle(self, *args, **options):
+        cached, actual = reconcile_pending_count()
+        if cached == actual:
+            self.stdout.write(f"Расхождений нет: {actual}")
+        else:
+            self.stdout.write(f"Исправлено: в кэше {cached}, в БД {actual}")
@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.utils.availability import refresh_doctor_availability
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает ближайшее свободное время и число свободных слотов врачей (запускать по расписанию)"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = refresh_doctor_availability()
+        self.stdout.write(f"Обновлено врачей: {count} ({time.perf_counter() - started:.2f} с)")
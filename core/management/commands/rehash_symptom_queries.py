@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import SymptomAnalysis
+from core.utils.symptom_cache import query_hash, symptom_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает хэши жалоб в истории анализов "
+        "(после изменения SYMPTOM_CACHE_STEMMING или правил нормализации)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Записей за один UPDATE")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        updated = 0
+        last_id = 0
+        rows = SymptomAnalysis.objects.order_by("id").only("id", "user_query", "query_hash")
+        while chunk := list(rows.filter(id__gt=last_id)[:chunk_size]):
+            last_id = chunk[-1].id
+            changed = []
+            for analysis in chunk:
+                key = query_hash(analysis.user_query)
+                if key != analysis.query_hash:
+                    analysis.query_hash = key
+                    changed.append(analysis)
+            if changed:
+                with transaction.atomic():
+                    SymptomAnalysis.objects.bulk_update(changed, ["query_hash"])
+                updated += len(changed)
+
+        # Ответы в памяти процесса лежат под старыми ключами
+        symptom_cache.clear()
+        self.stdout.write(f"Пересчитано хэшей: {updated}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.utils.ratings import recompute_doctor_ratings, reverify_reviews
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает рейтинги врачей по подтверждённым отзывам"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reverify", action="store_true",
+            help="Заново проставить признак verified по завершённым приёмам",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["reverify"]:
+                self.stdout.write(f"Изменён признак verified: {reverify_reviews()}")
+            self.stdout.write(f"Исправлен рейтинг врачей: {recompute_doctor_ratings()}")
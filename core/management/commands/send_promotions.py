@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import PromotionCampaign
+from core.utils.campaigns import run_campaign
+
+
+class Command(BaseCommand):
+    help = "Отправляет незавершённые рассылки об акциях (с места остановки)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--campaign", type=int, help="ID конкретной рассылки")
+        parser.add_argument("--batch-size", type=int, default=500, help="Писем на одно SMTP-соединение")
+
+    def handle(self, *args, **options):
+        campaigns = PromotionCampaign.objects.select_related("promotion").exclude(status="done")
+        if options["campaign"]:
+            campaigns = campaigns.filter(pk=options["campaign"])
+            if not campaigns.exists():
+                raise CommandError("Рассылка не найдена или уже завершена")
+
+        for campaign in campaigns:
+            stats = run_campaign(campaign, batch_size=options["batch_size"])
+            if stats is None:
+                self.stdout.write(f"{campaign.promotion}: уже отправляется другим обработчиком")
+                continue
+            self.stdout.write(
+                f"{campaign.promotion}: отправлено {stats['sent']}, ошибок {stats['failed']}, "
+                f"{stats['seconds']:.2f} с ({stats['per_second']:.0f} писем/с)"
+            )
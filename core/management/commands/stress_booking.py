@@ -0,0 +1,96 @@
+import threading
+import time
+from datetime import time as dtime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from core.models import Doctor, Schedule
+from core.utils.pending_requests import reconcile_pending_count
+from users.models import CustomUser
+
+
+STRESS_SLUG = "synthetic-stress-doctor"
+LOCK_RETRIES = 5
+
+
+class Command(BaseCommand):
+    help = "Одновременная запись многих пациентов на один слот: проверяет, что выигрывает ровно один"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Пациентов, нажимающих одновременно")
+        parser.add_argument("--rounds", type=int, default=50, help="Сколько раз разыграть слот")
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        patients = list(CustomUser.objects.filter(is_staff=False).order_by("id")[:threads])
+        if len(patients) < threads:
+            raise CommandError(f"Нужно не меньше {threads} пациентов - сначала выполните generate_clinic_data")
+
+        doctor, _ = Doctor.objects.get_or_create(
+            slug=STRESS_SLUG,
+            defaults={"last_name": "Нагрузочный", "first_name": "Тест", "specialization": "Терапевт", "start_work_year": 2000},
+        )
+        slot, _ = Schedule.objects.get_or_create(
+            doctor=doctor,
+            date=timezone.localdate() + timedelta(days=1),
+            start_time=dtime(9),
+            defaults={"end_time": dtime(9, 30)},
+        )
+
+        try:
+            winners, locked, elapsed = self.run_rounds(slot, patients, options["rounds"])
+        finally:
+            # Тестовый врач удаляется вместе со слотом; счётчик заявок сверяется с базой
+            doctor.delete()
+            reconcile_pending_count()
+
+        attempts = threads * options["rounds"]
+        self.stdout.write(
+            f"Раундов: {options['rounds']}, попыток: {attempts}, записей: {sum(winners)}, "
+            f"ожиданий блокировки: {locked}"
+        )
+        self.stdout.write(f"{options['rounds'] / elapsed:.1f} записей/с, {attempts / elapsed:.1f} попыток/с")
+
+        wrong = [count for count in winners if count != 1]
+        if wrong:
+            raise CommandError(f"Раундов без ровно одной записи: {len(wrong)} ({wrong})")
+
+    def run_rounds(self, slot, patients, rounds):
+        winners = []
+        locked = 0
+        elapsed = 0.0
+        for _ in range(rounds):
+            Schedule.objects.filter(pk=slot.pk).update(status="available", booked_by=None)
+            results = []
+            barrier = threading.Barrier(len(patients))
+            workers = [
+                threading.Thread(target=self.attempt, args=(slot.pk, patient, barrier, results))
+                for patient in patients
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed += time.perf_counter() - started
+
+            winners.append(results.count(True))
+            locked += results.count(None)
+        return winners, locked, elapsed
+
+    # Попытка одного пациента в своём потоке (и своём соединении с БД)
+    def attempt(self, slot_id, patient, barrier, results):
+        slot = Schedule.objects.get(pk=slot_id)
+        barrier.wait()
+        try:
+            for _ in range(LOCK_RETRIES):
+                try:
+                    results.append(slot.book(patient))
+                    return
+                except OperationalError:
+                    # SQLite: база занята другим писателем дольше таймаута - повторяем
+                    results.append(None)
+        finally:
+            connection.close()
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.utils.telegram import TelegramDispatcher
+
+
+class Command(BaseCommand):
+    help = "Отправляет уведомления из очереди TelegramOutbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Обработать очередь один раз и выйти")
+        parser.add_argument("--interval", type=float, default=2.0, help="Пауза между опросами очереди, сек")
+        parser.add_argument("--batch-size", type=int, default=50, help="Сколько уведомлений брать за раз")
+
+    def handle(self, *args, **options):
+        dispatcher = TelegramDispatcher(batch_size=options["batch_size"])
+        try:
+            while True:
+                stats = dispatcher.dispatch_once()
+                if any(stats.values()):
+                    self.stdout.write(
+                        f"Отправлено: {stats['sent']} ({stats['messages']} сообщ.), "
+                        f"повтор: {stats['retried']}, ошибок: {stats['failed']}"
+                    )
+                if options["once"]:
+                    break
+                # Пока очередь не пуста — продолжаем без паузы
+                if stats["sent"] + stats["retried"] + stats["failed"] < options["batch_size"]:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.close()
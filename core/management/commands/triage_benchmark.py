@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Doctor
+from core.utils.keyword_triage import KeywordTriage, load_examples
+
+
+class Command(BaseCommand):
+    help = "Оценивает точность локального классификатора жалоб на сохранённой истории ИИ"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--holdout", type=float, default=0.2, help="Доля новейших записей для проверки")
+        parser.add_argument("--limit", type=int, default=10000, help="Сколько последних записей истории взять")
+        parser.add_argument("--min-score", type=float, help="Порог сходства (по умолчанию из настроек)")
+        parser.add_argument("--min-margin", type=float, help="Порог отрыва (по умолчанию из настроек)")
+
+    def handle(self, *args, **options):
+        # Только ответы ИИ, как при обучении: ответы из кэша и самого классификатора завысили бы точность
+        history = load_examples(options["limit"])
+        if len(history) < 10:
+            raise CommandError("Недостаточно истории для оценки (нужно хотя бы 10 записей)")
+
+        # Обучаемся на более старых записях, проверяем на новейших
+        split = max(1, int(len(history) * options["holdout"]))
+        test, train = history[:split], history[split:]
+        specializations = Doctor.objects.values_list("specialization", flat=True).distinct()
+
+        started = time.perf_counter()
+        model = KeywordTriage(train, specializations)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        answered = correct = 0
+        started = time.perf_counter()
+        for query, expected in test:
+            result = model.classify(query, min_score=options["min_score"], min_margin=options["min_margin"])
+            if result is None:
+                continue
+            answered += 1
+            correct += result[0].strip().lower() == expected.strip().lower()
+        per_query_ms = (time.perf_counter() - started) * 1000 / len(test)
+
+        self.stdout.write(f"Обучение: {len(train)} записей, {build_ms:.1f} мс")
+        self.stdout.write(f"Проверка: {len(test)} записей, {per_query_ms:.3f} мс на жалобу")
+        self.stdout.write(f"Отвечено локально: {answered / len(test):.1%}")
+        if answered:
+            self.stdout.write(f"Точность локальных ответов: {correct / answered:.1%}")
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from core.checks import LOCAL_CACHES
+from core.views import home_cards
+
+
+# Страницы, список которых кэшируется в шаблоне (VersionedCacheMixin)
+CATALOG_PAGES = ["doctors_list", "services_list", "promotion_list", "contacts"]
+
+
+class Command(BaseCommand):
+    help = "Заполняет кэш страниц сайта (после деплоя или очистки кэша)"
+
+    def handle(self, *args, **options):
+        # Локальный кэш команды сервер не увидит: прогрев имеет смысл только для общего кэша
+        backend = settings.CACHES["default"]["BACKEND"]
+        if backend in LOCAL_CACHES:
+            raise CommandError(f"Кэш {backend} не общий для процессов: прогревать нечего")
+
+        cards = home_cards()
+        count = bool(cards["hero_card"]) + len(cards["small_cards"]) + len(cards["square_cards"])
+        self.stdout.write(f"Главная страница: карточек в кэше {count}")
+
+        # Фрагменты кэшируются при отрисовке - рендерим страницы как для анонимного посетителя
+        factory = RequestFactory()
+        for name in CATALOG_PAGES:
+            url = reverse(name)
+            request = factory.get(url)
+            request.user = AnonymousUser()
+            resolve(url).func(request).render()
+            self.stdout.write(f"{url}: в кэше")
@@ -0,0 +1,87 @@
+import json
+import logging
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core.utils import profiling
+
+
+logger = logging.getLogger("core.profiling")
+
+
+# Замеры запроса: число SQL-запросов и время БД, повторяющиеся запросы (N+1),
+# время шаблонов и внешних вызовов. Результат - заголовок Server-Timing и строка лога.
+# Включается REQUEST_PROFILING; выключенный middleware Django не подключает вовсе
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        profiling.install()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        profile = profiling.RequestProfile()
+        token = profiling.current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiling.current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        profile = profiling.RequestProfile()
+        token = profiling.current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiling.current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def sampled(self):
+        rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        return rate >= 1 or random.random() < rate
+
+    def finish(self, request, response, profile):
+        duration = profile.duration
+        if settings.REQUEST_PROFILING_HEADERS:
+            response["Server-Timing"] = self.server_timing(profile, duration)
+
+        slow = duration * 1000 >= settings.REQUEST_PROFILING_SLOW_MS
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "queries": profile.queries,
+            "db_ms": round(profile.db_time * 1000, 1),
+            "duplicate_queries": profile.duplicates,
+            **{f"{kind}_ms": round(seconds * 1000, 1) for kind, seconds in profile.external.items()},
+        }
+        if slow or profile.duplicates:
+            record["repeated_sql"] = [{"sql": sql, "count": count} for sql, count in profile.most_repeated()]
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps(record, ensure_ascii=False))
+        return response
+
+    def server_timing(self, profile, duration):
+        metrics = [
+            f'db;dur={profile.db_time * 1000:.1f};desc="SQL x{profile.queries}, duplicates {profile.duplicates}"'
+        ]
+        metrics += [f"{kind};dur={seconds * 1000:.1f}" for kind, seconds in profile.external.items()]
+        metrics.append(f"total;dur={duration * 1000:.1f}")
+        return ", ".join(metrics)
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_telegramoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromotionCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Отправляется'), ('done', 'Завершена')], default='pending', max_length=20, verbose_name='Статус')),
+                ('last_user_id', models.PositiveBigIntegerField(default=0, verbose_name='Последний обработанный пользователь')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Отправлено')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Ошибок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начата')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('promotion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to='core.promotion', verbose_name='Акция')),
+            ],
+            options={
+                'verbose_name': 'Рассылка акции',
+                'verbose_name_plural': 'Рассылки акций',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CampaignFailure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('error', models.TextField(verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Получатель')),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failures', to='core.promotioncampaign', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Ошибка рассылки',
+                'verbose_name_plural': 'Ошибки рассылки',
+            },
+        ),
+    ]
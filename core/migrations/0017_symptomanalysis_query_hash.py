@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:27
+
+import hashlib
+import re
+
+from django.db import migrations, models
+
+
+# Нормализация на момент миграции (стемминг включён, основа от 3 букв). Копия, а не импорт
+# core.utils.symptom_cache: хэши не должны зависеть от будущего кода и настроек.
+# После изменения нормализации хэши пересчитывает команда rehash_symptom_queries
+ENDINGS = sorted(
+    [
+        "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ешь", "ишь",
+        "ает", "яет", "ует", "ают", "яют", "уют",
+        "ая", "яя", "ое", "ее", "ие", "ые", "ой", "ей", "ий", "ый", "ом", "ем",
+        "ам", "ям", "ах", "ях", "ую", "юю", "ть", "ет", "ит", "ат", "ят", "ут", "ют",
+        "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+    ],
+    key=len,
+    reverse=True,
+)
+
+
+def stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[: -len(ending)]
+    return word
+
+
+def query_hash(text):
+    words = re.findall(r"\w+", text.lower().replace("ё", "е"))
+    normalized = " ".join(sorted({stem(word) for word in words}))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def fill_query_hash(apps, schema_editor):
+    SymptomAnalysis = apps.get_model('core', 'SymptomAnalysis')
+    batch = []
+    for analysis in SymptomAnalysis.objects.only('id', 'user_query').iterator(chunk_size=1000):
+        analysis.query_hash = query_hash(analysis.user_query)
+        batch.append(analysis)
+        if len(batch) >= 1000:
+            SymptomAnalysis.objects.bulk_update(batch, ['query_hash'])
+            batch = []
+    SymptomAnalysis.objects.bulk_update(batch, ['query_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_promotioncampaign'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='symptomanalysis',
+            name='query_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш нормализованной жалобы'),
+        ),
+        migrations.AddIndex(
+            model_name='symptomanalysis',
+            index=models.Index(fields=['query_hash', '-created_at'], name='symptom_query_hash_idx'),
+        ),
+        migrations.RunPython(fill_query_hash, migrations.RunPython.noop),
+    ]
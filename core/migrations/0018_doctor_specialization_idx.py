@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_symptomanalysis_query_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['specialization'], name='doctor_specialization_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_doctor_specialization_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['doctor', 'date', 'start_time'], name='schedule_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(condition=models.Q(('status', 'booked')), fields=['date', 'start_time'], name='schedule_booked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['booked_by', 'status', 'date'], name='schedule_patient_idx'),
+        ),
+    ]
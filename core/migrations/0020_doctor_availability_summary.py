@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_schedule_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='availability_refreshed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Сводка обновлена'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='free_slots_30d',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Свободных слотов на 30 дней'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='free_slots_7d',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Свободных слотов на 7 дней'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='next_free_slot',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Ближайшее свободное время'),
+        ),
+    ]
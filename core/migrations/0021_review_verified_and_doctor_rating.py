@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Sum
+
+
+# Существующие отзывы пациентов с завершённым приёмом считаются подтверждёнными
+def fill_verified_and_ratings(apps, schema_editor):
+    Doctor = apps.get_model('core', 'Doctor')
+    Review = apps.get_model('core', 'Review')
+    Schedule = apps.get_model('core', 'Schedule')
+
+    completed = Schedule.objects.filter(doctor=OuterRef('doctor'), booked_by=OuterRef('patient'), status='completed')
+    Review.objects.filter(Exists(completed)).update(verified=True)
+
+    totals = (
+        Review.objects.filter(verified=True)
+        .values('doctor')
+        .annotate(total=Sum('rating'), count=Count('id'))
+        .order_by()
+    )
+    for row in totals:
+        Doctor.objects.filter(pk=row['doctor']).update(rating_sum=row['total'], rating_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_doctor_availability_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число оценок'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='verified',
+            field=models.BooleanField(default=False, verbose_name='Подтверждён приёмом'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('verified', True)), fields=['doctor', '-created_at'], name='review_verified_idx'),
+        ),
+        migrations.RunPython(fill_verified_and_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_review_verified_and_doctor_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Понедельник'), (1, 'Вторник'), (2, 'Среда'), (3, 'Четверг'), (4, 'Пятница'), (5, 'Суббота'), (6, 'Воскресенье')], verbose_name='День недели')),
+                ('start_time', models.TimeField(verbose_name='Начало смены')),
+                ('end_time', models.TimeField(verbose_name='Конец смены')),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30, verbose_name='Длительность приёма, мин')),
+                ('break_start', models.TimeField(blank=True, null=True, verbose_name='Начало перерыва')),
+                ('break_end', models.TimeField(blank=True, null=True, verbose_name='Конец перерыва')),
+                ('valid_from', models.DateField(blank=True, null=True, verbose_name='Действует с')),
+                ('valid_to', models.DateField(blank=True, null=True, verbose_name='Действует по')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shift_templates', to='core.doctor', verbose_name='Доктор')),
+            ],
+            options={
+                'verbose_name': 'Шаблон смены',
+                'verbose_name_plural': 'Шаблоны смен',
+                'ordering': ['doctor', 'weekday', 'start_time'],
+            },
+        ),
+    ]
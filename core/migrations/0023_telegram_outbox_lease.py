@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_shift_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramoutbox',
+            name='claim_token',
+            field=models.UUIDField(blank=True, editable=False, null=True, verbose_name='Метка обработчика'),
+        ),
+        migrations.AlterField(
+            model_name='telegramoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Не доставлено')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+    ]
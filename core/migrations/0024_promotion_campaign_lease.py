@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_telegram_outbox_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotioncampaign',
+            name='claim_token',
+            field=models.UUIDField(blank=True, editable=False, null=True, verbose_name='Метка обработчика'),
+        ),
+        migrations.AddField(
+            model_name='promotioncampaign',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Аренда до'),
+        ),
+    ]
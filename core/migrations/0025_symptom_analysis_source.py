@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_promotion_campaign_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='symptomanalysis',
+            name='source',
+            field=models.CharField(choices=[('ai', 'ИИ'), ('cache', 'Сохранённый ответ'), ('local', 'Локальный классификатор')], default='ai', max_length=10, verbose_name='Источник ответа'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:29
+
+import django.core.validators
+from django.db import migrations, models
+
+
+# Шаблоны с нулевой длительностью приёма (созданные не через админку) - по умолчанию 30 минут
+def fix_zero_slot_minutes(apps, schema_editor):
+    ShiftTemplate = apps.get_model('core', 'ShiftTemplate')
+    ShiftTemplate.objects.filter(slot_minutes=0).update(slot_minutes=30)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_symptom_analysis_source'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shifttemplate',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Длительность приёма, мин'),
+        ),
+        migrations.RunPython(fix_zero_slot_minutes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='shifttemplate',
+            constraint=models.CheckConstraint(condition=models.Q(('slot_minutes__gte', 1)), name='shift_slot_minutes_positive'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_shift_template_slot_minutes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramoutbox',
+            name='parts_sent',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Отправлено частей'),
+        ),
+    ]
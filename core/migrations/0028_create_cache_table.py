@@ -0,0 +1,19 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+# Таблица общего кэша (DatabaseCache) создаётся вместе с остальными таблицами:
+# без неё любая страница с кэшем падает с ошибкой. Для Redis команда ничего не делает
+def create_cache_table(apps, schema_editor):
+    call_command("createcachetable", database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_telegram_outbox_parts_sent'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,20 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.db.models import Q
+from django.dispatch import Signal
 from django.utils.text import slugify
 from transliterate import translit
 from django.urls import reverse
-from datetime import date
+from django.utils import timezone
+from datetime import date, datetime, timedelta
 from users.models import CustomUser
 
 
+# Сигнал смены статуса слота: sender=Schedule, instance, old_status, new_status
+schedule_status_changed = Signal()
+
+
 class HeroCard(models.Model):
     title = models.CharField(max_length=200, verbose_name="Заголовок")
     subtitle = models.TextField(blank=True, verbose_name="Описание")
@@ -76,6 +85,14 @@ class Doctor(models.Model):
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
     photo = models.ImageField(upload_to="doctors/", blank=True, null=True, verbose_name="Фото")
     slug = models.SlugField(max_length=200, unique=True, blank=True)
+    # Сводка по свободным слотам (обновляется при изменении графика и командой refresh_doctor_availability)
+    next_free_slot = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Ближайшее свободное время")
+    free_slots_7d = models.PositiveIntegerField(default=0, editable=False, verbose_name="Свободных слотов на 7 дней")
+    free_slots_30d = models.PositiveIntegerField(default=0, editable=False, verbose_name="Свободных слотов на 30 дней")
+    availability_refreshed_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Сводка обновлена")
+    # Сумма и число оценок подтверждённых отзывов (меняются вместе с отзывами, команда repair_review_aggregates)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Сумма оценок")
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Число оценок")
 
     def __str__(self):
         # Если есть отчество
@@ -93,6 +110,10 @@ class Doctor(models.Model):
         else:
             return f"{years} лет"
         
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0
+
     def save(self, *args, **kwargs):
         if not self.slug: 
             name = f"{self.last_name} {self.first_name} {self.patronymic or ''}"
@@ -109,6 +130,9 @@ class Doctor(models.Model):
     class Meta:
         verbose_name = "Доктор"
         verbose_name_plural = "Доктора"
+        indexes = [
+            models.Index(fields=["specialization"], name="doctor_specialization_idx"),
+        ]
 
 
 class Services(models.Model):
@@ -189,15 +213,192 @@ class Schedule(models.Model):
     )
     completed_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
-    
+
+    # Снимок статуса и пациента на момент загрузки из БД (для отслеживания переходов)
+    _loaded_status = None
+    _loaded_booked_by_id = None
+
     def __str__(self):
         return f"{self.doctor} - {self.date} {self.start_time}-{self.end_time}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    def _take_snapshot(self):
+        # Отложенные (defer/only) поля не загружаем ради снимка
+        self._loaded_status = self.__dict__.get("status")
+        self._loaded_booked_by_id = self.__dict__.get("booked_by_id")
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or "status" in fields or "booked_by" in fields or "booked_by_id" in fields:
+            self._take_snapshot()
+
+    # Переход статуса (старый, новый) относительно загруженного, либо None
+    @property
+    def status_transition(self):
+        if "status" not in self.__dict__ or self._loaded_status == self.status:
+            return None
+        return self._loaded_status, self.status
+
+    @property
+    def booked_by_changed(self):
+        return "booked_by_id" in self.__dict__ and self._loaded_booked_by_id != self.booked_by_id
+
+    # Переход засчитывается, только если статус действительно записан (update_fields без status
+    # его не меняет - снимок незаписанных полей остаётся прежним)
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        written = None if update_fields is None else set(update_fields)
+        transition = self.status_transition if written is None or "status" in written else None
+        loaded = (self._loaded_status, self._loaded_booked_by_id)
+        super().save(*args, **kwargs)
+        self._take_snapshot()
+        if written is not None:
+            if "status" not in written:
+                self._loaded_status = loaded[0]
+            if not written & {"booked_by", "booked_by_id"}:
+                self._loaded_booked_by_id = loaded[1]
+        if transition:
+            old_status, new_status = transition
+            schedule_status_changed.send(
+                sender=Schedule, instance=self, old_status=old_status, new_status=new_status
+            )
+
+    # Запись пациента одним условным UPDATE: из одновременных попыток выигрывает одна.
+    # Возвращает False, если слот уже занят
+    def book(self, patient):
+        won = Schedule.objects.filter(pk=self.pk, status="available").update(status="booked", booked_by=patient)
+        if not won:
+            return False
+        self.status, self.booked_by = "booked", patient
+        self._take_snapshot()
+        schedule_status_changed.send(sender=Schedule, instance=self, old_status="available", new_status="booked")
+        return True
+
+    # Декоратор обработчика перехода, например @Schedule.on_transition("booked", "confirmed")
+    @classmethod
+    def on_transition(cls, source="*", target="*"):
+        def decorator(func):
+            def receiver(sender, instance, old_status, new_status, **kwargs):
+                if source in ("*", old_status) and target in ("*", new_status):
+                    func(instance, old_status, new_status)
+
+            schedule_status_changed.connect(
+                receiver, sender=cls, weak=False,
+                dispatch_uid=f"{func.__module__}.{func.__qualname__}",
+            )
+            return func
+        return decorator
+
     class Meta:
         unique_together = ('doctor', 'date', 'start_time')
         ordering = ['date', 'start_time']
         verbose_name = "График"
         verbose_name_plural = "Графики"
+        # Частые выборки (проверяются тестами core/test_query_plans.py).
+        # Смена врача за день (doctor + date) обслуживается индексом unique_together
+        indexes = [
+            # Свободные слоты: запись к врачу, ближайшее время по рекомендации ИИ
+            models.Index(
+                fields=["doctor", "date", "start_time"],
+                condition=Q(status="available"),
+                name="schedule_available_idx",
+            ),
+            # Заявки на подтверждение и их число для бейджа
+            models.Index(
+                fields=["date", "start_time"],
+                condition=Q(status="booked"),
+                name="schedule_booked_idx",
+            ),
+            # Записи пациента по статусу и дате
+            models.Index(fields=["booked_by", "status", "date"], name="schedule_patient_idx"),
+        ]
+
+
+# Недельный шаблон смены врача: по нему генерируются слоты графика (команда generate_shifts)
+class ShiftTemplate(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, 'Понедельник'),
+        (1, 'Вторник'),
+        (2, 'Среда'),
+        (3, 'Четверг'),
+        (4, 'Пятница'),
+        (5, 'Суббота'),
+        (6, 'Воскресенье'),
+    ]
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='shift_templates', verbose_name="Доктор")
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, verbose_name="День недели")
+    start_time = models.TimeField(verbose_name="Начало смены")
+    end_time = models.TimeField(verbose_name="Конец смены")
+    slot_minutes = models.PositiveSmallIntegerField(
+        default=30, validators=[MinValueValidator(1)], verbose_name="Длительность приёма, мин"
+    )
+    break_start = models.TimeField(null=True, blank=True, verbose_name="Начало перерыва")
+    break_end = models.TimeField(null=True, blank=True, verbose_name="Конец перерыва")
+    valid_from = models.DateField(null=True, blank=True, verbose_name="Действует с")
+    valid_to = models.DateField(null=True, blank=True, verbose_name="Действует по")
+
+    def __str__(self):
+        return f"{self.doctor} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+    def clean(self):
+        if self.start_time and self.end_time and self.start_time >= self.end_time:
+            raise ValidationError("Смена должна заканчиваться позже, чем начинается")
+        if (self.break_start is None) != (self.break_end is None):
+            raise ValidationError("Укажите и начало, и конец перерыва")
+        # clean() вызывается и при ошибках полей: пустое время смены уже отмечено формой
+        shift = self.start_time and self.end_time
+        if shift and self.break_start and not (self.start_time <= self.break_start < self.break_end <= self.end_time):
+            raise ValidationError("Перерыв должен быть внутри смены")
+        ready = None not in (self.doctor_id, self.weekday, self.start_time, self.end_time)
+        if ready and self.overlapping().exists():
+            raise ValidationError("У врача уже есть смена в этот день недели, пересекающаяся с этой")
+
+    # Другие шаблоны врача на тот же день недели, пересекающиеся по времени и сроку действия
+    def overlapping(self):
+        templates = ShiftTemplate.objects.filter(
+            doctor_id=self.doctor_id, weekday=self.weekday,
+            start_time__lt=self.end_time, end_time__gt=self.start_time,
+        ).exclude(pk=self.pk)
+        if self.valid_from:
+            templates = templates.filter(Q(valid_to__isnull=True) | Q(valid_to__gte=self.valid_from))
+        if self.valid_to:
+            templates = templates.filter(Q(valid_from__isnull=True) | Q(valid_from__lte=self.valid_to))
+        return templates
+
+    def applies_to(self, day):
+        return (
+            day.weekday() == self.weekday
+            and (self.valid_from is None or day >= self.valid_from)
+            and (self.valid_to is None or day <= self.valid_to)
+        )
+
+    # Приёмы смены (начало, конец); приём, задевающий перерыв или конец смены, не создаётся
+    def slot_times(self):
+        day = date.min
+        start = datetime.combine(day, self.start_time)
+        end = datetime.combine(day, self.end_time)
+        step = timedelta(minutes=self.slot_minutes)
+        while start + step <= end:
+            slot_end = start + step
+            if self.break_start and start.time() < self.break_end and slot_end.time() > self.break_start:
+                start = max(start, datetime.combine(day, self.break_end))
+                continue
+            yield start.time(), slot_end.time()
+            start = slot_end
+
+    class Meta:
+        ordering = ['doctor', 'weekday', 'start_time']
+        constraints = [
+            # Нулевая длительность зациклила бы slot_times()
+            models.CheckConstraint(condition=Q(slot_minutes__gte=1), name="shift_slot_minutes_positive"),
+        ]
+        verbose_name = "Шаблон смены"
+        verbose_name_plural = "Шаблоны смен"
 
 
 class Review(models.Model):
@@ -206,26 +407,142 @@ class Review(models.Model):
     rating = models.PositiveSmallIntegerField(default=5, choices=[(i, i) for i in range(1, 6)], verbose_name="Рейтинг")
     comment = models.TextField(blank=True, max_length=1000, verbose_name="Отзыв")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    # Отзыв пациента с завершённым приёмом у врача (проверяется при создании)
+    verified = models.BooleanField(default=False, verbose_name="Подтверждён приёмом")
+
+    # Вклад в рейтинг врача на момент загрузки из БД (для пересчёта при изменении)
+    _loaded_contribution = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    def _take_snapshot(self):
+        data = self.__dict__
+        self._loaded_contribution = (data.get("doctor_id"), data.get("rating")) if data.get("verified") else None
+
+    # Вклад в рейтинг врача: (врач, оценка) подтверждённого отзыва, иначе None
+    @property
+    def rating_contribution(self):
+        return (self.doctor_id, self.rating) if self.verified else None
+
+    # Отзыв и рейтинг врача меняются в одной транзакции (сигнал post_save)
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._take_snapshot()
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
+        indexes = [
+            # Подтверждённые отзывы на странице врача
+            models.Index(
+                fields=["doctor", "-created_at"],
+                condition=Q(verified=True),
+                name="review_verified_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient} → {self.doctor} ({self.rating})"
     
 
 class SymptomAnalysis(models.Model):
+    SOURCE_CHOICES = [
+        ('ai', 'ИИ'),
+        ('cache', 'Сохранённый ответ'),
+        ('local', 'Локальный классификатор'),
+    ]
     user_query = models.TextField(verbose_name="Жалобы пациента")
     ai_result = models.TextField(verbose_name="Анализ ИИ")
     recommended_doctor = models.CharField(max_length=100, blank=True, verbose_name="Рекомендованный врач")
+    query_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name="Хэш нормализованной жалобы")
+    # Ответы из кэша и локального классификатора тоже попадают в историю, но не считаются ответами ИИ
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='ai', verbose_name="Источник ответа")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время запроса") 
 
     class Meta:
         verbose_name = "Анализ симптомов"
         verbose_name_plural = "История анализов ИИ"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["query_hash", "-created_at"], name="symptom_query_hash_idx"),
+        ]
 
         def __str__(self):
-            return f"Запрос от {self.created_at.strftime("%d.%m.%Y %H:%M")}"
\ No newline at end of file
+            return f"Запрос от {self.created_at.strftime("%d.%m.%Y %H:%M")}"
+
+
+# Очередь уведомлений в Telegram (пишется в одной транзакции с записью)
+class TelegramOutbox(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sending', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Не доставлено'),
+    ]
+    text = models.TextField(verbose_name="Текст сообщения")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток отправки")
+    # Для "sending" - срок аренды: после него уведомление может забрать другой обработчик
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    claim_token = models.UUIDField(null=True, blank=True, editable=False, verbose_name="Метка обработчика")
+    # Длинный текст уходит частями: уже доставленные части при повторе не отправляются
+    parts_sent = models.PositiveSmallIntegerField(default=0, verbose_name="Отправлено частей")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    def __str__(self):
+        return f"{self.get_status_display()}: {self.text[:50]}"
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='tg_outbox_due_idx'),
+        ]
+        verbose_name = "Уведомление Telegram"
+        verbose_name_plural = "Очередь уведомлений Telegram"
+
+
+# Рассылка об акции подписчикам (прогресс хранится для возобновления)
+class PromotionCampaign(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает'),
+        ('running', 'Отправляется'),
+        ('done', 'Завершена'),
+    ]
+    promotion = models.ForeignKey(Promotion, on_delete=models.CASCADE, related_name='campaigns', verbose_name="Акция")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    last_user_id = models.PositiveBigIntegerField(default=0, verbose_name="Последний обработанный пользователь")
+    # Рассылку отправляет один обработчик: метка и срок аренды (продлевается на каждой пачке)
+    claim_token = models.UUIDField(null=True, blank=True, editable=False, verbose_name="Метка обработчика")
+    lease_until = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Аренда до")
+    sent_count = models.PositiveIntegerField(default=0, verbose_name="Отправлено")
+    failed_count = models.PositiveIntegerField(default=0, verbose_name="Ошибок")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начата")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+
+    def __str__(self):
+        return f"{self.promotion} ({self.get_status_display()})"
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = "Рассылка акции"
+        verbose_name_plural = "Рассылки акций"
+
+
+class CampaignFailure(models.Model):
+    campaign = models.ForeignKey(PromotionCampaign, on_delete=models.CASCADE, related_name='failures', verbose_name="Рассылка")
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Получатель")
+    error = models.TextField(verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Время")
+
+    class Meta:
+        verbose_name = "Ошибка рассылки"
+        verbose_name_plural = "Ошибки рассылки"
@@ -1,21 +1,94 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
-from .models import Schedule, Promotion
-from users.models import CustomUser
+from .models import (
+    Contacts,
+    Doctor,
+    HeroCard,
+    Promotion,
+    PromotionCampaign,
+    Review,
+    Schedule,
+    Services,
+    SmallCard,
+    SquareCard,
+)
+from core.utils.availability import refresh_doctor_availability
+from core.utils.page_cache import bump_version_on_commit
+from core.utils.pending_requests import adjust_pending_count
+from core.utils.ratings import apply_rating_change
+from core.utils.specializations import specialization_index
+
+
+# Письмо пациенту при переходе записи в статус "подтверждено" - только после фиксации транзакции
+@Schedule.on_transition(target="confirmed")
+def appointment_confirmed_email(instance, old_status, new_status):
+    transaction.on_commit(lambda: send_confirmation_email(instance))
+
+
+# Слот вошёл в статус "booked" или вышел из него - меняется число заявок
+@Schedule.on_transition()
+def pending_requests_changed(instance, old_status, new_status):
+    delta = (new_status == "booked") - (old_status == "booked")
+    if delta:
+        transaction.on_commit(lambda: adjust_pending_count(delta))
+
+
+@receiver(post_delete, sender=Schedule)
+def pending_request_deleted(sender, instance, **kwargs):
+    if instance.status == "booked":
+        transaction.on_commit(lambda: adjust_pending_count(-1))
+
+
+# Врачи, чьи сводки пересчитываются после фиксации транзакции - одним запросом на всех
+class AvailabilityRefresh:
+    def __init__(self, doctor_id):
+        self.doctor_ids = {doctor_id}
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        refresh_doctor_availability(self.doctor_ids)
+
+
+# Изменились свободные слоты врача - пересчитываем его сводку после фиксации транзакции.
+# В транзакции один обработчик on_commit копит id врачей: удаление врача с сотнями слотов
+# или массовое удаление в админке дают один пересчёт. Обработчик, отброшенный откатом
+# точки сохранения, пропадает из run_on_commit - тогда регистрируется новый
+def refresh_availability_on_commit(doctor_id):
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        for _, callback, _ in reversed(connection.run_on_commit):
+            if isinstance(callback, AvailabilityRefresh) and not callback.done:
+                callback.doctor_ids.add(doctor_id)
+                return
+    transaction.on_commit(AvailabilityRefresh(doctor_id))
+
+
+# Слот создан или изменён, оставаясь свободным
+@receiver(post_save, sender=Schedule)
+def doctor_availability_changed(sender, instance, created, **kwargs):
+    if created or (instance.status == "available" and not instance.status_transition):
+        refresh_availability_on_commit(instance.doctor_id)
 
 
-@receiver(post_save, sender=Schedule)
-def appointment_confirmed_email(sender, instance, created, **kwargs):
-    if created:
+# Слот удалён. Если удаляется сам врач (каскадом вместе со слотами), сводка не нужна
+@receiver(post_delete, sender=Schedule)
+def doctor_slot_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Doctor) or getattr(origin, "model", None) is Doctor:
         return
+    if instance.status == "available":
+        refresh_availability_on_commit(instance.doctor_id)
 
-    old_status = Schedule.objects.get(pk=instance.pk).status
 
-    if old_status != "confirmed" and instance.status == "confirmed":
-        send_confirmation_email(instance)
+# Слот стал свободным или перестал им быть (в том числе при записи через Schedule.book)
+@Schedule.on_transition()
+def doctor_availability_transition(instance, old_status, new_status):
+    if "available" in (old_status, new_status):
+        refresh_availability_on_commit(instance.doctor_id)
 
 
 def send_confirmation_email(appointment: Schedule):
@@ -45,34 +118,50 @@ def send_confirmation_email(appointment: Schedule):
     email.send()
 
 
+# Новая акция ставит рассылку в очередь, письма отправляет команда send_promotions
 @receiver(post_save, sender=Promotion)
 def send_promotion_email(sender, instance, created, **kwargs):
     if not created:
         return
 
-    subscribers = CustomUser.objects.filter(subscribe_promotions=True, is_active=True)
-    for user in subscribers:
-        send_promotion_email_to_user(user, instance)
+    PromotionCampaign.objects.create(promotion=instance)
 
 
-def send_promotion_email_to_user(user, promotion):
-    if not user.email:
-        return
+# Карточки главной страницы: новая версия - новый ключ кэша (core.views.home_cards)
+@receiver(post_save, sender=HeroCard)
+@receiver(post_delete, sender=HeroCard)
+@receiver(post_save, sender=SmallCard)
+@receiver(post_delete, sender=SmallCard)
+@receiver(post_save, sender=SquareCard)
+@receiver(post_delete, sender=SquareCard)
+def home_card_changed(sender, **kwargs):
+    bump_version_on_commit(sender)
 
-    context = {
-        "user": user,
-        "promotion": promotion,
-    }
 
-    subject = f"Новая акция от Ars Medica: {promotion.title}"
-    text_content = render_to_string("emails/promotion.txt", context)
-    html_content = render_to_string("emails/promotion.html", context)
+# Списки услуг, акций и контакты кэшируются по версиям моделей (core.views.VersionedCacheMixin)
+@receiver(post_save, sender=Services)
+@receiver(post_delete, sender=Services)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_save, sender=Contacts)
+@receiver(post_delete, sender=Contacts)
+def catalog_changed(sender, **kwargs):
+    bump_version_on_commit(sender)
 
-    email = EmailMultiAlternatives(
-        subject=subject,
-        body=text_content,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[user.email],
-    )
-    email.attach_alternative(html_content, "text/html")
-    email.send()
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def doctor_changed(sender, **kwargs):
+    specialization_index.invalidate()
+    bump_version_on_commit(Doctor)
+
+
+# Рейтинг врача меняется в транзакции сохранения/удаления отзыва
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    apply_rating_change(None if created else instance._loaded_contribution, instance.rating_contribution)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    apply_rating_change(instance._loaded_contribution, None)
@@ -0,0 +1,104 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const form = document.getElementById('symptomForm');
+    if (!form) return;
+
+    const streamUrl = form.dataset.streamUrl;
+    // Без потокового чтения ответа форма отправляется обычным образом
+    if (!streamUrl || !window.fetch || !window.ReadableStream || !window.TextDecoder) return;
+
+    const button = document.getElementById('submitBtn');
+    const buttonText = button.innerHTML;
+
+    function resetButton() {
+        button.innerHTML = buttonText;
+        button.style.opacity = '';
+        button.disabled = false;
+    }
+
+    // Карточка результата в той же разметке, что и при обычной отправке формы
+    function createResultCard() {
+        document.querySelectorAll('.ai-card, .schedule-container, .symptom-error').forEach(function (node) {
+            node.remove();
+        });
+
+        const card = document.createElement('div');
+        card.className = 'ai-card';
+        card.id = 'aiCard';
+        card.innerHTML =
+            '<h4 style="color: #007bff;">Результат анализа:</h4>' +
+            '<div id="typewriter" class="typing-text"></div>' +
+            '<p class="disclaimer">⚠️ Внимание! Это предварительная информация, необходим очный осмотр врача.</p>';
+        form.after(card);
+        return card;
+    }
+
+    function showError(message) {
+        const error = document.createElement('div');
+        error.className = 'symptom-error';
+        error.style.cssText = 'color: #d32f2f; margin-top: 15px;';
+        error.textContent = message;
+        form.after(error);
+    }
+
+    // Разбор событий Server-Sent Events: "event: ...\ndata: ...\n\n"
+    function parseEvent(frame) {
+        let name = 'message';
+        let data = '';
+        frame.split('\n').forEach(function (line) {
+            if (line.startsWith('event: ')) name = line.slice(7);
+            else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        return { name: name, data: data ? JSON.parse(data) : {} };
+    }
+
+    form.addEventListener('submit', async function (event) {
+        event.preventDefault();
+
+        let response;
+        try {
+            response = await fetch(streamUrl, {
+                method: 'POST',
+                body: new FormData(form),
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+            });
+        } catch (error) {
+            form.submit();
+            return;
+        }
+
+        if (!response.ok || !response.body) {
+            resetButton();
+            const data = await response.json().catch(function () { return {}; });
+            showError(data.error || 'Произошла ошибка при связи с ИИ. Попробуйте позже');
+            return;
+        }
+
+        const card = createResultCard();
+        const target = card.querySelector('#typewriter');
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = parseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+
+                if (message.name === 'token') {
+                    target.textContent += message.data.text;
+                } else if (message.name === 'done') {
+                    card.insertAdjacentHTML('afterend', message.data.doctors_html);
+                } else if (message.name === 'error') {
+                    card.remove();
+                    showError(message.data.error);
+                }
+            }
+        }
+        resetButton();
+    });
+});
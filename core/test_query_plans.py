@@ -0,0 +1,103 @@
+import re
+from datetime import time, timedelta
+
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Doctor, Review, Schedule
+from core.utils.pending_requests import count_pending_requests
+from core.utils.specializations import doctors_with_next_slots
+from users.models import CustomUser
+from users.views import ScheduleListView, ScheduleRequestsView, get_available_slots_queryset, get_patient_appointments
+
+
+# Полный проход по таблице графика или отзывов без индекса: "SCAN core_schedule" (в т.ч. с псевдонимом)
+FULL_SCAN = re.compile(r"\bSCAN (core_schedule|core_review|U\d+)\b(?! USING (COVERING )?INDEX)")
+STATUSES = ["available", "booked", "confirmed", "completed", "cancelled", "closed"]
+
+
+# Планы запросов к графику на заполненной базе (SQLite EXPLAIN QUERY PLAN)
+class ScheduleQueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = CustomUser.objects.create_user(username="plan-patient", password="pass")
+        cls.doctors = [
+            Doctor.objects.create(
+                last_name=f"Врач{number}", first_name="Иван", specialization="Терапевт", start_work_year=2000
+            )
+            for number in range(5)
+        ]
+        today = timezone.localdate()
+        slots = []
+        for doctor in cls.doctors:
+            for day in range(-30, 30):
+                for hour in range(8, 18):
+                    status = STATUSES[(day + hour) % len(STATUSES)]
+                    slots.append(Schedule(
+                        doctor=doctor,
+                        date=today + timedelta(days=day),
+                        start_time=time(hour),
+                        end_time=time(hour, 30),
+                        status=status,
+                        booked_by=cls.patient if status != "available" and hour % 2 else None,
+                    ))
+        Schedule.objects.bulk_create(slots)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertIsNone(FULL_SCAN.search(plan), f"Полный проход по таблице:\n{queryset.query}\n{plan}")
+
+    # Для запросов, которые не возвращают QuerySet (SQL берётся из перехваченных запросов)
+    def assertPlanForSQL(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = "\n".join(row[-1] for row in cursor.fetchall())
+        self.assertIsNone(FULL_SCAN.search(plan), f"Полный проход по таблице:\n{sql}\n{plan}")
+
+    def test_available_slots(self):
+        self.assertUsesIndex(get_available_slots_queryset())
+        self.assertUsesIndex(get_available_slots_queryset(self.doctors[0].slug))
+
+    def test_schedule_requests(self):
+        view = ScheduleRequestsView()
+        self.assertUsesIndex(view.get_queryset())
+
+    def test_pending_requests_count(self):
+        with CaptureQueriesContext(connection) as context:
+            count_pending_requests()
+        self.assertPlanForSQL(context.captured_queries[-1]["sql"])
+
+    def test_patient_appointments(self):
+        upcoming, past = get_patient_appointments(self.patient)
+        self.assertUsesIndex(upcoming)
+        self.assertUsesIndex(past)
+
+    def test_doctor_day(self):
+        queryset = Schedule.objects.filter(doctor_id=self.doctors[0].id, date=timezone.localdate())
+        self.assertUsesIndex(queryset.exclude(status="booked").exclude(status="confirmed"))
+
+    def test_next_slots_for_recommendation(self):
+        with CaptureQueriesContext(connection) as context:
+            doctors_with_next_slots("Терапевт")
+        self.assertPlanForSQL(context.captured_queries[-1]["sql"])
+
+    def test_verified_reviews(self):
+        Review.objects.bulk_create(
+            Review(doctor=doctor, patient=self.patient, rating=5, verified=number % 2 == 0)
+            for number, doctor in enumerate(self.doctors * 20)
+        )
+        self.assertUsesIndex(Review.objects.filter(doctor=self.doctors[0], verified=True).select_related("patient"))
+
+    def test_admin_schedule_page_and_facets(self):
+        slot = Schedule.objects.filter(doctor=self.doctors[1]).earliest("date", "start_time")
+        view = ScheduleListView()
+        view.request = RequestFactory().get("/", {"after": f"{slot.doctor_id}_{slot.date}_{slot.start_time}"})
+        with CaptureQueriesContext(connection) as context:
+            view.get_queryset()
+            view.get_facets()
+        for query in context.captured_queries:
+            self.assertPlanForSQL(query["sql"])
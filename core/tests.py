@@ -1,3 +1,1381 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time as time_module
+from datetime import date, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.template.loader import render_to_string
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.checks import database_cache_check, shared_cache_check
+from core.middleware import RequestProfilingMiddleware
+from core.signals import AvailabilityRefresh
+from core.models import (
+    Contacts,
+    Doctor,
+    HeroCard,
+    Promotion,
+    PromotionCampaign,
+    Review,
+    Schedule,
+    Services,
+    ShiftTemplate,
+    SmallCard,
+    SquareCard,
+    SymptomAnalysis,
+    TelegramOutbox,
+    schedule_status_changed,
+)
+from core.utils.admission import SLOT_KEY, AdmissionRejected, llm_limiter
+from core.utils.campaigns import run_campaign
+from core.utils.gigachat import TechLineFilter, reset_clients
+from core.utils.page_cache import model_versions, page_version, version_key
+from core.utils.pending_requests import get_pending_count
+from core.utils.shifts import bulk_create_slots, generate_shift_slots, planned_slots
+from core.utils.keyword_triage import KeywordTriage, reset_model, tokenize
+from core.utils.specializations import canonical_key, doctors_with_next_slots, specialization_index
+from core.utils.symptom_cache import SymptomCache, normalize_query, query_hash, symptom_cache
+from core.utils.telegram import TelegramDispatcher, send_telegram_message
+from core.views import AsyncSymptomCheckerView, SymptomStreamView
+from users.models import CustomUser
+
+
+# Кэш в памяти процесса: для тестов, которые считают SQL-запросы страниц или работают в потоках.
+# По умолчанию тесты идут с общим кэшем из настроек (DatabaseCache - каждое чтение кэша это запрос)
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+# Локальный HTTP-сервер для подмены внешних API (Telegram, GigaChat)
+class StubServer:
+    def __init__(self, respond=None, delay=0):
+        self.received = []
+        self.responses = []
+        self.clients = []
+        self.respond = respond
+        self.delay = delay
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stub.received.append(parse_qs(body.decode()))
+                stub.clients.append((self.path, self.client_address))
+                if stub.delay:
+                    time_module.sleep(stub.delay)
+                if stub.responses:
+                    code, payload = stub.responses.pop(0)
+                elif stub.respond:
+                    code, payload = stub.respond(self.path, body)
+                else:
+                    code, payload = 200, {"ok": True}
+                # bytes - готовый поток событий, остальное - JSON
+                if isinstance(payload, bytes):
+                    data, content_type = payload, "text/event-stream"
+                else:
+                    data, content_type = json.dumps(payload).encode(), "application/json"
+                try:
+                    self.send_response(code)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except BrokenPipeError:
+                    # Клиент уже отключился по таймауту
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TelegramOutboxTests(TestCase):
+    def setUp(self):
+        self.stub = StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.settings_override = override_settings(
+            TELEGRAM_API_URL=self.stub.url,
+            TELEGRAM_BOT_TOKEN="test-token",
+            TELEGRAM_CHAT_ID="42",
+            TELEGRAM_DIGEST_THRESHOLD=3,
+            TELEGRAM_OUTBOX_MAX_ATTEMPTS=2,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.dispatcher = TelegramDispatcher()
+        self.addCleanup(self.dispatcher.close)
+
+    def test_single_message_is_sent_and_marked(self):
+        entry = TelegramOutbox.objects.create(text="Новая запись")
+
+        stats = self.dispatcher.dispatch_once()
+
+        entry.refresh_from_db()
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual(entry.status, "sent")
+        self.assertEqual(self.stub.received[0]["text"], ["Новая запись"])
+        self.assertEqual(self.stub.received[0]["chat_id"], ["42"])
+
+    def test_burst_is_coalesced_into_digest(self):
+        for i in range(5):
+            TelegramOutbox.objects.create(text=f"Запись {i}")
+
+        stats = self.dispatcher.dispatch_once()
+
+        self.assertEqual(stats["sent"], 5)
+        self.assertEqual(stats["messages"], 1)
+        self.assertEqual(len(self.stub.received), 1)
+        self.assertIn("Новые заявки (5)", self.stub.received[0]["text"][0])
+        self.assertFalse(TelegramOutbox.objects.filter(status="pending").exists())
+
+    def test_claimed_entries_are_not_taken_twice(self):
+        for i in range(3):
+            TelegramOutbox.objects.create(text=f"Запись {i}")
+
+        claimed = self.dispatcher.claim_batch()
+        self.assertEqual(len(claimed), 3)
+        self.assertEqual(TelegramDispatcher().claim_batch(), [])
+
+        # Обработчик упал - после срока аренды уведомления забирает другой
+        TelegramOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(len(TelegramDispatcher().claim_batch()), 3)
+
+    def test_digest_is_packed_with_header_and_never_truncated(self):
+        texts = [f"Запись {i} " + "х" * 1500 for i in range(5)]
+        for text in texts:
+            TelegramOutbox.objects.create(text=text)
+
+        self.dispatcher.dispatch_once()
+
+        sent = [request["text"][0] for request in self.stub.received]
+        self.assertTrue(all(len(text) <= 4096 for text in sent))
+        self.assertTrue(all(any(text in message for message in sent) for text in texts))
+        self.assertIn("Новые заявки (2)", sent[0])
+
+    def test_long_single_message_is_split(self):
+        TelegramOutbox.objects.create(text="строка\n" * 1000)
+
+        self.dispatcher.dispatch_once()
+
+        self.assertEqual(len(self.stub.received), 2)
+        self.assertEqual(TelegramOutbox.objects.get().status, "sent")
+
+    def test_delivered_parts_are_not_resent(self):
+        TelegramOutbox.objects.create(text="первая\n" * 400 + "вторая\n" * 400)
+        self.stub.responses = [(200, {"ok": True}), (500, {"ok": False})]
+
+        self.dispatcher.dispatch_once()
+        entry = TelegramOutbox.objects.get()
+        self.assertEqual((entry.status, entry.parts_sent), ("pending", 1))
+
+        TelegramOutbox.objects.update(next_attempt_at=timezone.now())
+        self.dispatcher.dispatch_once()
+
+        sent = [request["text"][0] for request in self.stub.received]
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(sent[1], sent[2])
+        self.assertEqual(TelegramOutbox.objects.get().status, "sent")
+
+    def test_expired_lease_is_not_overwritten(self):
+        entry = TelegramOutbox.objects.create(text="Новая запись")
+
+        # Пока обработчик отправлял, аренда истекла и строку забрал другой
+        def taken_over(text):
+            TelegramOutbox.objects.update(next_attempt_at=timezone.now())
+            TelegramDispatcher().claim_batch()
+
+        with mock.patch.object(self.dispatcher.client, "send", side_effect=taken_over):
+            self.dispatcher.dispatch_once()
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "sending")
+        self.assertIsNotNone(entry.claim_token)
+
+    def test_error_is_retried_with_backoff_then_failed(self):
+        entry = TelegramOutbox.objects.create(text="Новая запись")
+        self.stub.responses = [(500, {"ok": False}), (429, {"parameters": {"retry_after": 7}})]
+
+        self.dispatcher.dispatch_once()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "pending")
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+
+        # До наступления next_attempt_at уведомление не берётся
+        self.assertEqual(self.dispatcher.dispatch_once()["sent"], 0)
+
+        TelegramOutbox.objects.update(next_attempt_at=timezone.now())
+        self.dispatcher.dispatch_once()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "failed")
+        self.assertEqual(len(self.stub.received), 2)
+
+
+class BookAppointmentOutboxTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="patient", password="pass", last_name="иванов", first_name="иван", phone="+79990000000"
+        )
+        doctor = Doctor.objects.create(
+            last_name="Павлов", first_name="Иван", specialization="Терапевт", start_work_year=2000
+        )
+        self.slot = Schedule.objects.create(
+            doctor=doctor,
+            date=date.today() + timedelta(days=1),
+            start_time=time(10, 0),
+            end_time=time(10, 30),
+        )
+
+    @override_settings(TELEGRAM_API_URL="http://127.0.0.1:9")
+    def test_booking_enqueues_notification_without_network(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse("users:book_appointment", args=[self.slot.id]))
+
+        self.assertRedirects(response, reverse("users:my_appointments"), fetch_redirect_response=False)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.status, "booked")
+        entry = TelegramOutbox.objects.get()
+        self.assertEqual(entry.status, "pending")
+        self.assertIn("Иванов Иван", entry.text)
+
+    def test_taken_slot_is_not_booked_twice(self):
+        other = CustomUser.objects.create_user(username="other", password="pass")
+        self.assertTrue(Schedule.objects.get(pk=self.slot.pk).book(other))
+        self.client.force_login(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("users:book_appointment", args=[self.slot.id]))
+
+        self.assertRedirects(response, reverse("users:available_schedule"), fetch_redirect_response=False)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked_by, other)
+        self.assertFalse(TelegramOutbox.objects.exists())
+
+    def test_booking_requires_post_and_login(self):
+        url = reverse("users:book_appointment", args=[self.slot.id])
+
+        self.assertEqual(self.client.post(url).status_code, 302)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.status, "available")
+
+    def test_booking_updates_counters(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slot.book(self.user)
+
+        self.assertEqual(get_pending_count(), 1)
+        self.assertEqual(Doctor.objects.get().free_slots_7d, 0)
+
+
+# Одновременная запись на один слот (потоки со своими соединениями - нужен TransactionTestCase)
+class BookingStressTests(TransactionTestCase):
+    def test_exactly_one_booking_per_round(self):
+        CustomUser.objects.bulk_create(CustomUser(username=f"patient{number}") for number in range(8))
+        out = StringIO()
+
+        call_command("stress_booking", "--threads", "8", "--rounds", "5", stdout=out)
+
+        self.assertIn("записей: 5", out.getvalue())
+        self.assertIn("записей/с", out.getvalue())
+        self.assertFalse(Schedule.objects.exists())
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class PromotionCampaignTests(TestCase):
+    def setUp(self):
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f"user{i}", email=f"user{i}@example.com", first_name=f"имя{i}",
+                       subscribe_promotions=True)
+            for i in range(25)
+        )
+        CustomUser.objects.create(username="nosub", email="nosub@example.com")
+
+    def test_promotion_creates_campaign_without_sending(self):
+        Promotion.objects.create(title="Скидка")
+
+        self.assertEqual(PromotionCampaign.objects.get().status, "pending")
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_campaign_renders_once_and_personalizes(self):
+        Promotion.objects.create(title="Скидка")
+        campaign = PromotionCampaign.objects.get()
+
+        with mock.patch("core.utils.campaigns.render_to_string", wraps=render_to_string) as render:
+            stats = run_campaign(campaign, batch_size=10)
+
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(stats["sent"], 25)
+        self.assertEqual(len(mail.outbox), 25)
+        html = mail.outbox[0].alternatives[0][0]
+        self.assertIn("Здравствуйте, Имя0!", html)
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.sent_count), ("done", 25))
+
+    def test_interrupted_campaign_resumes_from_checkpoint(self):
+        Promotion.objects.create(title="Скидка")
+        campaign = PromotionCampaign.objects.get()
+        checkpoint = CustomUser.objects.filter(subscribe_promotions=True).order_by("id")[9]
+        campaign.last_user_id = checkpoint.id
+        campaign.save()
+
+        stats = run_campaign(campaign, batch_size=10)
+
+        self.assertEqual(stats["sent"], 15)
+        self.assertNotIn([checkpoint.email], [m.to for m in mail.outbox])
+
+
+    def test_campaign_is_sent_by_one_worker(self):
+        Promotion.objects.create(title="Скидка")
+        campaign = PromotionCampaign.objects.get()
+        # Другой обработчик уже захватил рассылку
+        PromotionCampaign.objects.update(
+            status="running", lease_until=timezone.now() + timedelta(minutes=5)
+        )
+
+        self.assertIsNone(run_campaign(campaign))
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Аренда истекла - рассылку продолжает следующий обработчик
+        PromotionCampaign.objects.update(lease_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(run_campaign(campaign)["sent"], 25)
+        self.assertIsNone(run_campaign(campaign))
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class ScheduleTransitionTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="patient", password="pass", email="patient@example.com", first_name="иван"
+        )
+        self.staff = CustomUser.objects.create_user(username="admin", password="pass", is_staff=True)
+        doctor = Doctor.objects.create(
+            last_name="Павлов", first_name="Иван", specialization="Терапевт", start_work_year=2000
+        )
+        self.slot = Schedule.objects.create(
+            doctor=doctor,
+            date=date.today() + timedelta(days=1),
+            start_time=time(10, 0),
+            end_time=time(10, 30),
+            booked_by=self.user,
+            status="booked",
+        )
+
+    def test_loaded_slot_tracks_transition(self):
+        slot = Schedule.objects.get(pk=self.slot.pk)
+        self.assertIsNone(slot.status_transition)
+
+        slot.status = "confirmed"
+        self.assertEqual(slot.status_transition, ("booked", "confirmed"))
+
+    def test_save_without_confirmation_is_single_query(self):
+        slot = Schedule.objects.get(pk=self.slot.pk)
+        slot.status = "closed"
+
+        with self.assertNumQueries(1):
+            slot.save()
+
+        self.assertIsNone(slot.status_transition)
+
+    def test_transition_hook_receives_old_and_new_status(self):
+        seen = []
+
+        @Schedule.on_transition("booked", "completed")
+        def record(instance, old_status, new_status):
+            seen.append((instance.pk, old_status, new_status))
+
+        self.addCleanup(
+            schedule_status_changed.disconnect, sender=Schedule,
+            dispatch_uid=f"{record.__module__}.{record.__qualname__}",
+        )
+        slot = Schedule.objects.get(pk=self.slot.pk)
+        slot.status = "completed"
+        slot.save()
+        slot.save()
+
+        self.assertEqual(seen, [(self.slot.pk, "booked", "completed")])
+
+    def test_confirm_request_sends_single_email(self):
+        self.client.force_login(self.staff)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("users:confirm_request", args=[self.slot.pk]))
+            self.client.get(reverse("users:confirm_request", args=[self.slot.pk]))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["patient@example.com"])
+
+    def test_rolled_back_confirmation_sends_no_email(self):
+        slot = Schedule.objects.get(pk=self.slot.pk)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    slot.status = "confirmed"
+                    slot.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_save_without_status_in_update_fields_is_not_a_transition(self):
+        seen = []
+
+        @Schedule.on_transition()
+        def record(instance, old_status, new_status):
+            seen.append((old_status, new_status))
+
+        self.addCleanup(
+            schedule_status_changed.disconnect, sender=Schedule,
+            dispatch_uid=f"{record.__module__}.{record.__qualname__}",
+        )
+        slot = Schedule.objects.get(pk=self.slot.pk)
+        slot.status = "confirmed"
+        slot.save(update_fields=["end_time"])
+
+        self.assertEqual(seen, [])
+        self.assertEqual(slot.status_transition, ("booked", "confirmed"))
+        slot.save(update_fields=["status"])
+        self.assertEqual(seen, [("booked", "confirmed")])
+
+
+# Ответы поддельного GigaChat: OAuth-токен и chat/completions
+# Ответ частями; техническая строка разорвана между чанками
+STREAM_CHUNKS = ["Похоже ", "на ОРВИ. ", "Внимание!\nВРАЧ_", "ДЛЯ_БА", "ЗЫ: [ЛОР]"]
+
+
+def fake_gigachat_stream():
+    events = []
+    for text in STREAM_CHUNKS:
+        chunk = {
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": text}}],
+            "created": 0,
+            "model": "GigaChat",
+            "object": "chat.completion",
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode()
+
+
+def fake_gigachat(path, body):
+    if path.endswith("/oauth"):
+        return 200, {"access_token": "token", "expires_at": int((time_module.time() + 1800) * 1000)}
+    if json.loads(body).get("stream"):
+        return 200, fake_gigachat_stream()
+    return 200, {
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {
+                "role": "assistant",
+                "content": "Похоже на ОРВИ. Внимание! Это предварительная информация\nВРАЧ_ДЛЯ_БАЗЫ: [ЛОР]",
+            },
+        }],
+        "created": 0,
+        "model": "GigaChat",
+        "object": "chat.completion",
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SymptomCheckerGigaChatTests(TestCase):
+    def start_server(self, delay=0, timeout=5):
+        stub = StubServer(respond=fake_gigachat, delay=delay).__enter__()
+        self.addCleanup(stub.__exit__)
+        override = override_settings(
+            GIGACHAT_BASE_URL=stub.url,
+            GIGACHAT_AUTH_URL=f"{stub.url}/oauth",
+            GIGACHAT_CREDENTIALS="Y2xpZW50OnNlY3JldA==",
+            GIGACHAT_CERTS=None,
+            GIGACHAT_TIMEOUT=timeout,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(reset_clients)
+        symptom_cache.clear()
+        cache.clear()
+        reset_model()
+        return stub
+
+    def test_repeated_complaint_is_answered_from_cache(self):
+        stub = self.start_server()
+
+        self.client.post(reverse("symptom_checker"), {"symptoms": "Болит горло, температура"})
+        response = self.client.post(reverse("symptom_checker"), {"symptoms": "температура... болит ГОРЛО"})
+
+        self.assertContains(response, "Похоже на ОРВИ")
+        self.assertEqual([path for path, _ in stub.clients].count("/chat/completions"), 1)
+        self.assertEqual(symptom_cache.stats()["hits"], 1)
+
+        # После перезапуска ответ берётся из SymptomAnalysis по хэшу
+        symptom_cache.clear()
+        self.client.post(reverse("symptom_checker"), {"symptoms": "горло болит температура"})
+        self.assertEqual([path for path, _ in stub.clients].count("/chat/completions"), 1)
+        # Ответы из кэша тоже в истории, но ответ ИИ - один
+        self.assertEqual(
+            list(SymptomAnalysis.objects.order_by("id").values_list("source", flat=True)), ["ai", "cache", "cache"]
+        )
+
+    def test_token_and_connection_are_reused(self):
+        stub = self.start_server()
+
+        for symptoms in ("болит горло", "насморк", "кашель"):
+            response = self.client.post(reverse("symptom_checker"), {"symptoms": symptoms})
+            self.assertContains(response, "Похоже на ОРВИ")
+
+        paths = [path for path, _ in stub.clients]
+        self.assertEqual(paths.count("/oauth"), 1)
+        chat_clients = {client for path, client in stub.clients if path != "/oauth"}
+        self.assertEqual(len(chat_clients), 1)
+        self.assertEqual(SymptomAnalysis.objects.filter(recommended_doctor="ЛОР").count(), 3)
+
+    def test_configured_timeout_is_applied(self):
+        self.start_server(delay=1, timeout=0.2)
+
+        response = self.client.post(reverse("symptom_checker"), {"symptoms": "болит горло"})
+
+        self.assertContains(response, "Произошла ошибка при связи с ИИ")
+        self.assertFalse(SymptomAnalysis.objects.exists())
+
+    async def test_async_view_answers_concurrent_requests(self):
+        stub = self.start_server(delay=0.3)
+        factory = AsyncRequestFactory()
+        view = AsyncSymptomCheckerView.as_view()
+
+        async def ask(symptoms):
+            request = factory.post("/check-symptoms/", {"symptoms": symptoms})
+            request.user = AnonymousUser()
+            request.auser = sync_to_async(lambda: request.user)
+            return await view(request)
+
+        responses = await asyncio.gather(*(ask(s) for s in ("болит горло", "насморк", "кашель")))
+
+        for response in responses:
+            self.assertContains(response, "Похоже на ОРВИ")
+        self.assertEqual(await SymptomAnalysis.objects.acount(), 3)
+
+    def stream_events(self, chunks):
+        events = []
+        for frame in b"".join(chunks).decode().split("\n\n"):
+            if frame:
+                name, data = frame.split("\n")
+                events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        return events
+
+    def test_stream_relays_tokens_without_tech_line(self):
+        self.start_server()
+
+        response = self.client.post(reverse("symptom_checker_stream"), {"symptoms": "болит горло"})
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = self.stream_events(response.streaming_content)
+        text = "".join(data["text"] for name, data in events if name == "token")
+        self.assertEqual(text, "Похоже на ОРВИ. Внимание!\n")
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(events[-1][1]["doctor"], "ЛОР")
+        analysis = SymptomAnalysis.objects.get()
+        self.assertEqual((analysis.ai_result, analysis.recommended_doctor), ("Похоже на ОРВИ. Внимание!", "ЛОР"))
+
+        # Повторная жалоба приходит из кэша одним событием
+        response = self.client.post(reverse("symptom_checker_stream"), {"symptoms": "горло болит"})
+        events = self.stream_events(response.streaming_content)
+        self.assertEqual([name for name, _ in events], ["token", "done"])
+        self.assertEqual(SymptomAnalysis.objects.filter(source="ai").count(), 1)
+        self.assertEqual(SymptomAnalysis.objects.filter(source="cache").count(), 1)
+
+    async def test_stream_under_asgi(self):
+        self.start_server()
+        request = AsyncRequestFactory().post("/check-symptoms/stream/", {"symptoms": "насморк"})
+        request.user = AnonymousUser()
+
+        response = await sync_to_async(SymptomStreamView.as_view())(request)
+        events = self.stream_events([chunk async for chunk in response])
+
+        self.assertNotIn("ВРАЧ", json.dumps(events, ensure_ascii=False))
+        self.assertEqual(events[-1][1]["doctor"], "ЛОР")
+        self.assertEqual(await SymptomAnalysis.objects.acount(), 1)
+
+    def test_stream_reports_errors_as_event(self):
+        self.start_server(delay=1, timeout=0.2)
+
+        response = self.client.post(reverse("symptom_checker_stream"), {"symptoms": "кашель"})
+
+        events = self.stream_events(response.streaming_content)
+        self.assertEqual(events[-1][0], "error")
+        self.assertFalse(SymptomAnalysis.objects.exists())
+
+    def test_tech_line_filter_holds_back_partial_marker(self):
+        tech_filter = TechLineFilter()
+        emitted = "".join(tech_filter.feed(chunk) for chunk in ["Текст ВР", "АЧ", "_ДЛЯ_БАЗЫ: [Хирург]"])
+
+        self.assertEqual(emitted, "Текст ")
+        self.assertEqual(tech_filter.finish(), ("", "Текст", "Хирург"))
+
+        tech_filter = TechLineFilter()
+        self.assertEqual(tech_filter.feed("ВРАЧ приедет"), "ВРАЧ приедет")
+        self.assertEqual(tech_filter.feed(" В"), " ")
+        self.assertEqual(tech_filter.finish()[0], "В")
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LLM_MAX_CONCURRENT=2, LLM_MAX_CONCURRENT_PER_PROCESS=1, LLM_QUEUE_SIZE=1, LLM_QUEUE_TIMEOUT=2)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        symptom_cache.clear()
+        self.addCleanup(symptom_cache.clear)
+        patcher = mock.patch(
+            "core.utils.triage.ask_gigachat", return_value="Похоже на ОРВИ\nВРАЧ_ДЛЯ_БАЗЫ: [ЛОР]"
+        )
+        self.ask_gigachat = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def hold_slot(self):
+        slot = llm_limiter.try_acquire()
+        self.addCleanup(llm_limiter.release, slot)
+        return slot
+
+    @override_settings(LLM_QUEUE_SIZE=0, LLM_RETRY_AFTER=7)
+    def test_full_queue_is_rejected_with_retry_after(self):
+        self.hold_slot()
+
+        response = self.client.post(reverse("symptom_checker"), {"symptoms": "болит горло"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertContains(response, "перегружен", status_code=503)
+        self.assertEqual(llm_limiter.metrics()["global"]["rejected_busy"], 1)
+
+    def test_waiting_request_gets_released_slot(self):
+        slot = llm_limiter.try_acquire()
+        threading.Timer(0.3, llm_limiter.release, [slot]).start()
+
+        response = self.client.post(reverse("symptom_checker"), {"symptoms": "болит горло"})
+
+        self.assertContains(response, "Похоже на ОРВИ")
+        self.assertEqual(llm_limiter.metrics()["process"]["in_flight"], 0)
+
+    @override_settings(LLM_QUEUE_TIMEOUT=0.2)
+    def test_queue_wait_is_bounded(self):
+        self.hold_slot()
+
+        with self.assertRaises(AdmissionRejected) as rejected:
+            llm_limiter.acquire()
+
+        self.assertEqual(rejected.exception.reason, "timeout")
+        self.assertEqual(llm_limiter.waiting, 0)
+
+    @override_settings(LLM_MAX_CONCURRENT_PER_PROCESS=4)
+    def test_slots_are_shared_between_processes(self):
+        # Слоты, занятые другими процессами, видны через кэш
+        cache.set(SLOT_KEY.format(0), "other", 60)
+        cache.set(SLOT_KEY.format(1), "other", 60)
+
+        self.assertIsNone(llm_limiter.try_acquire())
+        self.assertEqual(llm_limiter.metrics()["global"]["in_flight"], 2)
+
+    @override_settings(LLM_QUOTA_PER_IP=(2, 60))
+    def test_ip_quota(self):
+        for symptoms in ["болит горло", "болит спина"]:
+            response = self.client.post(reverse("symptom_checker"), {"symptoms": symptoms})
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(reverse("symptom_checker"), {"symptoms": "болит зуб"})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+
+    @override_settings(LLM_QUOTA_PER_USER=(1, 60))
+    def test_user_quota_and_stream_rejection(self):
+        user = CustomUser.objects.create_user(username="llm-patient", password="pass")
+        self.client.force_login(user)
+        self.client.post(reverse("symptom_checker"), {"symptoms": "болит горло"})
+
+        response = self.client.post(reverse("symptom_checker_stream"), {"symptoms": "болит спина"})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Превышено", response.json()["error"])
+
+    @override_settings(LLM_QUOTA_PER_IP=(1, 60), LLM_QUEUE_SIZE=0)
+    def test_known_answers_use_no_quota_or_slot(self):
+        self.client.post(reverse("symptom_checker"), {"symptoms": "болит горло"})
+        # Все слоты процесса заняты, квота исчерпана - но ответ уже есть в кэше
+        self.hold_slot()
+
+        response = self.client.post(reverse("symptom_checker"), {"symptoms": "горло болит"})
+        self.assertContains(response, "Похоже на ОРВИ")
+        response = self.client.post(reverse("symptom_checker_stream"), {"symptoms": "горло болит"})
+        self.assertIn("Похоже на ОРВИ", b"".join(response.streaming_content).decode())
+        self.assertEqual(self.ask_gigachat.call_count, 1)
+        self.assertEqual(llm_limiter.metrics()["global"]["rejected_quota"], 0)
+
+    def test_metrics_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse("users:llm_metrics_api")).status_code, 302)
+
+        staff = CustomUser.objects.create_user(username="llm-admin", password="pass", is_staff=True)
+        self.client.force_login(staff)
+        data = self.client.get(reverse("users:llm_metrics_api")).json()
+
+        self.assertEqual(data["process"]["queue_size"], 1)
+        self.assertEqual(data["global"]["max_concurrent"], 2)
+
+
+class ClinicDataBenchmarkTests(TestCase):
+    def test_generate_data_and_benchmark_views(self):
+        out = StringIO()
+        call_command(
+            "generate_clinic_data", "--doctors", "2", "--patients", "20", "--years", "0.1",
+            "--reviews", "5", "--analyses", "10", "--chunk-size", "7", stdout=out,
+        )
+
+        self.assertEqual(Doctor.objects.count(), 2)
+        self.assertEqual(CustomUser.objects.filter(role="patient").count(), 20)
+        statuses = set(Schedule.objects.values_list("status", flat=True))
+        self.assertTrue({"completed", "available"} <= statuses)
+        self.assertFalse(Schedule.objects.filter(status="completed", booked_by__isnull=True).exists())
+        self.assertEqual(SymptomAnalysis.objects.exclude(query_hash="").count(), 10)
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            args = ["benchmark_views", "--views", "home", "my_appointments", "--repeat", "2", "--baseline", baseline]
+            call_command(*args, "--save-baseline", stdout=StringIO())
+            with open(baseline, encoding="utf-8") as file:
+                self.assertEqual(set(json.load(file)), {"home", "my_appointments"})
+
+            out = StringIO()
+            call_command(*args, "--tolerance", "100", stdout=out)
+        self.assertIn("SQL +0", out.getvalue())
+
+        # Повторный запуск с --clear заменяет синтетические данные
+        call_command("generate_clinic_data", "--doctors", "1", "--patients", "3", "--years", "0.05",
+                     "--reviews", "0", "--analyses", "0", "--clear", stdout=StringIO())
+        self.assertEqual(Doctor.objects.count(), 1)
+        self.assertEqual(SymptomAnalysis.objects.count(), 0)
+
+
+@override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_HEADERS=True, REQUEST_PROFILING_SAMPLE_RATE=1)
+class RequestProfilingTests(TestCase):
+    def profiled(self, get_response):
+        request = RequestFactory().get("/profiled/")
+        return RequestProfilingMiddleware(get_response)(request)
+
+    # Записи в DatabaseCache (COUNT, SAVEPOINT) повторяются - считаем только запросы страницы
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_server_timing_header_and_log(self):
+        cache.clear()
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            response = self.client.get(reverse("home"))
+
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="SQL x\d+, duplicates 0", template;dur=[\d.]+')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/")
+        self.assertGreater(record["queries"], 0)
+        self.assertIn("template_ms", record)
+
+    @override_settings(REQUEST_PROFILING_SLOW_MS=0)
+    def test_duplicate_queries_and_external_calls(self):
+        def view(request):
+            for _ in range(3):
+                list(Doctor.objects.filter(specialization="ЛОР"))
+            with mock.patch("core.utils.telegram.requests.Session.post", return_value=mock.Mock(status_code=200)):
+                send_telegram_message("test")
+            return HttpResponse()
+
+        with self.assertLogs("core.profiling", "WARNING") as logs:
+            response = self.profiled(view)
+
+        self.assertIn("duplicates 2", response["Server-Timing"])
+        self.assertIn("telegram;dur=", response["Server-Timing"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["repeated_sql"][0]["count"], 3)
+
+    def test_disabled_and_unsampled(self):
+        with override_settings(REQUEST_PROFILING=False), self.assertRaises(MiddlewareNotUsed):
+            RequestProfilingMiddleware(lambda request: HttpResponse())
+
+        with override_settings(REQUEST_PROFILING_SAMPLE_RATE=0):
+            response = self.profiled(lambda request: HttpResponse())
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DoctorAvailabilityTests(TestCase):
+    def setUp(self):
+        self.doctor = Doctor.objects.create(
+            last_name="Сидоров", first_name="Пётр", specialization="Терапевт", start_work_year=2000
+        )
+        self.today = timezone.localdate()
+
+    def add_slot(self, days, hour, status="available"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Schedule.objects.create(
+                doctor=self.doctor, date=self.today + timedelta(days=days),
+                start_time=time(hour), end_time=time(hour, 30), status=status,
+            )
+
+    def test_summary_follows_slot_changes(self):
+        first = self.add_slot(1, 9)
+        self.add_slot(1, 10)
+        self.add_slot(10, 9)
+        self.add_slot(40, 9)
+        self.add_slot(-1, 9)
+        self.add_slot(2, 9, status="booked")
+
+        self.doctor.refresh_from_db()
+        self.assertEqual(timezone.localtime(self.doctor.next_free_slot).date(), self.today + timedelta(days=1))
+        self.assertEqual((self.doctor.free_slots_7d, self.doctor.free_slots_30d), (2, 3))
+
+        first.status = "booked"
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+
+        self.doctor.refresh_from_db()
+        self.assertEqual(timezone.localtime(self.doctor.next_free_slot).time(), time(10))
+        self.assertEqual((self.doctor.free_slots_7d, self.doctor.free_slots_30d), (1, 2))
+
+    def test_bulk_delete_refreshes_each_doctor_once(self):
+        other = Doctor.objects.create(last_name="Павлов", first_name="Иван", specialization="ЛОР", start_work_year=2000)
+        with self.captureOnCommitCallbacks(execute=True):
+            for hour in range(9, 17):
+                Schedule.objects.create(
+                    doctor=self.doctor, date=self.today + timedelta(days=1),
+                    start_time=time(hour), end_time=time(hour, 30),
+                )
+                Schedule.objects.create(
+                    doctor=other, date=self.today + timedelta(days=1),
+                    start_time=time(hour), end_time=time(hour, 30),
+                )
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Schedule.objects.filter(start_time__lt=time(13)).delete()
+
+        refreshes = [c for c in callbacks if isinstance(c, AvailabilityRefresh)]
+        self.assertEqual(len(refreshes), 1)
+        self.assertEqual(refreshes[0].doctor_ids, {self.doctor.pk, other.pk})
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.free_slots_7d, 4)
+
+        # Врач удаляется вместе со слотами - пересчёт не нужен
+        with self.captureOnCommitCallbacks() as callbacks:
+            other.delete()
+        self.assertFalse([c for c in callbacks if isinstance(c, AvailabilityRefresh)])
+
+    def test_rolled_back_savepoint_does_not_swallow_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Schedule.objects.create(
+                        doctor=self.doctor, date=self.today + timedelta(days=1), start_time=time(9), end_time=time(9, 30)
+                    )
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            Schedule.objects.create(
+                doctor=self.doctor, date=self.today + timedelta(days=1), start_time=time(10), end_time=time(10, 30)
+            )
+
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.free_slots_7d, 1)
+
+    def test_periodic_refresh_and_list_without_extra_queries(self):
+        self.add_slot(3, 9)
+        # Изменение в обход сигналов подхватывается периодической командой
+        Schedule.objects.update(status="closed")
+        call_command("refresh_doctor_availability", stdout=StringIO())
+        self.doctor.refresh_from_db()
+        self.assertIsNone(self.doctor.next_free_slot)
+        self.assertEqual(self.doctor.free_slots_30d, 0)
+
+        Schedule.objects.update(status="available")
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("refresh_doctor_availability", stdout=StringIO())
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("doctors_list"))
+        self.assertContains(response, "Свободно: 1 на неделе, 1 в месяц")
+
+
+class ShiftTemplateTests(TestCase):
+    def setUp(self):
+        self.doctor = Doctor.objects.create(
+            last_name="Сидоров", first_name="Пётр", specialization="Терапевт", start_work_year=2000
+        )
+        # Понедельник: приёмы по 40 минут с перерывом на обед
+        self.template = ShiftTemplate.objects.create(
+            doctor=self.doctor, weekday=0, start_time=time(9), end_time=time(13),
+            slot_minutes=40, break_start=time(11), break_end=time(11, 30),
+        )
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+
+    def test_slot_times_skip_break(self):
+        self.assertEqual(
+            [start for start, _ in self.template.slot_times()],
+            [time(9), time(9, 40), time(10, 20), time(11, 30), time(12, 10)],
+        )
+
+    def test_dry_run_then_generate_without_conflicts(self):
+        Schedule.objects.create(
+            doctor=self.doctor, date=self.monday, start_time=time(9), end_time=time(9, 40), status="booked"
+        )
+        args = ["generate_shifts", "--from", self.monday.isoformat(), "--weeks", "2"]
+
+        out = StringIO()
+        call_command(*args, "--dry-run", stdout=out)
+        self.assertIn("+9, уже есть 1", out.getvalue())
+        self.assertEqual(Schedule.objects.count(), 1)
+
+        call_command(*args, "--chunk-size", "3", stdout=StringIO())
+        self.assertEqual(Schedule.objects.filter(status="available").count(), 9)
+        self.assertEqual(Schedule.objects.get(date=self.monday, start_time=time(9)).status, "booked")
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.free_slots_30d, 9)
+
+        # Повторный запуск ничего не добавляет
+        out = StringIO()
+        call_command(*args, stdout=out)
+        self.assertIn("Создано слотов: 0", out.getvalue())
+
+    def test_template_validity_period(self):
+        self.template.valid_to = self.monday
+        self.template.save()
+
+        result = generate_shift_slots(self.monday, self.monday + timedelta(weeks=3), dry_run=True)
+
+        self.assertEqual(result["to_create"][self.doctor.id], 5)
+
+
+    def test_zero_slot_minutes_is_rejected_by_db(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ShiftTemplate.objects.create(
+                doctor=self.doctor, weekday=1, start_time=time(9), end_time=time(10), slot_minutes=0
+            )
+
+    def test_missing_shift_time_with_break_is_a_field_error(self):
+        template = ShiftTemplate(
+            doctor=self.doctor, weekday=1, end_time=time(13), break_start=time(11), break_end=time(11, 30)
+        )
+        with self.assertRaises(ValidationError) as raised:
+            template.full_clean()
+
+        self.assertIn("start_time", raised.exception.message_dict)
+
+    def test_overlapping_templates_are_rejected(self):
+        overlapping = ShiftTemplate(doctor=self.doctor, weekday=0, start_time=time(12), end_time=time(15))
+        with self.assertRaises(ValidationError):
+            overlapping.full_clean()
+
+        # Другой срок действия - не пересечение
+        self.template.valid_to = self.monday
+        self.template.save()
+        overlapping.valid_from = self.monday + timedelta(days=1)
+        overlapping.full_clean()
+
+    def test_overlapping_templates_do_not_overlap_slots(self):
+        ShiftTemplate.objects.create(doctor=self.doctor, weekday=0, start_time=time(9), end_time=time(10))
+
+        slots = list(planned_slots(self.monday, self.monday))
+
+        self.assertEqual([slot.start_time for slot in slots], [time(9), time(9, 40), time(10, 20), time(11, 30), time(12, 10)])
+
+    def test_created_count_excludes_skipped_conflicts(self):
+        existing = Schedule.objects.create(
+            doctor=self.doctor, date=self.monday, start_time=time(9), end_time=time(9, 40)
+        )
+        slots = [
+            Schedule(doctor=self.doctor, date=self.monday, start_time=start, end_time=end)
+            for start, end in [(time(9), time(9, 40)), (time(9, 40), time(10, 20))]
+        ]
+
+        self.assertEqual(bulk_create_slots(slots), 1)
+        self.assertEqual(Schedule.objects.exclude(pk=existing.pk).count(), 1)
+
+class ReviewAggregateTests(TestCase):
+    def setUp(self):
+        self.doctor = Doctor.objects.create(
+            last_name="Орлова", first_name="Анна", specialization="Кардиолог", start_work_year=2005
+        )
+        self.patient = CustomUser.objects.create_user(username="reviewer", password="pass")
+        Schedule.objects.create(
+            doctor=self.doctor, date=timezone.localdate() - timedelta(days=3),
+            start_time=time(9), end_time=time(9, 30), status="completed", booked_by=self.patient,
+        )
+
+    def assertRating(self, total, count):
+        self.doctor.refresh_from_db()
+        self.assertEqual((self.doctor.rating_sum, self.doctor.rating_count), (total, count))
+
+    def test_aggregates_follow_review_changes(self):
+        self.client.force_login(self.patient)
+        self.client.post(reverse("review_create", args=[self.doctor.slug]), {"rating": 4, "comment": "Хорошо"})
+
+        review = Review.objects.get()
+        self.assertTrue(review.verified)
+        self.assertRating(4, 1)
+
+        review.rating = 2
+        review.save()
+        self.assertRating(2, 1)
+
+        # Неподтверждённые отзывы в рейтинг не входят
+        other = Review.objects.create(doctor=self.doctor, patient=self.patient, rating=5)
+        self.assertRating(2, 1)
+        other.verified = True
+        other.save()
+        self.assertRating(7, 2)
+
+        review.delete()
+        self.assertRating(5, 1)
+
+    def test_doctor_page_uses_stored_rating(self):
+        Review.objects.create(doctor=self.doctor, patient=self.patient, rating=5, verified=True)
+        Review.objects.create(doctor=self.doctor, patient=self.patient, rating=3, verified=True)
+        Review.objects.create(doctor=self.doctor, patient=self.patient, rating=1)
+
+        response = self.client.get(reverse("doctor_detail", args=[self.doctor.slug]))
+
+        self.assertEqual(response.context["avg_rating"], 4)
+        self.assertEqual(response.context["review_count"], 2)
+        self.assertEqual(len(response.context["reviews"]), 2)
+
+    def test_repair_command(self):
+        Review.objects.create(doctor=self.doctor, patient=self.patient, rating=4)
+        Doctor.objects.update(rating_sum=100, rating_count=10)
+
+        call_command("repair_review_aggregates", stdout=StringIO())
+        self.assertRating(0, 0)
+
+        out = StringIO()
+        call_command("repair_review_aggregates", "--reverify", stdout=out)
+        self.assertIn("verified: 1", out.getvalue())
+        self.assertRating(4, 1)
+
+
+class SymptomCacheTests(TestCase):
+    def test_normalization_ignores_case_punctuation_order_and_endings(self):
+        self.assertEqual(
+            normalize_query("Болит горло, температура!"),
+            normalize_query("температура горло болит"),
+        )
+        self.assertEqual(normalize_query("болит горло"), normalize_query("горла болит"))
+
+    def test_cache_key_keeps_three_letter_stems(self):
+        # Ключ не должен меняться - по нему ищутся сохранённые ответы (query_hash)
+        self.assertEqual(normalize_query("ухо болит"), "бол ухо")
+        self.assertEqual(tokenize("ухо болит"), {"бол", "ух"})
+
+    def test_migration_hash_is_frozen(self):
+        migration = importlib.import_module("core.migrations.0017_symptomanalysis_query_hash")
+        complaint = "Болит горло, температура!"
+
+        self.assertEqual(migration.query_hash(complaint), query_hash(complaint))
+        with override_settings(SYMPTOM_CACHE_STEMMING=False):
+            self.assertNotEqual(query_hash(complaint), migration.query_hash(complaint))
+
+    def test_rehash_command_follows_stemming_setting(self):
+        analysis = SymptomAnalysis.objects.create(
+            user_query="болит горло", ai_result="-", query_hash=query_hash("болит горло")
+        )
+
+        with override_settings(SYMPTOM_CACHE_STEMMING=False):
+            out = StringIO()
+            call_command("rehash_symptom_queries", stdout=out)
+            analysis.refresh_from_db()
+            self.assertEqual(analysis.query_hash, query_hash("горло болит"))
+        self.assertIn("Пересчитано хэшей: 1", out.getvalue())
+
+    def test_lru_eviction_and_ttl(self):
+        cache = SymptomCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+
+        expired = SymptomCache(maxsize=2, ttl=60)
+        expired.set("a", 1)
+        with mock.patch("core.utils.symptom_cache.time.monotonic", return_value=time_module.monotonic() + 61):
+            self.assertIsNone(expired.get("a"))
+
+
+TRIAGE_HISTORY = [
+    ("болит горло", "ЛОР"),
+    ("заложен нос и болит ухо", "ЛОР"),
+    ("насморк и боль в горле", "ЛОР"),
+    ("стреляет в ухе", "ЛОР"),
+    ("горло першит, нос не дышит", "ЛОР"),
+    ("температура и слабость", "Терапевт"),
+    ("кашель и температура", "Терапевт"),
+    ("ломота в теле, слабость", "Терапевт"),
+    ("простуда, температура 38", "Терапевт"),
+    ("общая слабость и озноб", "терапевт"),
+]
+
+
+class KeywordTriageTests(TestCase):
+    def setUp(self):
+        self.model = KeywordTriage(TRIAGE_HISTORY, ["Кардиолог", "Терапевт"])
+
+    def test_confident_complaint_is_classified_locally(self):
+        self.assertEqual(self.model.classify("ухо болит и нос заложен", min_examples=4)[0], "ЛОР")
+        # Название - самое частое написание в истории
+        self.assertEqual(self.model.classify("слабость, озноб, температура", min_examples=4)[0], "Терапевт")
+
+    def test_ambiguous_or_unknown_complaint_goes_to_llm(self):
+        self.assertIsNone(self.model.classify("болит живот", min_examples=4))
+        self.assertIsNone(self.model.classify("болит горло, температура", min_examples=4))
+        self.assertIsNone(self.model.classify("болит горло", min_examples=6))
+
+    def test_explicit_specialization_is_recognized(self):
+        self.assertEqual(self.model.classify("хочу записаться к кардиологу"), ("Кардиолог", 1.0))
+
+    @override_settings(TRIAGE_MIN_EXAMPLES=4)
+    def test_view_skips_gigachat_for_confident_case(self):
+        SymptomAnalysis.objects.bulk_create(
+            SymptomAnalysis(user_query=query, ai_result="-", recommended_doctor=doctor)
+            for query, doctor in TRIAGE_HISTORY
+        )
+        reset_model()
+        symptom_cache.clear()
+        cache.clear()
+        self.addCleanup(reset_model)
+
+        with mock.patch("core.utils.triage.ask_gigachat") as ask:
+            response = self.client.post(reverse("symptom_checker"), {"symptoms": "заложен нос, стреляет в ухе"})
+
+        ask.assert_not_called()
+        self.assertContains(response, "обратиться к специалисту: ЛОР")
+
+    def test_benchmark_reports_coverage_and_accuracy(self):
+        # Обучение - история, проверка - 4 новейшие жалобы с другими формулировками
+        holdout = [
+            ("ухо болит и нос заложен", "ЛОР"),
+            ("слабость, озноб, температура", "Терапевт"),
+            ("нос не дышит, болит горло", "Терапевт"),
+            ("болит живот", "Гастроэнтеролог"),
+        ]
+        # Ответы кэша и локального классификатора в оценку не входят
+        echoes = [("болит живот", "ЛОР", "local"), ("нос не дышит, болит горло", "Терапевт", "cache")] * 3
+        rows = [SymptomAnalysis(user_query=query, ai_result="-", recommended_doctor=doctor) for query, doctor in TRIAGE_HISTORY]
+        rows += [SymptomAnalysis(user_query=query, ai_result="-", recommended_doctor=doctor) for query, doctor in holdout]
+        rows += [SymptomAnalysis(user_query=query, ai_result="-", recommended_doctor=doctor, source=source) for query, doctor, source in echoes]
+        SymptomAnalysis.objects.bulk_create(rows)
+        start = timezone.now() - timedelta(days=1)
+        for minutes, row in enumerate(rows):
+            SymptomAnalysis.objects.filter(pk=row.pk).update(created_at=start + timedelta(minutes=minutes))
+        out = StringIO()
+
+        call_command("triage_benchmark", "--holdout", "0.3", stdout=out)
+
+        self.assertIn("Обучение: 10 записей", out.getvalue())
+        self.assertIn("Проверка: 4 записей", out.getvalue())
+        self.assertIn("Отвечено локально: 75.0%", out.getvalue())
+        self.assertIn("Точность локальных ответов: 66.7%", out.getvalue())
+
+
+class SpecializationLookupTests(TestCase):
+    def setUp(self):
+        specialization_index.invalidate()
+        self.addCleanup(specialization_index.invalidate)
+        tomorrow = date.today() + timedelta(days=1)
+        self.ent = [
+            Doctor.objects.create(last_name=name, first_name="Иван", specialization="Оториноларинголог", start_work_year=2000)
+            for name in ("Петров", "Сидоров")
+        ]
+        Doctor.objects.create(last_name="Павлов", first_name="Иван", specialization="Терапевт", start_work_year=2000)
+        for doctor in self.ent:
+            Schedule.objects.bulk_create(
+                Schedule(doctor=doctor, date=tomorrow, start_time=time(9 + i, 0), end_time=time(9 + i, 30))
+                for i in range(5)
+            )
+        Schedule.objects.filter(doctor=self.ent[0], start_time=time(9, 0)).update(status="booked")
+
+    def test_synonyms_map_to_same_key(self):
+        self.assertEqual(canonical_key("ЛОР"), canonical_key("Оториноларинголог"))
+        self.assertEqual(canonical_key("ЛОР (оториноларинголог)"), "лор")
+        self.assertEqual(canonical_key("Врач-терапевт"), "терапевт")
+
+    def test_next_slots_are_fetched_in_one_windowed_query(self):
+        doctors_with_next_slots("ЛОР")
+
+        with self.assertNumQueries(2):
+            result = doctors_with_next_slots("ЛОР", slots_per_doctor=3)
+
+        self.assertEqual([item["doctor"] for item in result], self.ent)
+        self.assertEqual([slot.start_time for slot in result[0]["slots"]], [time(10), time(11), time(12)])
+        self.assertEqual(len(result[1]["slots"]), 3)
+
+    def test_unknown_specialist_returns_nothing(self):
+        self.assertEqual(doctors_with_next_slots("Астролог"), [])
+
+
+class HomePageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        HeroCard.objects.create(title="Клиника", slug="hero", image="hero_cards/hero.jpg")
+        SmallCard.objects.create(title="Анализы", slug="tests")
+        self.square = SquareCard.objects.create(title="Вакцинация", slug="vaccine", image="square_cards/vaccine.jpg")
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_anonymous_home_is_served_from_cache(self):
+        self.client.get(reverse("home"))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+
+        self.assertEqual(response.context["square_cards"], [self.square])
+
+    def test_card_change_invalidates_cache(self):
+        self.client.get(reverse("home"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.square.title = "Прививки"
+            self.square.save()
+        self.assertEqual(self.client.get(reverse("home")).context["square_cards"][0].title, "Прививки")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.square.delete()
+        self.assertEqual(self.client.get(reverse("home")).context["square_cards"], [])
+
+    def test_warm_command_fills_shared_cache(self):
+        call_command("warm_page_cache", stdout=StringIO())
+
+        # Карточки лежат в общем кэше под текущими версиями моделей
+        key = f"page:home:{page_version([HeroCard, SmallCard, SquareCard])}"
+        self.assertEqual(cache.get(key)["square_cards"], [self.square])
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_warm_command_refuses_local_cache(self):
+        with self.assertRaises(CommandError):
+            call_command("warm_page_cache", stdout=StringIO())
+
+
+class CatalogPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.doctor = Doctor.objects.create(
+            last_name="Сидоров", first_name="Пётр", specialization="Терапевт", start_work_year=2000
+        )
+        self.service = Services.objects.create(title="Приём терапевта", price=1500)
+        Contacts.objects.create(name="Клиника", address="Москва", phone="+74950000000", email="info@example.com")
+        Promotion.objects.create(title="Скидка", start_date=date.today(), end_date=date.today())
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_anonymous_pages_are_served_from_cache(self):
+        for name in ["doctors_list", "services_list", "promotion_list", "contacts"]:
+            with self.subTest(page=name):
+                first = self.client.get(reverse(name))
+                with self.assertNumQueries(0):
+                    second = self.client.get(reverse(name))
+                self.assertEqual(first.content, second.content)
+
+    def test_admin_edit_is_visible_immediately(self):
+        self.client.get(reverse("services_list"))
+        self.client.get(reverse("doctors_list"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.price = 1700
+            self.service.save()
+            self.doctor.specialization = "Кардиолог"
+            self.doctor.save()
+
+        self.assertContains(self.client.get(reverse("services_list")), "1700")
+        self.assertContains(self.client.get(reverse("doctors_list")), "Кардиолог")
+
+    def test_edit_bumps_version_in_shared_cache(self):
+        self.client.get(reverse("services_list"))
+        before = model_versions(Services)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.price = 1700
+            self.service.save()
+
+        # Версия записана в общий кэш (из настроек) - её видят все процессы сервера
+        self.assertGreater(cache.get(version_key(Services)), before[0])
+        self.assertContains(self.client.get(reverse("services_list")), "1700")
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_cache_key_changes_with_date(self):
+        self.client.get(reverse("doctors_list"))
+        tomorrow = timezone.localdate() + timedelta(days=1)
+
+        with mock.patch("core.views.timezone.localdate", return_value=tomorrow):
+            with self.assertNumQueries(1):
+                self.client.get(reverse("doctors_list"))
+
+    def test_warm_command_renders_catalog_pages(self):
+        call_command("warm_page_cache", stdout=StringIO())
+
+        # Страница собрана из общего кэша: запросы только к таблице кэша
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("contacts"))
+        self.assertTrue(all("django_cache" in query["sql"] for query in queries.captured_queries))
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_local_memory_cache_is_reported_in_production(self):
+        local = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        shared = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "django_cache"}}
+
+        with override_settings(DEBUG=False, CACHES=local):
+            self.assertEqual([w.id for w in shared_cache_check(None)], ["core.W001"])
+        with override_settings(DEBUG=False, CACHES=shared):
+            self.assertEqual(shared_cache_check(None), [])
+
+    def test_database_cache_cost_is_reported_on_deploy(self):
+        database = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "django_cache"}}
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://localhost"}}
+
+        with override_settings(CACHES=database):
+            self.assertEqual([w.id for w in database_cache_check(None)], ["core.W002"])
+        with override_settings(CACHES=redis):
+            self.assertEqual(database_cache_check(None), [])
+
+    def test_cache_table_is_created_by_migrations(self):
+        migration = importlib.import_module("core.migrations.0028_create_cache_table")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE django_cache")
+
+        migration.create_cache_table(None, mock.Mock(connection=connection))
+
+        self.assertIn("django_cache", connection.introspection.table_names())
@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     HomeView, ReviewCreateView, SquareCardDetailView, DoctorsListView, DoctorDetailView,
     ServicesListView, PromotionView, ContactsView,
-    TermsOfUseView, PrivacyPolicyView, SymptomCheckerView
+    TermsOfUseView, PrivacyPolicyView, SymptomCheckerView,
+    AsyncSymptomCheckerView, SymptomStreamView
 )
 
+# Под ASGI-сервером используется асинхронный вариант ИИ-бота
+symptom_checker_view = AsyncSymptomCheckerView if settings.SYMPTOM_CHECKER_ASYNC else SymptomCheckerView
+
 urlpatterns = [
     path('', HomeView.as_view(), name="home"),
     path('info-card/<slug:slug>/', SquareCardDetailView.as_view(), name='square_card_detail'),
@@ -16,5 +21,6 @@ urlpatterns = [
     path('contacts/', ContactsView.as_view(), name='contacts'),
     path('terms-of-use/', TermsOfUseView.as_view(), name='terms_of_use'),
     path('privacy-policy', PrivacyPolicyView.as_view(), name='privacy_policy'),
-    path("check-symptoms/", SymptomCheckerView.as_view(), name="symptom_checker"),
+    path("check-symptoms/", symptom_checker_view.as_view(), name="symptom_checker"),
+    path("check-symptoms/stream/", SymptomStreamView.as_view(), name="symptom_checker_stream"),
 ]
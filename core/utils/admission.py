@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+SLOT_KEY = "llm:slot:{}"
+METRIC_KEY = "llm:metrics:{}"
+QUOTA_KEY = "llm:quota:{}:{}"
+METRICS = ("admitted", "rejected_busy", "rejected_timeout", "rejected_quota")
+POLL_INTERVAL = 0.1  # секунд между попытками занять слот в очереди
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason  # busy - очередь полна, timeout - не дождались слота, quota - исчерпана квота
+        self.retry_after = retry_after
+
+
+def incr_metric(name):
+    key = METRIC_KEY.format(name)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR", "")
+
+
+# Token bucket в кэше: (токенов в запасе, время обновления).
+# Чтение и запись не атомарны - при гонке возможен лишний запрос, это допустимо
+def take_token(kind, ident, capacity, period):
+    key = QUOTA_KEY.format(kind, ident)
+    now = time.time()
+    rate = capacity / period
+    tokens, updated = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens < 1:
+        cache.set(key, (tokens, now), period)
+        return math.ceil((1 - tokens) / rate)
+    cache.set(key, (tokens - 1, now), period)
+    return 0
+
+
+# Квоты на IP и пользователя; при превышении - AdmissionRejected со временем до следующего токена
+def check_quota(ip, user_id=None):
+    retry_after = take_token("ip", ip, *settings.LLM_QUOTA_PER_IP)
+    if not retry_after and user_id is not None:
+        retry_after = take_token("user", user_id, *settings.LLM_QUOTA_PER_USER)
+    if retry_after:
+        incr_metric("rejected_quota")
+        raise AdmissionRejected("quota", retry_after)
+
+
+class Slot:
+    def __init__(self, key, token):
+        self.key = key
+        self.token = token
+        self.released = False
+
+
+# Ограничитель одновременных обращений к ИИ: лимит на процесс (счётчик в памяти)
+# и общий лимит на все процессы (слоты в кэше с ограниченным временем аренды).
+# Не получившие слот ждут в короткой очереди, при переполнении - сразу отказ
+class LLMLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= settings.LLM_MAX_CONCURRENT_PER_PROCESS:
+                return None
+            self.in_flight += 1
+
+        token = uuid.uuid4().hex
+        for number in range(settings.LLM_MAX_CONCURRENT):
+            key = SLOT_KEY.format(number)
+            if cache.add(key, token, settings.LLM_SLOT_LEASE):
+                incr_metric("admitted")
+                return Slot(key, token)
+
+        with self._lock:
+            self.in_flight -= 1
+        return None
+
+    def release(self, slot):
+        if slot.released:
+            return
+        slot.released = True
+        # Слот мог истечь и достаться другому процессу - его не трогаем
+        if cache.get(slot.key) == slot.token:
+            cache.delete(slot.key)
+        with self._lock:
+            self.in_flight -= 1
+
+    def _enter_queue(self):
+        with self._lock:
+            if self.waiting >= settings.LLM_QUEUE_SIZE:
+                incr_metric("rejected_busy")
+                logger.warning("LLM queue is full: %s waiting", self.waiting)
+                raise AdmissionRejected("busy", settings.LLM_RETRY_AFTER)
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+    def _leave_queue(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def _timeout(self):
+        incr_metric("rejected_timeout")
+        return AdmissionRejected("timeout", settings.LLM_RETRY_AFTER)
+
+    def acquire(self):
+        slot = self.try_acquire()
+        if slot:
+            return slot
+
+        self._enter_queue()
+        try:
+            deadline = time.monotonic() + settings.LLM_QUEUE_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                slot = self.try_acquire()
+                if slot:
+                    return slot
+        finally:
+            self._leave_queue()
+        raise self._timeout()
+
+    # Обращения к кэшу синхронные - в отдельном потоке, чтобы не блокировать цикл событий
+    async def aacquire(self):
+        slot = await sync_to_async(self.try_acquire)()
+        if slot:
+            return slot
+
+        await sync_to_async(self._enter_queue)()
+        try:
+            deadline = time.monotonic() + settings.LLM_QUEUE_TIMEOUT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(POLL_INTERVAL)
+                slot = await sync_to_async(self.try_acquire)()
+                if slot:
+                    return slot
+        finally:
+            self._leave_queue()
+        raise await sync_to_async(self._timeout)()
+
+    async def arelease(self, slot):
+        await sync_to_async(self.release)(slot)
+
+    def metrics(self):
+        slots = cache.get_many([SLOT_KEY.format(number) for number in range(settings.LLM_MAX_CONCURRENT)])
+        counters = cache.get_many([METRIC_KEY.format(name) for name in METRICS])
+        return {
+            "process": {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "peak_waiting": self.peak_waiting,
+                "max_concurrent": settings.LLM_MAX_CONCURRENT_PER_PROCESS,
+                "queue_size": settings.LLM_QUEUE_SIZE,
+            },
+            "global": {
+                "in_flight": len(slots),
+                "max_concurrent": settings.LLM_MAX_CONCURRENT,
+                **{name: counters.get(METRIC_KEY.format(name), 0) for name in METRICS},
+            },
+        }
+
+
+llm_limiter = LLMLimiter()
+
+
+# Кто обращается к ИИ (для квот): (IP, id пользователя или None)
+def requester(request):
+    user = request.user
+    return client_ip(request), user.pk if user.is_authenticated else None
+
+
+async def arequester(request):
+    user = await request.auser()
+    return client_ip(request), user.pk if user.is_authenticated else None
+
+
+# Допуск к ИИ: квота и слот. Вызывается непосредственно перед обращением к GigaChat -
+# ответы из кэша и локального классификатора квоту и слоты не расходуют.
+# Без requester (внутренние вызовы) квота не проверяется
+def admit(requester=None):
+    if requester is not None:
+        check_quota(*requester)
+    return llm_limiter.acquire()
+
+
+async def aadmit(requester=None):
+    if requester is not None:
+        await sync_to_async(check_quota)(*requester)
+    return await llm_limiter.aacquire()
+
+
+# Содержимое потокового ответа: слот (если занят) освобождается при закрытии ответа,
+# в том числе если клиент отключился раньше, чем поток был дочитан
+class SlotStream:
+    def __init__(self, events, slot):
+        self.events = events
+        self.slot = slot
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def close(self):
+        if hasattr(self.events, "close"):
+            self.events.close()
+        if self.slot:
+            llm_limiter.release(self.slot)
+
+
+class AsyncSlotStream(SlotStream):
+    def __aiter__(self):
+        return aiter(self.events)
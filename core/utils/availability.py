@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import Doctor, Schedule
+from core.utils.page_cache import bump_version_on_commit
+
+
+AVAILABILITY_FIELDS = ["next_free_slot", "free_slots_7d", "free_slots_30d", "availability_refreshed_at"]
+
+
+def upcoming_free_slots():
+    today = timezone.localdate()
+    current_time = timezone.localtime().time()
+    return Schedule.objects.filter(
+        Q(date__gt=today) | Q(date=today, start_time__gt=current_time),
+        status="available",
+    )
+
+
+# Пересчёт сводки по свободным слотам (все врачи или только указанные).
+# Подзапросы идут по частичному индексу свободных слотов, bulk_update не вызывает сигналы Doctor -
+# версию кэша списка врачей меняем явно
+def refresh_doctor_availability(doctor_ids=None):
+    today = timezone.localdate()
+    free = upcoming_free_slots().filter(doctor=OuterRef("pk"))
+    first_free = free.order_by("date", "start_time")
+
+    def free_until(days):
+        counted = (
+            free.filter(date__lt=today + timedelta(days=days))
+            .values("doctor")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+    doctors = Doctor.objects.only("id")
+    if doctor_ids is not None:
+        doctors = doctors.filter(pk__in=doctor_ids)
+    doctors = doctors.annotate(
+        next_date=Subquery(first_free.values("date")[:1]),
+        next_time=Subquery(first_free.values("start_time")[:1]),
+        count_7d=free_until(7),
+        count_30d=free_until(30),
+    )
+
+    now = timezone.now()
+    updated = []
+    for doctor in doctors:
+        doctor.next_free_slot = (
+            timezone.make_aware(datetime.combine(doctor.next_date, doctor.next_time))
+            if doctor.next_date else None
+        )
+        doctor.free_slots_7d = doctor.count_7d
+        doctor.free_slots_30d = doctor.count_30d
+        doctor.availability_refreshed_at = now
+        updated.append(doctor)
+
+    Doctor.objects.bulk_update(updated, AVAILABILITY_FIELDS, batch_size=500)
+    if updated:
+        bump_version_on_commit(Doctor)
+    return len(updated)
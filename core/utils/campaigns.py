@@ -0,0 +1,129 @@
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import escape
+
+from core.models import CampaignFailure, PromotionCampaign
+from users.models import CustomUser
+
+
+logger = logging.getLogger(__name__)
+
+# Метка, на место которой подставляется имя получателя
+FIRST_NAME_MARKER = "__ARS_MEDICA_FIRST_NAME__"
+
+
+# Шаблоны письма рендерятся один раз на всю рассылку (имя получателя - метка)
+class PromotionMessage:
+    def __init__(self, promotion):
+        context = {"recipient_name": FIRST_NAME_MARKER, "promotion": promotion}
+        self.subject = f"Новая акция от Ars Medica: {promotion.title}"
+        self.text = render_to_string("emails/promotion.txt", context)
+        self.html = render_to_string("emails/promotion.html", context)
+
+    def for_user(self, user, connection=None):
+        name = (user.first_name or "").capitalize()
+        email = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.text.replace(FIRST_NAME_MARKER, name),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+            connection=connection,
+        )
+        email.attach_alternative(self.html.replace(FIRST_NAME_MARKER, escape(name)), "text/html")
+        return email
+
+
+def subscribers_after(user_id, limit):
+    return list(
+        CustomUser.objects.filter(subscribe_promotions=True, is_active=True, id__gt=user_id)
+        .exclude(email="")
+        .order_by("id")
+        .only("id", "email", "first_name")[:limit]
+    )
+
+
+def lease_deadline():
+    return timezone.now() + timedelta(seconds=settings.PROMOTION_CAMPAIGN_LEASE)
+
+
+# Захват рассылки условным UPDATE: новая или брошенная (аренда истекла) рассылка достаётся
+# ровно одному обработчику. Возвращает метку обработчика или None
+def claim_campaign(campaign):
+    now = timezone.now()
+    token = uuid.uuid4()
+    abandoned = Q(status="running") & (Q(lease_until__isnull=True) | Q(lease_until__lt=now))
+    claimed = PromotionCampaign.objects.filter(Q(status="pending") | abandoned, pk=campaign.pk).update(
+        status="running",
+        claim_token=token,
+        lease_until=lease_deadline(),
+        started_at=Coalesce("started_at", now),
+    )
+    if not claimed:
+        return None
+    campaign.refresh_from_db()
+    return token
+
+
+# Отправка рассылки пачками через одно SMTP-соединение на пачку.
+# None - рассылку уже отправляет другой обработчик
+def run_campaign(campaign, batch_size=500):
+    token = claim_campaign(campaign)
+    if token is None:
+        return None
+    message = PromotionMessage(campaign.promotion)
+
+    sent = failed = 0
+    started = time.monotonic()
+    while True:
+        users = subscribers_after(campaign.last_user_id, batch_size)
+        if not users:
+            break
+
+        failures = []
+        with get_connection() as connection:
+            for user in users:
+                try:
+                    connection.send_messages([message.for_user(user, connection)])
+                except Exception as e:
+                    logger.warning(f"Promotion email error ({user.email}): {e}")
+                    failures.append(CampaignFailure(campaign=campaign, user=user, error=str(e)))
+
+        CampaignFailure.objects.bulk_create(failures)
+        batch_sent = len(users) - len(failures)
+        sent += batch_sent
+        failed += len(failures)
+
+        # Контрольная точка: при перезапуске продолжаем с этого места
+        campaign.last_user_id = users[-1].id
+        kept = PromotionCampaign.objects.filter(pk=campaign.pk, claim_token=token).update(
+            last_user_id=campaign.last_user_id,
+            sent_count=F("sent_count") + batch_sent,
+            failed_count=F("failed_count") + len(failures),
+            lease_until=lease_deadline(),
+        )
+        # Аренда истекла и рассылку забрал другой обработчик - дальше отправляет он
+        if not kept:
+            logger.warning(f"Promotion campaign {campaign.pk} was taken over by another worker")
+            break
+
+    PromotionCampaign.objects.filter(pk=campaign.pk, claim_token=token).update(
+        status="done", finished_at=timezone.now(), claim_token=None, lease_until=None
+    )
+    campaign.refresh_from_db(fields=["status", "finished_at", "sent_count", "failed_count"])
+
+    elapsed = time.monotonic() - started
+    return {
+        "sent": sent,
+        "failed": failed,
+        "seconds": elapsed,
+        "per_second": sent / elapsed if elapsed else 0,
+    }
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import re
+import threading
+import weakref
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from gigachat import GigaChat
+
+from core.utils.profiling import track_external
+
+
+SYSTEM_PROMPT = (
+    "Ты — медицинский ИИ-ассистент клиники. "
+    "Твоя задача: проанализировать жалобы пользователя, "
+    "назвать возможные причины (не ставя окончательный диагноз) "
+    "и подсказать, к какому врачу (терапевт, ЛОР, хирург и т.д.) записаться. "
+    "Отвечай вежливо и кратко. В конце обязательно пиши: "
+    "'Внимание! Это предварительная информация, необходим очный осмотр врача'"
+    "После этого дисклеймера ОБЯЗАТЕЛЬНО добавь техническую строку строго в формате: "
+    "ВРАЧ_ДЛЯ_БАЗЫ: [Название специалиста]"
+)
+
+DEFAULT_DOCTOR = "Терапевт"
+TECH_MARKER = "ВРАЧ_ДЛЯ_БАЗЫ:"
+
+
+class _TokenStore:
+    token = None
+
+
+_token_store = _TokenStore()
+
+
+# Клиент, у которого токен доступа общий для всего процесса
+class PooledGigaChat(GigaChat):
+    @property
+    def _access_token(self):
+        return _token_store.token
+
+    @_access_token.setter
+    def _access_token(self, value):
+        _token_store.token = value
+
+
+_lock = threading.Lock()
+_sync_client = None
+# httpx.AsyncClient привязан к циклу событий, поэтому асинхронный клиент - свой на каждый цикл
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def client_kwargs():
+    kwargs = {
+        "credentials": settings.GIGACHAT_CREDENTIALS,
+        "scope": settings.GIGACHAT_SCOPE,
+        "timeout": settings.GIGACHAT_TIMEOUT,
+        "max_connections": settings.GIGACHAT_MAX_CONNECTIONS,
+        "verify_ssl_certs": True,
+    }
+    if settings.GIGACHAT_BASE_URL:
+        kwargs["base_url"] = settings.GIGACHAT_BASE_URL
+    if settings.GIGACHAT_AUTH_URL:
+        kwargs["auth_url"] = settings.GIGACHAT_AUTH_URL
+    if settings.GIGACHAT_CERTS and os.path.exists(settings.GIGACHAT_CERTS):
+        kwargs["ca_bundle_file"] = settings.GIGACHAT_CERTS
+    return kwargs
+
+
+# Общий для процесса синхронный клиент (TLS-соединения и токен переиспользуются)
+def get_client():
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = PooledGigaChat(**client_kwargs())
+    return _sync_client
+
+
+def aget_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = PooledGigaChat(**client_kwargs())
+    return client
+
+
+def reset_clients():
+    global _sync_client
+    with _lock:
+        if _sync_client is not None:
+            _sync_client.close()
+        _sync_client = None
+        _async_clients.clear()
+        _token_store.token = None
+
+
+@receiver(setting_changed)
+def gigachat_settings_changed(setting, **kwargs):
+    if setting.startswith("GIGACHAT_"):
+        reset_clients()
+
+
+def build_chat(user_text):
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_text},
+        ]
+    }
+
+
+# Разбор ответа: текст без технической строки и рекомендованный врач
+def parse_ai_response(ai_response):
+    match = re.search(r"ВРАЧ_ДЛЯ_БАЗЫ:\s*\[?(.*?)\]?$", ai_response)
+    doctor_name = match.group(1).strip() if match else DEFAULT_DOCTOR
+
+    # Удаление технической строки
+    clean_response = re.sub(r"ВРАЧ_ДЛЯ_БАЗЫ:.*", "", ai_response).strip()
+    return clean_response, doctor_name
+
+
+# Отсекает техническую строку из потока токенов, не дожидаясь конца ответа
+class TechLineFilter:
+    def __init__(self):
+        self.parts = []
+        self.pending = ""
+        self.marker_found = False
+
+    def feed(self, chunk):
+        self.parts.append(chunk)
+        if self.marker_found:
+            return ""
+
+        text = self.pending + chunk
+        position = text.find(TECH_MARKER)
+        if position != -1:
+            self.marker_found = True
+            self.pending = ""
+            return text[:position]
+
+        # Конец текста может оказаться началом маркера - придерживаем его
+        keep = 0
+        for size in range(min(len(TECH_MARKER) - 1, len(text)), 0, -1):
+            if text.endswith(TECH_MARKER[:size]):
+                keep = size
+                break
+        self.pending = text[len(text) - keep:]
+        return text[:len(text) - keep]
+
+    # (неотправленный остаток, полный очищенный ответ, рекомендованный врач)
+    def finish(self):
+        rest = "" if self.marker_found else self.pending
+        self.pending = ""
+        clean_response, doctor_name = parse_ai_response("".join(self.parts))
+        return rest, clean_response, doctor_name
+
+
+def ask_gigachat(user_text):
+    with track_external("gigachat"):
+        response = get_client().chat(build_chat(user_text))
+    return response.choices[0].message.content
+
+
+async def aask_gigachat(user_text):
+    with track_external("gigachat"):
+        response = await aget_client().achat(build_chat(user_text))
+    return response.choices[0].message.content
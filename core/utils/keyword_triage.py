@@ -0,0 +1,148 @@
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from core.models import Doctor, SymptomAnalysis
+from core.utils.symptom_cache import query_words, stem
+
+
+LOCAL_RESPONSE = (
+    "По описанным симптомам рекомендуем обратиться к специалисту: {doctor}. "
+    "Внимание! Это предварительная информация, необходим очный осмотр врача"
+)
+
+
+# Служебные слова не несут информации о специалисте
+STOP_WORDS = frozenset(
+    "и в во на с со у к ко по не а но что как меня мне я при от до за из о об "
+    "же уже очень есть был была были это так еще ещё или ли бы".split()
+)
+
+
+# Свой токенизатор: короткие основы (ухо/ухе -> ух) без изменения ключа кэша ответов
+def tokenize(text):
+    return {stem(word, min_stem=2) for word in query_words(text)} - STOP_WORDS
+
+
+# Локальный классификатор жалоба -> специалист (TF-IDF по истории ответов ИИ)
+class KeywordTriage:
+    def __init__(self, examples, specializations=()):
+        spellings = defaultdict(Counter)
+        documents = []
+        for query, doctor in examples:
+            doctor = (doctor or "").strip()
+            tokens = tokenize(query)
+            if not doctor or not tokens:
+                continue
+            key = doctor.lower()
+            spellings[key][doctor] += 1
+            documents.append((key, tokens))
+
+        # Название специалиста - самое частое написание в истории
+        self.labels = {key: counter.most_common(1)[0][0] for key, counter in spellings.items()}
+        self.support = Counter(key for key, _ in documents)
+
+        doc_freq = Counter(token for _, tokens in documents for token in tokens)
+        total = len(documents)
+        self.idf = {token: math.log((total + 1) / (df + 1)) + 1 for token, df in doc_freq.items()}
+
+        centroids = defaultdict(lambda: defaultdict(float))
+        for key, tokens in documents:
+            norm = math.sqrt(sum(self.idf[t] ** 2 for t in tokens))
+            for token in tokens:
+                centroids[key][token] += self.idf[token] / norm
+
+        # Обратный индекс: токен -> [(специалист, вес)] по нормированным центроидам
+        self.index = defaultdict(list)
+        for key, vector in centroids.items():
+            norm = math.sqrt(sum(w * w for w in vector.values()))
+            for token, weight in vector.items():
+                self.index[token].append((key, weight / norm))
+
+        # Явное упоминание специальности врача ("к кардиологу") - однозначный случай
+        self.specializations = []
+        for specialization in specializations:
+            tokens = tokenize(specialization)
+            if tokens:
+                self.specializations.append((frozenset(tokens), specialization.strip()))
+
+    def scores(self, text):
+        tokens = tokenize(text)
+        # Незнакомые слова считаются редкими и снижают уверенность
+        unknown_idf = max(self.idf.values(), default=1.0)
+        weights = {t: self.idf.get(t, unknown_idf) for t in tokens}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        result = defaultdict(float)
+        for token, weight in weights.items():
+            for key, centroid_weight in self.index.get(token, ()):
+                result[key] += weight / norm * centroid_weight
+        return tokens, result
+
+    # (специалист, уверенность) или None, если случай неоднозначный
+    def classify(self, text, min_score=None, min_margin=None, min_examples=None):
+        min_score = settings.TRIAGE_MIN_SCORE if min_score is None else min_score
+        min_margin = settings.TRIAGE_MIN_MARGIN if min_margin is None else min_margin
+        min_examples = settings.TRIAGE_MIN_EXAMPLES if min_examples is None else min_examples
+
+        tokens, scores = self.scores(text)
+        mentioned = {name for spec_tokens, name in self.specializations if spec_tokens <= tokens}
+        if len(mentioned) == 1:
+            return mentioned.pop(), 1.0
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return None
+        best, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if score < min_score or score - runner_up < min_margin or self.support[best] < min_examples:
+            return None
+        return self.labels[best], score
+
+
+def load_examples(limit=None):
+    limit = limit or settings.TRIAGE_HISTORY_LIMIT
+    return list(
+        SymptomAnalysis.objects.filter(source="ai").exclude(recommended_doctor="")
+        .order_by("-created_at")
+        .values_list("user_query", "recommended_doctor")[:limit]
+    )
+
+
+def build_model():
+    specializations = Doctor.objects.values_list("specialization", flat=True).distinct()
+    return KeywordTriage(load_examples(), specializations)
+
+
+_lock = threading.Lock()
+_model = None
+_built_at = 0.0
+
+
+# Модель строится по истории и перестраивается раз в TRIAGE_MODEL_TTL секунд
+def get_model():
+    global _model, _built_at
+    if _model is None or time.monotonic() - _built_at > settings.TRIAGE_MODEL_TTL:
+        with _lock:
+            if _model is None or time.monotonic() - _built_at > settings.TRIAGE_MODEL_TTL:
+                _model = build_model()
+                _built_at = time.monotonic()
+    return _model
+
+
+def reset_model():
+    global _model
+    with _lock:
+        _model = None
+
+
+def local_answer(user_text):
+    if not settings.TRIAGE_LOCAL_ENABLED:
+        return None
+    result = get_model().classify(user_text)
+    if result is None:
+        return None
+    doctor, _ = result
+    return LOCAL_RESPONSE.format(doctor=doctor), doctor
@@ -0,0 +1,54 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Версия данных модели: меняется при каждой записи (сигналы в core/signals.py).
+# Ключи закэшированных страниц включают версии - после правки старые ключи просто не читаются
+def version_key(model):
+    return f"cache_version:{model._meta.label_lower}"
+
+
+# Начальная версия по времени: после вытеснения ключа версия не повторит прежнюю
+def new_version():
+    return time.time_ns()
+
+
+def model_versions(*models):
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    try:
+        cache.incr(version_key(model))
+    except ValueError:
+        cache.set(version_key(model), new_version(), None)
+
+
+# Версия меняется после фиксации транзакции: иначе параллельный запрос успеет
+# закэшировать ещё старые данные под новой версией
+def bump_version_on_commit(model):
+    transaction.on_commit(lambda: bump_version(model))
+
+
+# Общая версия страницы: версии моделей + extra (например, дата)
+def page_version(models, extra=""):
+    versions = ".".join(str(version) for version in model_versions(*models))
+    return f"{versions}:{extra}"
+
+
+# Значение из кэша по ключу name + версии моделей (+ extra); при промахе - build()
+def cached_by_versions(name, models, build, timeout, extra=""):
+    key = f"page:{name}:{page_version(models, extra)}"
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
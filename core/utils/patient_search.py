@@ -0,0 +1,109 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from users.models import CustomUser
+
+
+SEARCH_TABLE = "users_patient_search"
+# Вес совпадения по полям: фамилия, имя, отчество, телефон
+FIELD_WEIGHTS = (10, 5, 2, 1)
+
+
+def query_terms(query):
+    words = re.findall(r"[^\W\d_]+", query.lower().replace("ё", "е"))
+    digits = re.sub(r"\D", "", query)
+    if len(digits) > 1 and digits[0] == "8":
+        digits = "7" + digits[1:]
+    return words, digits
+
+
+# Запрос FTS5: слова - префиксы ФИО, цифры - префикс телефона (8... считается как 7...)
+def match_expression(words, digits):
+    parts = []
+    if words:
+        parts.append("{last_name first_name patronymic} : (" + " ".join(f'"{word}"*' for word in words) + ")")
+    if digits:
+        parts.append(f'phone : "{digits}"*')
+    return " AND ".join(parts)
+
+
+# Релевантность: каждое слово засчитывается по самому весомому полю, где с него начинается токен;
+# точное совпадение токена весит вдвое больше
+def score(row, words, digits):
+    fields = [(value or "").lower().split() for value in row]
+    total = 0
+    for term in [*words, *([digits] if digits else [])]:
+        best = 0
+        for weight, tokens in zip(FIELD_WEIGHTS, fields):
+            for token in tokens:
+                if token.startswith(term):
+                    best = max(best, weight * (2 if token == term else 1))
+        total += best
+    return total
+
+
+def search_index_available():
+    return connection.vendor == "sqlite"
+
+
+# Пациенты по запросу: список (id, ключ страницы). Совпадения перебираются окнами по
+# PATIENT_SEARCH_CANDIDATES от новых к старым (без сортировки всех совпадений частых фамилий),
+# внутри окна - по релевантности. Ключ - (верхний rowid окна, score); листание доходит до всех
+# совпадений. after - (окно, score, id) последнего показанного
+def ranked_patient_ids(query, limit, after=None):
+    words, digits = query_terms(query)
+    expression = match_expression(words, digits)
+    if not expression:
+        return []
+
+    window = after[0] if after else None
+    last_key = (-after[1], after[2]) if after else None
+    found = []
+    with connection.cursor() as cursor:
+        while len(found) < limit:
+            rows = window_rows(cursor, expression, window)
+            if not rows:
+                break
+            top = rows[0][0]
+            ranked = sorted((-score(row[1:], words, digits), row[0]) for row in rows)
+            if last_key:
+                ranked = [key for key in ranked if key > last_key]
+                last_key = None
+            for negative_score, patient_id in ranked[: limit - len(found)]:
+                found.append((patient_id, (top, -negative_score)))
+            if len(rows) < settings.PATIENT_SEARCH_CANDIDATES:
+                break
+            window = rows[-1][0] - 1
+    return found
+
+
+def window_rows(cursor, expression, window):
+    bound = "AND rowid <= %s " if window is not None else ""
+    cursor.execute(
+        f"SELECT rowid, last_name, first_name, patronymic, phone FROM {SEARCH_TABLE} "
+        f"WHERE {SEARCH_TABLE} MATCH %s {bound}ORDER BY rowid DESC LIMIT %s",
+        [expression, *([window] if window is not None else []), settings.PATIENT_SEARCH_CANDIDATES],
+    )
+    return cursor.fetchall()
+
+
+# Страница пациентов по запросу: [(пациент, ключ страницы)];
+# без поискового индекса (не SQLite) - фильтр icontains по id
+def search_patients(query, limit, after=None):
+    if not search_index_available():
+        patients = CustomUser.objects.filter(role="patient").filter(
+            Q(last_name__icontains=query)
+            | Q(first_name__icontains=query)
+            | Q(patronymic__icontains=query)
+            | Q(phone__icontains=query)
+        )
+        if after:
+            patients = patients.filter(id__gt=after[2])
+        return [(patient, (0, 0)) for patient in patients.order_by("id")[:limit]]
+
+    ranked = ranked_patient_ids(query, limit, after)
+    patients = CustomUser.objects.in_bulk([patient_id for patient_id, _ in ranked])
+    return [(patients[patient_id], key) for patient_id, key in ranked if patient_id in patients]
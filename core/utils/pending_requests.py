@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import Schedule
+
+
+# Число заявок (слотов в статусе "booked") хранится в кэше и меняется инкрементально.
+# Версия меняется при каждом изменении числа - по ней поток SSE узнаёт об обновлениях
+PENDING_COUNT_KEY = "schedule:pending_requests:count"
+PENDING_VERSION_KEY = "schedule:pending_requests:version"
+
+
+def bump_pending_version():
+    try:
+        cache.incr(PENDING_VERSION_KEY)
+    except ValueError:
+        cache.set(PENDING_VERSION_KEY, 1, None)
+
+
+def count_pending_requests():
+    return Schedule.objects.filter(status="booked").count()
+
+
+# Без числа или версии в кэше (вытеснены, кэш очищен) число берётся из БД:
+# изменения, пропущенные за это время, не накапливаются в счётчике
+def get_pending_count():
+    cached = cache.get_many([PENDING_COUNT_KEY, PENDING_VERSION_KEY])
+    if len(cached) < 2:
+        count = count_pending_requests()
+        cache.set(PENDING_COUNT_KEY, count, None)
+        cache.add(PENDING_VERSION_KEY, 1, None)
+        return count
+    return cached[PENDING_COUNT_KEY]
+
+
+async def aget_pending_count():
+    cached = await cache.aget_many([PENDING_COUNT_KEY, PENDING_VERSION_KEY])
+    if len(cached) < 2:
+        count = await Schedule.objects.filter(status="booked").acount()
+        await cache.aset(PENDING_COUNT_KEY, count, None)
+        await cache.aadd(PENDING_VERSION_KEY, 1, None)
+        return count
+    return cached[PENDING_COUNT_KEY]
+
+
+def adjust_pending_count(delta):
+    # Если ключа нет, число будет пересчитано при следующем чтении
+    try:
+        cache.incr(PENDING_COUNT_KEY, delta)
+    except ValueError:
+        pass
+    bump_pending_version()
+
+
+# Сверка кэша с БД; возвращает (было в кэше, реальное число)
+def reconcile_pending_count():
+    cached = cache.get(PENDING_COUNT_KEY)
+    actual = count_pending_requests()
+    if cached != actual:
+        cache.set(PENDING_COUNT_KEY, actual, None)
+        bump_pending_version()
+    return cached, actual
+
+
+def format_event(count):
+    return f"data: {json.dumps({'count': count})}\n\n"
+
+
+# События SSE для бейджа заявок: новое значение отправляется только при изменении
+async def pending_requests_events():
+    poll_interval = settings.REQUESTS_STREAM_POLL_INTERVAL
+    heartbeat = settings.REQUESTS_STREAM_HEARTBEAT
+    lifetime = settings.REQUESTS_STREAM_LIFETIME
+
+    loop = asyncio.get_running_loop()
+    version = await cache.aget(PENDING_VERSION_KEY)
+    count = await aget_pending_count()
+    yield "retry: 1000\n" + format_event(count)
+
+    started = last_sent = loop.time()
+    while loop.time() - started < lifetime:
+        await asyncio.sleep(poll_interval)
+
+        # Между изменениями читается только версия из кэша
+        current = await cache.aget(PENDING_VERSION_KEY)
+        if current != version:
+            version = current
+            new_count = await aget_pending_count()
+            if new_count != count:
+                count = new_count
+                last_sent = loop.time()
+                yield format_event(count)
+                continue
+
+        if loop.time() - last_sent >= heartbeat:
+            last_sent = loop.time()
+            yield ": ping\n\n"
@@ -0,0 +1,13 @@
+import re
+
+
+# Единый вид российского номера: +7XXXXXXXXXX. None - номер не распознан
+def normalize_phone(value):
+    digits = re.sub(r"\D", "", value or "")
+    if len(digits) == 10:
+        digits = "7" + digits
+    elif len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    if len(digits) != 11 or not digits.startswith("7"):
+        return None
+    return "+" + digits
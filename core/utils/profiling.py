@@ -0,0 +1,100 @@
+import contextvars
+import functools
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+# Замеры текущего запроса; None - запрос не профилируется (замеры ничего не стоят)
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.external = defaultdict(float)
+
+    @property
+    def duration(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def most_repeated(self, limit=3):
+        return [(sql, count) for sql, count in self.statements.most_common(limit) if count > 1]
+
+
+# Время внешнего вызова (шаблоны, GigaChat, Telegram, SMTP) в текущем запросе
+@contextmanager
+def track_external(kind):
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.external[kind] += time.perf_counter() - started
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_time += time.perf_counter() - started
+        profile.queries += 1
+        # SQL без параметров: одинаковый текст - признак N+1
+        profile.statements[sql] += 1
+
+
+def install_sql_wrapper(connection, **kwargs):
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+def instrument(cls, method_name, kind):
+    method = getattr(cls, method_name)
+    if getattr(method, "_profiled", False):
+        return
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with track_external(kind):
+            return method(*args, **kwargs)
+
+    wrapper._profiled = True
+    setattr(cls, method_name, wrapper)
+
+
+_installed = False
+
+
+# Подключение замеров; вызывается один раз, только если профилирование включено
+def install():
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.core.mail.backends.smtp import EmailBackend
+    from django.template.backends.django import Template
+
+    connection_created.connect(install_sql_wrapper, dispatch_uid="core.profiling.sql")
+    for connection in connections.all(initialized_only=True):
+        install_sql_wrapper(connection)
+    # Рендер шаблона верхнего уровня (включения считаются внутри него)
+    instrument(Template, "render", "template")
+    instrument(EmailBackend, "send_messages", "smtp")
@@ -0,0 +1,56 @@
+from django.db.models import Count, Exists, F, OuterRef, Sum
+
+from core.models import Doctor, Review, Schedule
+
+
+def adjust_doctor_rating(doctor_id, rating_delta, count_delta):
+    Doctor.objects.filter(pk=doctor_id).update(
+        rating_sum=F("rating_sum") + rating_delta,
+        rating_count=F("rating_count") + count_delta,
+    )
+
+
+# Изменение рейтинга при замене вклада отзыва old -> new (каждый - (врач, оценка) или None)
+def apply_rating_change(old, new):
+    if old == new:
+        return
+    if old and new and old[0] == new[0]:
+        adjust_doctor_rating(new[0], new[1] - old[1], 0)
+        return
+    if old:
+        adjust_doctor_rating(old[0], -old[1], -1)
+    if new:
+        adjust_doctor_rating(new[0], new[1], 1)
+
+
+def completed_visit_exists(doctor_id, patient_id):
+    return Schedule.objects.filter(doctor_id=doctor_id, booked_by_id=patient_id, status="completed").exists()
+
+
+# Проставляет verified по завершённым приёмам; возвращает число изменённых отзывов
+def reverify_reviews():
+    completed = Schedule.objects.filter(
+        doctor=OuterRef("doctor"), booked_by=OuterRef("patient"), status="completed"
+    )
+    changed = Review.objects.filter(verified=False).filter(Exists(completed)).update(verified=True)
+    changed += Review.objects.filter(verified=True).exclude(Exists(completed)).update(verified=False)
+    return changed
+
+
+# Пересчёт сумм и числа оценок по подтверждённым отзывам; возвращает число исправленных врачей
+def recompute_doctor_ratings():
+    totals = {
+        row["doctor"]: (row["total"], row["count"])
+        for row in Review.objects.filter(verified=True)
+        .values("doctor")
+        .annotate(total=Sum("rating"), count=Count("id"))
+        .order_by()
+    }
+    fixed = []
+    for doctor in Doctor.objects.only("id", "rating_sum", "rating_count"):
+        total, count = totals.get(doctor.id, (0, 0))
+        if (doctor.rating_sum, doctor.rating_count) != (total, count):
+            doctor.rating_sum, doctor.rating_count = total, count
+            fixed.append(doctor)
+    Doctor.objects.bulk_update(fixed, ["rating_sum", "rating_count"], batch_size=500)
+    return len(fixed)
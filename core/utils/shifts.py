@@ -0,0 +1,114 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+
+from core.models import Schedule, ShiftTemplate
+from core.utils.availability import refresh_doctor_availability
+
+
+# Статусы, которые массовое открытие/закрытие смен не меняет
+LOCKED_STATUSES = ["booked", "confirmed", "completed"]
+
+
+# Слоты по шаблонам смен за период [date_from, date_to] (все врачи или только указанные)
+def planned_slots(date_from, date_to, doctor_ids=None):
+    templates = ShiftTemplate.objects.all()
+    if doctor_ids is not None:
+        templates = templates.filter(doctor_id__in=doctor_ids)
+    by_weekday = {}
+    for template in templates:
+        by_weekday.setdefault(template.weekday, []).append((template, list(template.slot_times())))
+
+    day = date_from
+    while day <= date_to:
+        # Пересекающиеся шаблоны (созданные в обход проверки) не дают пересекающихся слотов
+        planned = {}
+        for template, times in by_weekday.get(day.weekday(), []):
+            if not template.applies_to(day):
+                continue
+            busy = planned.setdefault(template.doctor_id, [])
+            for start_time, end_time in times:
+                if any(start_time < busy_end and end_time > busy_start for busy_start, busy_end in busy):
+                    continue
+                busy.append((start_time, end_time))
+                yield Schedule(
+                    doctor_id=template.doctor_id,
+                    date=day,
+                    start_time=start_time,
+                    end_time=end_time,
+                    status="available",
+                )
+        day += timedelta(days=1)
+
+
+# Генерация графика по шаблонам. Уже существующие слоты (врач, дата, начало) не трогаются;
+# dry_run только считает, сколько слотов будет создано и сколько уже есть - по врачам
+def generate_shift_slots(date_from, date_to, doctor_ids=None, dry_run=False, chunk_size=2000):
+    existing = Schedule.objects.filter(date__gte=date_from, date__lte=date_to)
+    if doctor_ids is not None:
+        existing = existing.filter(doctor_id__in=doctor_ids)
+    existing = set(existing.values_list("doctor_id", "date", "start_time"))
+
+    to_create = Counter()
+    skipped = Counter()
+    chunk = []
+    created = 0
+    for slot in planned_slots(date_from, date_to, doctor_ids):
+        if (slot.doctor_id, slot.date, slot.start_time) in existing:
+            skipped[slot.doctor_id] += 1
+            continue
+        to_create[slot.doctor_id] += 1
+        if dry_run:
+            continue
+        chunk.append(slot)
+        if len(chunk) >= chunk_size:
+            created += bulk_create_slots(chunk)
+            chunk = []
+    if chunk:
+        created += bulk_create_slots(chunk)
+
+    # bulk_create не вызывает сигналы - сводку врачей обновляем явно
+    if created:
+        refresh_doctor_availability(list(to_create))
+    return {"to_create": to_create, "skipped": skipped, "created": created}
+
+
+# Слоты, созданные параллельно (другим администратором), пропускаются на уровне БД.
+# bulk_create с ignore_conflicts не сообщает, сколько строк вставлено - считаем по разнице
+def bulk_create_slots(slots):
+    dates = [slot.date for slot in slots]
+    scope = Schedule.objects.filter(
+        doctor_id__in={slot.doctor_id for slot in slots}, date__gte=min(dates), date__lte=max(dates)
+    )
+    with transaction.atomic():
+        before = scope.count()
+        Schedule.objects.bulk_create(slots, ignore_conflicts=True)
+        return scope.count() - before
+
+
+# Массовое закрытие ("close") или открытие ("open") смен: врачи x период x дни недели (0 - понедельник).
+# Один UPDATE в транзакции; записи пациентов и состоявшиеся приёмы не трогаются.
+# Отчёт по врачам: сколько слотов изменено и какие записи мешают закрыть смену
+def set_shifts_status(action, doctor_ids, date_from, date_to, weekdays=None):
+    new_status = "closed" if action == "close" else "available"
+    slots = Schedule.objects.filter(doctor_id__in=doctor_ids, date__gte=date_from, date__lte=date_to)
+    if weekdays:
+        slots = slots.filter(date__iso_week_day__in=[weekday + 1 for weekday in weekdays])
+
+    changing = slots.exclude(status__in=[new_status, *LOCKED_STATUSES])
+    report = {doctor_id: {"changed": 0, "blocking": []} for doctor_id in doctor_ids}
+    with transaction.atomic():
+        for doctor_id, count in changing.values_list("doctor_id").annotate(count=Count("id")).order_by():
+            report[doctor_id]["changed"] = count
+        updated = changing.update(status=new_status)
+
+    if action == "close":
+        blocking = slots.filter(status__in=["booked", "confirmed"]).select_related("booked_by")
+        for slot in blocking.order_by("date", "start_time"):
+            report[slot.doctor_id]["blocking"].append(slot)
+
+    if updated:
+        refresh_doctor_availability([doctor_id for doctor_id, row in report.items() if row["changed"]])
+    return report
@@ -0,0 +1,124 @@
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from core.models import Doctor, Schedule
+
+
+# Синонимы названий специалистов (как их может назвать ИИ) -> ключ специальности
+SPECIALIZATION_SYNONYMS = {
+    "терапевт": ["врач общей практики", "семейный врач", "участковый врач", "терапевт"],
+    "лор": ["оториноларинголог", "отоларинголог", "ухо-горло-нос", "лор-врач"],
+    "невролог": ["невропатолог", "неврология"],
+    "кардиолог": ["кардиология"],
+    "хирург": ["хирургия"],
+    "офтальмолог": ["окулист", "глазной врач"],
+    "дерматолог": ["дерматовенеролог", "венеролог", "дерматология"],
+    "гастроэнтеролог": ["гастроэнтерология"],
+    "эндокринолог": ["эндокринология"],
+    "уролог": ["урология", "андролог"],
+    "гинеколог": ["акушер-гинеколог", "гинекология"],
+    "травматолог": ["травматолог-ортопед", "ортопед", "ортопед-травматолог"],
+    "педиатр": ["детский врач"],
+    "стоматолог": ["зубной врач", "дантист"],
+}
+
+
+def normalize_name(name):
+    return " ".join(re.findall(r"[\w-]+", (name or "").lower().replace("ё", "е")))
+
+
+def _canonical_names():
+    names = {}
+    for key, synonyms in SPECIALIZATION_SYNONYMS.items():
+        names[key] = key
+        for synonym in synonyms:
+            names[normalize_name(synonym)] = key
+    return names
+
+
+CANONICAL_NAMES = _canonical_names()
+
+
+def canonical_key(name):
+    normalized = normalize_name(name)
+    if normalized in CANONICAL_NAMES:
+        return CANONICAL_NAMES[normalized]
+    # "ЛОР (оториноларинголог)", "Врач-терапевт" и т.п. - проверяем отдельные слова
+    for word in re.split(r"[\s-]+", normalized):
+        if word in CANONICAL_NAMES:
+            return CANONICAL_NAMES[word]
+    return normalized
+
+
+# Индекс: ключ специальности -> значения Doctor.specialization
+# (сбрасывается сигналом при изменении врачей и раз в SPECIALIZATION_INDEX_TTL секунд)
+class SpecializationIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0.0
+
+    def _is_stale(self):
+        return self._index is None or time.monotonic() - self._built_at > settings.SPECIALIZATION_INDEX_TTL
+
+    def build(self):
+        index = {}
+        for specialization in Doctor.objects.values_list("specialization", flat=True).distinct():
+            index.setdefault(canonical_key(specialization), set()).add(specialization)
+        return index
+
+    def lookup(self, name):
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self._index = self.build()
+                    self._built_at = time.monotonic()
+        return self._index.get(canonical_key(name), set())
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+
+specialization_index = SpecializationIndex()
+
+
+# Врачи нужной специальности и их ближайшие свободные слоты (два запроса независимо от числа врачей)
+def doctors_with_next_slots(recommended, slots_per_doctor=3):
+    specializations = specialization_index.lookup(recommended)
+    if not specializations:
+        return []
+
+    doctors = list(Doctor.objects.filter(specialization__in=specializations).order_by("last_name"))
+    if not doctors:
+        return []
+
+    today = timezone.localdate()
+    current_time = timezone.localtime().time()
+    slots = (
+        Schedule.objects.filter(
+            Q(date__gt=today) | Q(date=today, start_time__gt=current_time),
+            status="available",
+            doctor__in=doctors,
+        )
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F("doctor_id"),
+                order_by=[F("date").asc(), F("start_time").asc()],
+            )
+        )
+        .filter(position__lte=slots_per_doctor)
+        .order_by("doctor_id", "date", "start_time")
+    )
+
+    slots_by_doctor = {}
+    for slot in slots:
+        slots_by_doctor.setdefault(slot.doctor_id, []).append(slot)
+    return [{"doctor": doctor, "slots": slots_by_doctor.get(doctor.id, [])} for doctor in doctors]
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Окончания для упрощённого стемминга (от длинных к коротким)
+RUSSIAN_ENDINGS = sorted(
+    [
+        "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ешь", "ишь",
+        "ает", "яет", "ует", "ают", "яют", "уют",
+        "ая", "яя", "ое", "ее", "ие", "ые", "ой", "ей", "ий", "ый", "ом", "ем",
+        "ам", "ям", "ах", "ях", "ую", "юю", "ть", "ет", "ит", "ат", "ят", "ут", "ют",
+        "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+    ],
+    key=len,
+    reverse=True,
+)
+
+
+# min_stem влияет на ключ кэша (query_hash): после изменения хэши пересчитывает rehash_symptom_queries
+def stem(word, min_stem=3):
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= min_stem:
+            return word[: -len(ending)]
+    return word
+
+
+def query_words(text):
+    return re.findall(r"\w+", text.lower().replace("ё", "е"))
+
+
+# Нормализация жалобы: регистр, пунктуация, порядок слов (и окончания)
+def normalize_query(text, use_stemming=None):
+    if use_stemming is None:
+        use_stemming = settings.SYMPTOM_CACHE_STEMMING
+    words = query_words(text)
+    if use_stemming:
+        words = [stem(word) for word in words]
+    return " ".join(sorted(set(words)))
+
+
+def query_hash(text):
+    return hashlib.sha256(normalize_query(text).encode()).hexdigest()
+
+
+# LRU-кэш ответов ИИ с ограничением по времени жизни
+class SymptomCache:
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize or settings.SYMPTOM_CACHE_SIZE
+        self.ttl = ttl or settings.SYMPTOM_CACHE_TTL
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self._data[key]
+                item = None
+            if item is None:
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            total = self.hits + self.misses
+        if total % settings.SYMPTOM_CACHE_REPORT_EVERY == 0:
+            logger.info("Symptom cache: %s", self.stats())
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._data),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+symptom_cache = SymptomCache()
@@ -1,15 +1,223 @@
+import logging
+import uuid
+from datetime import timedelta
+
 import requests
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import TelegramOutbox
+from core.utils.profiling import track_external
+
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Telegram на длину одного сообщения
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class TelegramError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Постановка сообщения в очередь (вызывать внутри транзакции бронирования)
+def enqueue_telegram_message(text: str):
+    return TelegramOutbox.objects.create(text=text)
 
-def send_telegram_message(text: str):
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": settings.TELEGRAM_CHAT_ID,
-        "text": text,
-        "parse_mode": "HTML",
-    }
 
+# Клиент Telegram Bot API с постоянным HTTP-соединением
+class TelegramClient:
+    def __init__(self, session=None, timeout=None):
+        self.session = session or requests.Session()
+        self.timeout = timeout or settings.TELEGRAM_TIMEOUT
+
+    @property
+    def url(self):
+        return f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+
+    def send(self, text: str):
+        payload = {
+            "chat_id": settings.TELEGRAM_CHAT_ID,
+            "text": text,
+            "parse_mode": "HTML",
+        }
+        try:
+            with track_external("telegram"):
+                response = self.session.post(self.url, data=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise TelegramError(str(e)) from e
+
+        if response.status_code == 429:
+            # Telegram сообщает, через сколько секунд можно повторить
+            try:
+                retry_after = response.json()["parameters"]["retry_after"]
+            except (ValueError, KeyError, TypeError):
+                retry_after = None
+            raise TelegramError("Too Many Requests", retry_after=retry_after)
+
+        if response.status_code >= 400:
+            raise TelegramError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+    def close(self):
+        self.session.close()
+
+
+# Синхронная отправка без очереди (ошибки только логируются)
+def send_telegram_message(text: str):
     try:
-        requests.post(url, data=payload, timeout=5)
-    except Exception:
-        pass
\ No newline at end of file
+        TelegramClient().send(text)
+    except TelegramError as e:
+        logger.warning(f"Telegram Error: {e}")
+
+
+def digest_header(count):
+    return f"📋 <b>Новые заявки ({count})</b>\n\n"
+
+
+# Склейка нескольких уведомлений в дайджесты в пределах лимита длины (с учётом заголовка).
+# Тексты не обрезаются: слишком длинное уведомление уходит отдельным сообщением по частям
+def build_digests(entries, limit=TELEGRAM_MESSAGE_LIMIT):
+    header = len(digest_header(len(entries)))
+    digests = []
+    current, length = [], header
+    for entry in entries:
+        extra = len(entry.text) + (2 if current else 0)
+        if current and length + extra > limit:
+            digests.append(current)
+            current, length = [], header
+            extra = len(entry.text)
+        current.append(entry)
+        length += extra
+    if current:
+        digests.append(current)
+
+    return [(digest_text(group), group) for group in digests]
+
+
+def digest_text(group):
+    if len(group) == 1:
+        return group[0].text
+    return digest_header(len(group)) + "\n\n".join(entry.text for entry in group)
+
+
+# Деление длинного текста на сообщения, по возможности по переводам строк
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    return [*parts, text]
+
+
+# Отправка накопившихся уведомлений из очереди
+class TelegramDispatcher:
+    def __init__(self, client=None, batch_size=50):
+        self.client = client or TelegramClient()
+        self.batch_size = batch_size
+        self.max_attempts = settings.TELEGRAM_OUTBOX_MAX_ATTEMPTS
+        self.digest_threshold = settings.TELEGRAM_DIGEST_THRESHOLD
+        self.backoff_base = settings.TELEGRAM_BACKOFF_BASE
+        self.backoff_max = settings.TELEGRAM_BACKOFF_MAX
+        self.lease = timedelta(seconds=settings.TELEGRAM_OUTBOX_LEASE)
+
+    def backoff(self, attempts, retry_after=None):
+        if retry_after:
+            return timedelta(seconds=retry_after)
+        seconds = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        return timedelta(seconds=seconds)
+
+    # Забираем пачку готовых к отправке уведомлений: в той же транзакции они переводятся
+    # в "sending" с меткой обработчика и сроком аренды. Условный UPDATE не даст двум обработчикам
+    # забрать одну строку; уведомления упавшего обработчика снова берутся после срока аренды
+    def claim_batch(self):
+        now = timezone.now()
+        token = uuid.uuid4()
+        with transaction.atomic():
+            due = TelegramOutbox.objects.filter(
+                status__in=["pending", "sending"], next_attempt_at__lte=now
+            )
+            ids = list(
+                due.order_by("next_attempt_at", "id")
+                .select_for_update(skip_locked=True)
+                .values_list("id", flat=True)[: self.batch_size]
+            )
+            due.filter(id__in=ids).update(
+                status="sending", claim_token=token, next_attempt_at=now + self.lease
+            )
+        return list(TelegramOutbox.objects.filter(claim_token=token, status="sending").order_by("id"))
+
+    def dispatch_once(self):
+        stats = {"sent": 0, "retried": 0, "failed": 0, "messages": 0}
+        entries = self.claim_batch()
+        if not entries:
+            return stats
+
+        # При всплеске заявок отправляем дайджест вместо отдельных сообщений.
+        # Частично отправленный текст досылается отдельно: в дайджесте его части были бы другими
+        resumed = [entry for entry in entries if entry.parts_sent]
+        fresh = [entry for entry in entries if not entry.parts_sent]
+        if len(fresh) >= self.digest_threshold:
+            messages = build_digests(fresh)
+        else:
+            messages = [(entry.text, [entry]) for entry in fresh]
+        messages += [(entry.text, [entry]) for entry in resumed]
+
+        for text, group in messages:
+            sent_parts = group[0].parts_sent
+            try:
+                for part in split_message(text)[sent_parts:]:
+                    self.client.send(part)
+                    sent_parts += 1
+            except TelegramError as e:
+                logger.warning(f"Telegram Error: {e}")
+                if len(group) == 1:
+                    group[0].parts_sent = sent_parts
+                self.reschedule(group, e)
+                failed = sum(1 for entry in group if entry.status == "failed")
+                stats["failed"] += failed
+                stats["retried"] += len(group) - failed
+                continue
+
+            self.claimed(group).update(
+                status="sent", sent_at=timezone.now(), last_error="", claim_token=None
+            )
+            stats["sent"] += len(group)
+            stats["messages"] += 1
+
+        return stats
+
+    # Запись только по своей метке: если аренда истекла и строки забрал другой обработчик,
+    # их состояние не перезаписываем
+    def claimed(self, group):
+        return TelegramOutbox.objects.filter(
+            id__in=[entry.id for entry in group], claim_token=group[0].claim_token
+        )
+
+    def reschedule(self, group, error):
+        now = timezone.now()
+        for entry in group:
+            entry.attempts += 1
+            entry.last_error = str(error)
+            if entry.attempts >= self.max_attempts:
+                entry.status = "failed"
+            else:
+                entry.status = "pending"
+                entry.next_attempt_at = now + self.backoff(entry.attempts, error.retry_after)
+            self.claimed([entry]).update(
+                attempts=entry.attempts,
+                last_error=entry.last_error,
+                status=entry.status,
+                next_attempt_at=entry.next_attempt_at,
+                parts_sent=entry.parts_sent,
+                claim_token=None,
+            )
+            entry.claim_token = None
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import SymptomAnalysis
+from core.utils.admission import aadmit, admit, llm_limiter
+from core.utils.gigachat import (
+    TechLineFilter,
+    aask_gigachat,
+    aget_client,
+    ask_gigachat,
+    build_chat,
+    get_client,
+    parse_ai_response,
+)
+from core.utils.keyword_triage import local_answer
+from core.utils.symptom_cache import query_hash, symptom_cache
+
+
+# Сохранённые ответы ИИ (повторы из кэша срок жизни ответа не продлевают)
+def stored_answers(key):
+    since = timezone.now() - timedelta(seconds=settings.SYMPTOM_CACHE_TTL)
+    return (
+        SymptomAnalysis.objects.filter(query_hash=key, source="ai", created_at__gte=since)
+        .only("ai_result", "recommended_doctor")
+        .order_by("-created_at")
+    )
+
+
+# Готовый ответ без обращения к ИИ: кэш в памяти -> сохранённые ответы в БД -> локальный классификатор.
+# Запрос в любом случае попадает в историю анализов
+def known_answer(user_text, key):
+    source = "cache"
+    result = symptom_cache.get(key)
+    if result is None:
+        stored = stored_answers(key).first()
+        if stored:
+            result = (stored.ai_result, stored.recommended_doctor)
+            symptom_cache.set(key, result)
+    symptom_cache.record(hit=result is not None)
+
+    # Однозначные жалобы определяются локально
+    if result is None:
+        result, source = local_answer(user_text), "local"
+    if result is not None:
+        record_answer(user_text, key, *result, source=source)
+    return result
+
+
+def record_answer(user_text, key, clean_response, doctor_name, source="ai"):
+    SymptomAnalysis.objects.create(
+        user_query=user_text,
+        ai_result=clean_response,
+        recommended_doctor=doctor_name,
+        query_hash=key,
+        source=source,
+    )
+
+
+def save_answer(user_text, key, clean_response, doctor_name):
+    record_answer(user_text, key, clean_response, doctor_name)
+    symptom_cache.set(key, (clean_response, doctor_name))
+
+
+def analyze_symptoms(user_text, requester=None):
+    key = query_hash(user_text)
+    result = known_answer(user_text, key)
+    if result is not None:
+        return result
+
+    slot = admit(requester)
+    try:
+        raw_response = ask_gigachat(user_text)
+    finally:
+        llm_limiter.release(slot)
+    clean_response, doctor_name = parse_ai_response(raw_response)
+    save_answer(user_text, key, clean_response, doctor_name)
+    return clean_response, doctor_name
+
+
+async def aanalyze_symptoms(user_text, requester=None):
+    key = query_hash(user_text)
+    result = await sync_to_async(known_answer)(user_text, key)
+    if result is not None:
+        return result
+
+    slot = await aadmit(requester)
+    try:
+        raw_response = await aask_gigachat(user_text)
+    finally:
+        await llm_limiter.arelease(slot)
+    clean_response, doctor_name = parse_ai_response(raw_response)
+    await sync_to_async(save_answer)(user_text, key, clean_response, doctor_name)
+    return clean_response, doctor_name
+
+
+# Подготовка потокового ответа до его начала (чтобы отказ вернуть кодом 429/503):
+# (ключ, готовый ответ, слот ИИ). Слот занимается только если готового ответа нет
+def prepare_stream(user_text, requester=None):
+    key = query_hash(user_text)
+    result = known_answer(user_text, key)
+    slot = admit(requester) if result is None else None
+    return key, result, slot
+
+
+# Потоковый анализ: события ("token", текст) по мере генерации и в конце ("done", врач).
+# Слот из prepare_stream освобождает вызывающий (SlotStream)
+def stream_symptoms(user_text, key, result):
+    if result is not None:
+        yield "token", result[0]
+        yield "done", result[1]
+        return
+
+    tech_filter = TechLineFilter()
+    for chunk in get_client().stream(build_chat(user_text)):
+        text = tech_filter.feed(chunk.choices[0].delta.content or "")
+        if text:
+            yield "token", text
+
+    rest, clean_response, doctor_name = tech_filter.finish()
+    if rest:
+        yield "token", rest
+    save_answer(user_text, key, clean_response, doctor_name)
+    yield "done", doctor_name
+
+
+async def astream_symptoms(user_text, key, result):
+    if result is not None:
+        yield "token", result[0]
+        yield "done", result[1]
+        return
+
+    tech_filter = TechLineFilter()
+    async for chunk in aget_client().astream(build_chat(user_text)):
+        text = tech_filter.feed(chunk.choices[0].delta.content or "")
+        if text:
+            yield "token", text
+
+    rest, clean_response, doctor_name = tech_filter.finish()
+    if rest:
+        yield "token", rest
+    await sync_to_async(save_answer)(user_text, key, clean_response, doctor_name)
+    yield "done", doctor_name
@@ -1,4 +1,3 @@
-import re
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.views.generic import TemplateView, ListView, DetailView, View
@@ -6,27 +5,49 @@ from core.forms import ReviewForm
 from .models import (
     HeroCard,
     Review,
-    Schedule,
     SmallCard,
     SquareCard,
     Doctor,
     Services,
     Promotion,
     Contacts,
-    SymptomAnalysis,
 )
 from users.views import get_available_slots_queryset
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import CreateView
 from django.contrib import messages
-from django.db.models import Avg
 import logging
 from django.conf import settings
-from gigachat import GigaChat
+from asgiref.sync import sync_to_async
+from core.utils.page_cache import cached_by_versions, page_version
+from core.utils.admission import AdmissionRejected, AsyncSlotStream, SlotStream, arequester, requester
+from core.utils.ratings import completed_visit_exists
+from core.utils.specializations import doctors_with_next_slots
+from core.utils.triage import aanalyze_symptoms, analyze_symptoms, astream_symptoms, prepare_stream, stream_symptoms
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils import timezone
+import json
 
 
 logger = logging.getLogger(__name__)
+
+
+def rejection_message(exc):
+    if exc.reason == "quota":
+        return f"Превышено число обращений к ИИ-ассистенту. Попробуйте через {exc.retry_after} сек."
+    return f"ИИ-ассистент сейчас перегружен. Попробуйте через {exc.retry_after} сек."
+
+
+# Отказ при перегрузке: 503 (очередь полна), 429 (исчерпана квота) и Retry-After
+def rejected_response(response, exc):
+    response.status_code = 429 if exc.reason == "quota" else 503
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
 # ИИ-бот для диагностики симптомов
 class SymptomCheckerView(View):
     template_name = "core/symptom_checker.html"
@@ -36,53 +57,19 @@ class SymptomCheckerView(View):
     
     def post(self, request):
         user_text = request.POST.get("symptoms", "").strip()
-        ai_response = ""
+        clean_response = ""
         error_message = None
+        doctors = []
 
         if not user_text:
             error_message = "Пожалуйста, опишите Ваши симптомы"
         else:
             try:
-                with GigaChat(
-                    credentials=settings.GIGACHAT_CREDENTIALS,
-                    verify_ssl_certs=True,
-                    ca_bundle_file=settings.GIGACHAT_CERTS,
-                    scope="GIGACHAT_API_PERS"
-                ) as giga:
-                    
-                    response = giga.chat({
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": (
-                                    "Ты — медицинский ИИ-ассистент клиники. "
-                                    "Твоя задача: проанализировать жалобы пользователя, "
-                                    "назвать возможные причины (не ставя окончательный диагноз) "
-                                    "и подсказать, к какому врачу (терапевт, ЛОР, хирург и т.д.) записаться. "
-                                    "Отвечай вежливо и кратко. В конце обязательно пиши: "
-                                    "'Внимание! Это предварительная информация, необходим очный осмотр врача'"
-                                    "После этого дисклеймера ОБЯЗАТЕЛЬНО добавь техническую строку строго в формате: "
-                                    "ВРАЧ_ДЛЯ_БАЗЫ: [Название специалиста]"
-                                )
-                            }, 
-                            {"role": "user", "content": user_text}
-                        ]
-                    })
-                    ai_response = response.choices[0].message.content
-
-                   
-                    match = re.search(r"ВРАЧ_ДЛЯ_БАЗЫ:\s*\[?(.*?)\]?$", ai_response)
-                    doctor_name = match.group(1).strip() if match else "Терапевт"
-
-                    # Удаление технической строки
-                    clean_response = re.sub(r"ВРАЧ_ДЛЯ_БАЗЫ:.*", "", ai_response).strip()
-
-
-                    SymptomAnalysis.objects.create(
-                        user_query=user_text,
-                        ai_result=clean_response,
-                        recommended_doctor=doctor_name
-                    )
+                clean_response, doctor_name = analyze_symptoms(user_text, requester(request))
+                doctors = doctors_with_next_slots(doctor_name, settings.SYMPTOM_CHECKER_SLOTS_PER_DOCTOR)
+            except AdmissionRejected as e:
+                response = render(request, self.template_name, {"symptoms": user_text, "error": rejection_message(e)})
+                return rejected_response(response, e)
             except Exception as e:
                 logger.error(f"GigaChat Error: {e}")
                 error_message = "Произошла ошибка при связи с ИИ. Попробуйте позже"
@@ -90,18 +77,128 @@ class SymptomCheckerView(View):
         return render(request, self.template_name, {
             "symptoms": user_text,
             "response": clean_response,
-            "error": error_message
+            "error": error_message,
+            "doctors": doctors,
         })
 
 
+# Асинхронный вариант: под ASGI воркер не блокируется на время ответа ИИ
+class AsyncSymptomCheckerView(View):
+    template_name = "core/symptom_checker.html"
+
+    async def get(self, request):
+        return await sync_to_async(render)(request, self.template_name)
+
+    async def post(self, request):
+        user_text = request.POST.get("symptoms", "").strip()
+        clean_response = ""
+        error_message = None
+        doctors = []
+
+        if not user_text:
+            error_message = "Пожалуйста, опишите Ваши симптомы"
+        else:
+            try:
+                clean_response, doctor_name = await aanalyze_symptoms(user_text, await arequester(request))
+                doctors = await sync_to_async(doctors_with_next_slots)(
+                    doctor_name, settings.SYMPTOM_CHECKER_SLOTS_PER_DOCTOR
+                )
+            except AdmissionRejected as e:
+                response = await sync_to_async(render)(
+                    request, self.template_name, {"symptoms": user_text, "error": rejection_message(e)}
+                )
+                return rejected_response(response, e)
+            except Exception as e:
+                logger.error(f"GigaChat Error: {e}")
+                error_message = "Произошла ошибка при связи с ИИ. Попробуйте позже"
+
+        # Шаблон обращается к request.user, поэтому рендер - в синхронном потоке
+        return await sync_to_async(render)(request, self.template_name, {
+            "symptoms": user_text,
+            "response": clean_response,
+            "error": error_message,
+            "doctors": doctors,
+        })
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def recommended_doctors_html(doctor_name):
+    doctors = doctors_with_next_slots(doctor_name, settings.SYMPTOM_CHECKER_SLOTS_PER_DOCTOR)
+    return render_to_string("core/partials/recommended_doctors.html", {"doctors": doctors})
+
+
+# Потоковый ответ ИИ-бота: токены уходят в браузер по мере генерации (Server-Sent Events)
+class SymptomStreamView(View):
+    def post(self, request):
+        user_text = request.POST.get("symptoms", "").strip()
+        if not user_text:
+            return JsonResponse({"error": "Пожалуйста, опишите Ваши симптомы"}, status=400)
+
+        try:
+            key, result, slot = prepare_stream(user_text, requester(request))
+        except AdmissionRejected as e:
+            return rejected_response(JsonResponse({"error": rejection_message(e)}), e)
+
+        # Под ASGI поток не занимает воркер, под WSGI - обычный генератор.
+        # Слот ИИ (если ответа нет в кэше) занят, пока ответ не закрыт
+        if isinstance(request, ASGIRequest):
+            events = AsyncSlotStream(self.aevents(user_text, key, result), slot)
+        else:
+            events = SlotStream(self.events(user_text, key, result), slot)
+
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def events(self, user_text, key, result):
+        try:
+            for event, value in stream_symptoms(user_text, key, result):
+                if event == "token":
+                    yield sse_event("token", {"text": value})
+                else:
+                    yield sse_event("done", {"doctor": value, "doctors_html": recommended_doctors_html(value)})
+        except Exception as e:
+            logger.error(f"GigaChat Error: {e}")
+            yield sse_event("error", {"error": "Произошла ошибка при связи с ИИ. Попробуйте позже"})
+
+    async def aevents(self, user_text, key, result):
+        try:
+            async for event, value in astream_symptoms(user_text, key, result):
+                if event == "token":
+                    yield sse_event("token", {"text": value})
+                else:
+                    doctors_html = await sync_to_async(recommended_doctors_html)(value)
+                    yield sse_event("done", {"doctor": value, "doctors_html": doctors_html})
+        except Exception as e:
+            logger.error(f"GigaChat Error: {e}")
+            yield sse_event("error", {"error": "Произошла ошибка при связи с ИИ. Попробуйте позже"})
+
+
+def build_home_cards():
+    return {
+        "hero_card": HeroCard.objects.filter(is_active=True).first(),
+        "small_cards": list(SmallCard.objects.filter(is_active=True)[:2]),
+        "square_cards": list(SquareCard.objects.filter(is_active=True)[:6]),
+    }
+
+
+# Карточки главной страницы из кэша; ключ меняется при любой правке карточек
+def home_cards():
+    return cached_by_versions(
+        "home", [HeroCard, SmallCard, SquareCard], build_home_cards, settings.HOME_CACHE_TIMEOUT
+    )
+
+
 class HomeView(TemplateView):
     template_name = "core/index.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["hero_card"] = HeroCard.objects.filter(is_active=True).first()
-        context["small_cards"] = SmallCard.objects.filter(is_active=True)[:2]
-        context["square_cards"] = SquareCard.objects.filter(is_active=True)[:6]
+        context.update(home_cards())
         return context
 
 
@@ -116,10 +213,23 @@ class SquareCardDetailView(DetailView):
         return get_object_or_404(SquareCard, slug=self.kwargs["slug"])
 
 
-class DoctorsListView(ListView):
+# Список страницы кэшируется в шаблоне ({% cache %}) по версиям моделей и дате:
+# стаж врачей и действие акций меняются с датой. Запрос к БД - только при промахе кэша
+class VersionedCacheMixin:
+    cache_models = ()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["cache_version"] = page_version(self.cache_models, timezone.localdate().isoformat())
+        context["cache_timeout"] = settings.CATALOG_CACHE_TIMEOUT
+        return context
+
+
+class DoctorsListView(VersionedCacheMixin, ListView):
     model = Doctor
     template_name = "navbar/doctors_list.html"
     context_object_name = "doctors"
+    cache_models = [Doctor]
 
     def get_queryset(self):
         return Doctor.objects.all()
@@ -144,50 +254,43 @@ class DoctorDetailView(DetailView):
         for slot in slots:
             slots_by_date.setdefault(slot.date, []).append(slot)
 
-        # Отзывы только от пациентов завершивших прием
-        completed_patients = (
-            Schedule.objects.filter(
-                doctor=self.object, status="completed", booked_by__isnull=False
-            )
-            .values_list("booked_by_id", flat=True)
-            .distinct()
-        )
-
-        reviews = Review.objects.filter(
-            doctor=self.object, patient__id__in=completed_patients
-        ).select_related("patient")
+        # Отзывы только от пациентов, завершивших приём (признак ставится при создании отзыва)
+        reviews = Review.objects.filter(doctor=self.object, verified=True).select_related("patient")
 
-        # Кладём в контекст
+        # Кладём в контекст; средняя оценка - из сумм, которые хранятся у врача
         context["reviews"] = reviews
-        context["avg_rating"] = reviews.aggregate(Avg("rating"))["rating__avg"] or 0
-        context["review_count"] = reviews.count()
+        context["avg_rating"] = self.object.average_rating
+        context["review_count"] = self.object.rating_count
         context["slots_by_date"] = slots_by_date
 
         return context
 
 
-class ServicesListView(ListView):
+class ServicesListView(VersionedCacheMixin, ListView):
     model = Services
     template_name = "navbar/services_list.html"
     context_object_name = "services"
+    cache_models = [Services]
 
     def get_queryset(self):
         return Services.objects.all()
 
 
-class PromotionView(ListView):
+class PromotionView(VersionedCacheMixin, ListView):
     model = Promotion
     template_name = "navbar/promotion_list.html"
     context_object_name = "promotion"
+    cache_models = [Promotion]
 
     def get_queryset(self):
         return Promotion.objects.all()
 
 
-class ContactsView(ListView):
+class ContactsView(VersionedCacheMixin, ListView):
     model = Contacts
     template_name = "navbar/contacts.html"
     context_object_name = "contacts"
+    cache_models = [Contacts]
 
 
 class TermsOfUseView(TemplateView):
@@ -206,10 +309,7 @@ class ReviewCreateView(LoginRequiredMixin, CreateView):
 
     def dispatch(self, request, *args, **kwargs):
         self.doctor = get_object_or_404(Doctor, slug=kwargs.get("slug"))
-        has_completed = Schedule.objects.filter(
-            doctor=self.doctor, booked_by=request.user, status="completed"
-        ).exists()
-        if not has_completed:
+        if not completed_visit_exists(self.doctor.id, request.user.id):
             messages.error(
                 request, "Вы можете оставить отзыв только после завершённого приёма"
             )
@@ -219,6 +319,7 @@ class ReviewCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.doctor = self.doctor
         form.instance.patient = self.request.user
+        form.instance.verified = True
         messages.success(self.request, "Отзыв успешно добавлен")
         return super().form_valid(form)
 
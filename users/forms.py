@@ -1,6 +1,7 @@
 from allauth.account.forms import SignupForm
 from django import forms
 from .models import CustomUser
+from core.utils.phones import normalize_phone
 from core.models import Schedule
 
 
@@ -27,23 +28,18 @@ class CustomSignupForm(SignupForm):
     )
 
     def clean_phone(self):
-        phone = self.cleaned_data["phone"]
-
-        digits = "".join(c for c in phone if c.isdigit())
-
-        if len(digits) == 10:
-            digits = "7" + digits
-        elif len(digits) == 11 and digits.startswith("8"):
-            digits = "7" + digits[1:]
-        elif len(digits) != 11 or not digits.startswith("7"):
+        phone = normalize_phone(self.cleaned_data["phone"])
+        if phone is None:
             raise forms.ValidationError("Введите корректный российский номер телефона")
-
-        return "+" + digits
+        if CustomUser.objects.filter(phone_key=phone, role="patient", is_active=True).exists():
+            raise forms.ValidationError("Пациент с этим номером уже зарегистрирован")
+        return phone
 
     def save(self, request):
         phone = self.cleaned_data["phone"]
 
-        existing = CustomUser.objects.filter(phone=phone).first()
+        # Гостевая запись, созданная администратором (поиск по индексу phone_key)
+        existing = CustomUser.objects.filter(phone_key=phone, role="patient", is_active=False).order_by("id").first()
 
         if existing:
             # активация существующего пациента
@@ -85,6 +81,12 @@ class AdminPatientForm(forms.ModelForm):
     )
     gender = forms.ChoiceField(choices=CustomUser.gender_choices, label="Пол")
 
+    def clean_phone(self):
+        phone = normalize_phone(self.cleaned_data["phone"])
+        if phone is None:
+            raise forms.ValidationError("Введите корректный российский номер телефона")
+        return phone
+
     class Meta:
         model = CustomUser
         fields = [
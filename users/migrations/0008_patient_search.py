@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+# Поисковый индекс пациентов (SQLite FTS5). Строки поддерживают триггеры - в том числе
+# при bulk_create и update(). Имена без "ё", телефон - только цифры, полностью и последние 10.
+# Миграции, пересоздающие таблицу users_customuser на SQLite, удаляют триггеры - их нужно создать заново
+def normalized(column):
+    return f"replace(replace(coalesce({column}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def phone_digits(column):
+    digits = f"coalesce({column}, '')"
+    for char in "+-() ":
+        digits = f"replace({digits}, '{char}', '')"
+    return f"(CASE WHEN length({digits}) > 10 THEN {digits} || ' ' || substr({digits}, -10) ELSE {digits} END)"
+
+
+def values(row):
+    return ", ".join([
+        f"{row}.id",
+        normalized(f"{row}.last_name"),
+        normalized(f"{row}.first_name"),
+        normalized(f"{row}.patronymic"),
+        phone_digits(f"{row}.phone"),
+    ])
+
+
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE users_patient_search USING fts5("
+    "last_name, first_name, patronymic, phone, tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+    "CREATE TRIGGER users_patient_search_insert AFTER INSERT ON users_customuser WHEN new.role = 'patient' BEGIN "
+    f"INSERT INTO users_patient_search(rowid, last_name, first_name, patronymic, phone) VALUES ({values('new')}); END",
+    # Только при изменении полей поиска (вход пользователя обновляет last_login - индекс не трогаем)
+    "CREATE TRIGGER users_patient_search_update AFTER UPDATE OF role, last_name, first_name, patronymic, phone "
+    "ON users_customuser BEGIN DELETE FROM users_patient_search WHERE rowid = old.id; "
+    f"INSERT INTO users_patient_search(rowid, last_name, first_name, patronymic, phone) "
+    f"SELECT {values('new')} WHERE new.role = 'patient'; END",
+    "CREATE TRIGGER users_patient_search_delete AFTER DELETE ON users_customuser BEGIN "
+    "DELETE FROM users_patient_search WHERE rowid = old.id; END",
+    "INSERT INTO users_patient_search(rowid, last_name, first_name, patronymic, phone) "
+    f"SELECT {values('users_customuser')} FROM users_customuser WHERE role = 'patient'",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS users_patient_search_insert",
+    "DROP TRIGGER IF EXISTS users_patient_search_update",
+    "DROP TRIGGER IF EXISTS users_patient_search_delete",
+    "DROP TABLE IF EXISTS users_patient_search",
+]
+
+
+# На других СУБД индекс не создаётся - поиск работает через icontains
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0007_remove_patient_model'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'last_name'], name='user_role_last_name_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0008_patient_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='phone_key',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True, verbose_name='Телефон (ключ)'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['phone_key'], name='user_phone_key_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True), ('role', 'patient')), fields=('phone_key',), name='user_active_patient_phone_uniq'),
+        ),
+    ]
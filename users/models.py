@@ -2,6 +2,8 @@ from django import forms
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+from core.utils.phones import normalize_phone
+
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
@@ -19,11 +21,70 @@ class CustomUser(AbstractUser):
     gender = models.CharField(max_length=6, choices=gender_choices, verbose_name="Пол")
     birth_date = models.DateField(blank=True, null=True, verbose_name="Дата рождения")
     phone = models.CharField(max_length=15, blank=True, null=True, verbose_name="Номер телефона")
+    # Номер в едином виде (+7XXXXXXXXXX) для поиска пациента по телефону; заполняется в save()
+    phone_key = models.CharField(max_length=12, blank=True, null=True, editable=False, verbose_name="Телефон (ключ)")
     subscribe_promotions = models.BooleanField(default=False, verbose_name="Подписка на акции")
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Список пациентов по алфавиту с листанием по ключу (фамилия, id)
+            models.Index(fields=["role", "last_name"], name="user_role_last_name_idx"),
+            # Поиск гостевой записи при регистрации
+            models.Index(fields=["phone_key"], name="user_phone_key_idx"),
+        ]
+        constraints = [
+            # Один телефон - один активный пациент (гостевые записи сливает команда merge_patient_phones)
+            models.UniqueConstraint(
+                fields=["phone_key"],
+                condition=models.Q(role="patient", is_active=True),
+                name="user_active_patient_phone_uniq",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.last_name} {self.first_name}"
     
+    # Телефон на момент загрузки из БД: ключ пересчитываем, только если номер изменился
+    _loaded_phone = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_phone = instance.__dict__.get("phone")
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or "phone" in fields:
+            self._loaded_phone = self.__dict__.get("phone")
+
+    # Номер новый или изменён после загрузки. Иначе phone_key не трогаем: у конфликтующих
+    # активных пациентов merge_patient_phones его намеренно очищает
+    @property
+    def phone_changed(self):
+        if self._state.adding:
+            return True
+        return "phone" in self.__dict__ and self.phone != self._loaded_phone
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            if self.phone_changed:
+                self.phone_key = normalize_phone(self.phone)
+        elif "phone" in update_fields:
+            self.phone_key = normalize_phone(self.phone)
+            kwargs["update_fields"] = {*update_fields, "phone_key"}
+        super().save(*args, **kwargs)
+        if update_fields is None or "phone" in update_fields:
+            self._loaded_phone = self.__dict__.get("phone")
+
+    # Номер уже у другого активного пациента
+    def phone_taken(self):
+        key = normalize_phone(self.phone)
+        return key is not None and CustomUser.objects.filter(
+            phone_key=key, role='patient', is_active=True
+        ).exclude(pk=self.pk).exists()
+
     def clean(self):
         super().clean()
 
@@ -35,6 +96,8 @@ class CustomUser(AbstractUser):
 
             if not self.phone:
                 errors['phone'] = 'Телефон обязателен для пациента'
+            elif self.phone_changed and self.phone_taken():
+                errors['phone'] = 'Этот номер уже зарегистрирован у другого пациента'
 
             if errors:
                 raise forms.ValidationError(errors)
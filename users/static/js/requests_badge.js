@@ -4,6 +4,17 @@ document.addEventListener('DOMContentLoaded', function () {
     if (!link || !badge) return;
 
     const apiUrl = link.dataset.apiUrl; 
+    const streamUrl = link.dataset.streamUrl;
+    let pollingStarted = false;
+
+    function renderBadge(count) {
+        if (count > 0) {
+            badge.style.display = 'inline-block';
+            badge.textContent = count;
+        } else {
+            badge.style.display = 'none';
+        }
+    }
 
     async function updateBadge() {
         try {
@@ -11,18 +22,33 @@ document.addEventListener('DOMContentLoaded', function () {
             if (!response.ok) return;
 
             const data = await response.json();
-            if (data.count > 0) {
-                badge.style.display = 'inline-block';
-                badge.textContent = data.count;
-            } else {
-                badge.style.display = 'none';
-            }
+            renderBadge(data.count);
         } catch (error) {
             console.error('Error fetching badge count:', error);
         }
     }
 
-    updateBadge();               
-    setInterval(updateBadge, 10000); 
-});
+    // Запасной вариант: опрос API каждые 10 секунд
+    function startPolling() {
+        if (pollingStarted) return;
+        pollingStarted = true;
+        updateBadge();               
+        setInterval(updateBadge, 10000); 
+    }
 
+    // Сервер присылает новое число заявок только при изменении
+    if (streamUrl && window.EventSource) {
+        const source = new EventSource(streamUrl);
+        source.onmessage = function (event) {
+            renderBadge(JSON.parse(event.data).count);
+        };
+        source.onerror = function () {
+            // CLOSED - поток недоступен (например, сервер не ASGI)
+            if (source.readyState === EventSource.CLOSED) {
+                startPolling();
+            }
+        };
+    } else {
+        startPolling();
+    }
+});
@@ -1,3 +1,534 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Doctor, Schedule
+from core.utils.patient_search import search_index_available
+from core.utils.pending_requests import (
+    PENDING_COUNT_KEY,
+    PENDING_VERSION_KEY,
+    adjust_pending_count,
+    get_pending_count,
+)
+from users.forms import CustomSignupForm
+from users.models import CustomUser
+
+
+@override_settings(REQUESTS_STREAM_POLL_INTERVAL=0.05, REQUESTS_STREAM_LIFETIME=5)
+class NewRequestsStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = CustomUser.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.doctor = Doctor.objects.create(
+            last_name="Павлов", first_name="Иван", specialization="Терапевт", start_work_year=2000
+        )
+
+    def create_slot(self, hour, status="available"):
+        return Schedule.objects.create(
+            doctor=self.doctor,
+            date=date.today() + timedelta(days=1),
+            start_time=time(hour, 0),
+            end_time=time(hour, 30),
+            status=status,
+        )
+
+    def test_wsgi_request_falls_back_to_polling(self):
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse("users:new_requests_stream"))
+
+        self.assertEqual(response.status_code, 204)
+
+    def test_stream_requires_staff(self):
+        patient = CustomUser.objects.create_user(username="patient", password="pass")
+        self.client.force_login(patient)
+
+        response = self.client.get(reverse("users:new_requests_stream"))
+
+        self.assertEqual(response.status_code, 403)
+
+    async def test_stream_pushes_count_only_on_change(self):
+        await sync_to_async(self.create_slot)(9, status="booked")
+        slot = await sync_to_async(self.create_slot)(10)
+        await self.async_client.aforce_login(self.staff)
+
+        response = await self.async_client.get(reverse("users:new_requests_stream"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+
+        first = (await anext(events)).decode()
+        self.assertIn("retry: 1000", first)
+        self.assertEqual(json.loads(first.split("data: ")[1])["count"], 1)
+
+        slot.status = "booked"
+        await sync_to_async(slot.save)()
+        # В тестовой транзакции on_commit не срабатывает - обновляем счётчик вручную
+        await sync_to_async(adjust_pending_count)(1)
+
+        event = (await asyncio.wait_for(anext(events), timeout=2)).decode()
+        self.assertEqual(json.loads(event.split("data: ")[1])["count"], 2)
+
+
+class PendingRequestsCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = CustomUser.objects.create_user(username="admin", password="pass", is_staff=True)
+        doctor = Doctor.objects.create(
+            last_name="Павлов", first_name="Иван", specialization="Терапевт", start_work_year=2000
+        )
+        self.slot = Schedule.objects.create(
+            doctor=doctor, date=date.today() + timedelta(days=1), start_time=time(9, 0), end_time=time(9, 30)
+        )
+
+    def test_counter_follows_transitions(self):
+        self.assertEqual(get_pending_count(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slot.status = "booked"
+            self.slot.save()
+        self.assertEqual(cache.get(PENDING_COUNT_KEY), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slot.status = "confirmed"
+            self.slot.save()
+        self.assertEqual(cache.get(PENDING_COUNT_KEY), 0)
+
+    def test_lost_version_falls_back_to_db_count(self):
+        self.assertEqual(get_pending_count(), 0)
+        Schedule.objects.update(status="booked")
+        cache.delete(PENDING_VERSION_KEY)
+
+        self.assertEqual(get_pending_count(), 1)
+        self.assertEqual(cache.get(PENDING_COUNT_KEY), 1)
+
+    def test_unchanged_count_returns_304_without_counting(self):
+        self.client.force_login(self.staff)
+        url = reverse("users:new_requests_count_api")
+        response = self.client.get(url)
+        self.assertEqual(response.json(), {"count": 0})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if "core_schedule" in q["sql"]])
+        # Кроме сессии и пользователя - одно чтение кэша (с DatabaseCache это SELECT из django_cache)
+        cache_queries = [q for q in queries if "django_cache" in q["sql"]]
+        self.assertLessEqual(len(cache_queries), 1)
+
+    def test_reconcile_fixes_drift(self):
+        cache.set(PENDING_COUNT_KEY, 5, None)
+        Schedule.objects.filter(pk=self.slot.pk).update(status="booked")
+
+        call_command("reconcile_pending_requests", stdout=StringIO())
+
+        self.assertEqual(cache.get(PENDING_COUNT_KEY), 1)
+
+
+@override_settings(ADMIN_SCHEDULE_PAGE_SIZE=3)
+class AdminScheduleListTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.doctors = [
+            Doctor.objects.create(last_name=name, first_name="Иван", specialization="Терапевт", start_work_year=2000)
+            for name in ("Павлов", "Орлов")
+        ]
+        today = date.today()
+        for doctor in self.doctors:
+            for day in (-1, 0, 1):
+                for hour, status in ((9, "available"), (10, "booked")):
+                    Schedule.objects.create(
+                        doctor=doctor, date=today + timedelta(days=day),
+                        start_time=time(hour, 0), end_time=time(hour, 30), status=status,
+                    )
+        self.client.force_login(self.staff)
+        self.url = reverse("users:admin_schedule_list")
+
+    def test_pages_follow_cursor_from_today(self):
+        seen = []
+        url = self.url
+        while url:
+            response = self.client.get(url)
+            seen += [(slot.doctor_id, slot.date, slot.start_time) for slot in response.context["schedules"]]
+            url = response.context["next_page_url"] and self.url + response.context["next_page_url"]
+
+        # Прошедший день по умолчанию не показывается; порядок - врач, дата, время
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(seen, sorted(seen))
+        self.assertTrue(all(day >= date.today() for _, day, _ in seen))
+
+    def test_date_range_and_facets(self):
+        yesterday = date.today() - timedelta(days=1)
+        response = self.client.get(self.url, {
+            "date_from": yesterday.isoformat(), "date_to": yesterday.isoformat(),
+            "status": "booked", "doctor": self.doctors[0].id,
+        })
+
+        self.assertEqual([slot.status for slot in response.context["schedules"]], ["booked"])
+        # Статусы считаются по выбранному врачу, врачи - по выбранному статусу
+        self.assertEqual(
+            {value: count for value, _, count in response.context["status_facets"]}["available"], 1
+        )
+        self.assertEqual([doctor.slot_count for doctor in response.context["doctors"]], [1, 1])
+
+    def test_invalid_dates_are_ignored(self):
+        response = self.client.get(self.url, {"date_from": "2026-13-01", "date_to": "2026-02-30"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["filters"]["date_from"], timezone.localdate())
+        self.assertIsNone(response.context["filters"]["date_to"])
+
+    def test_page_query_count_does_not_grow_with_history(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        Schedule.objects.bulk_create(
+            Schedule(
+                doctor=self.doctors[0], date=date.today() - timedelta(days=day),
+                start_time=time(9, 0), end_time=time(9, 30), status="completed",
+            )
+            for day in range(2, 200)
+        )
+
+        with CaptureQueriesContext(connection) as more_queries:
+            self.client.get(self.url)
+
+        self.assertEqual(len(more_queries), len(queries))
+        self.assertEqual(len([q for q in queries if "GROUP BY" in q["sql"]]), 1)
+
+
+class AvailabilityApiTests(TestCase):
+    def setUp(self):
+        self.doctor = Doctor.objects.create(
+            last_name="Павлов", first_name="Иван", specialization="Терапевт", start_work_year=2000
+        )
+        self.other = Doctor.objects.create(
+            last_name="Орлов", first_name="Пётр", specialization="Хирург", start_work_year=2000
+        )
+        tomorrow = date.today() + timedelta(days=1)
+        for day in range(0, 40, 3):
+            for doctor in (self.doctor, self.other):
+                Schedule.objects.create(
+                    doctor=doctor, date=tomorrow + timedelta(days=day),
+                    start_time=time(9, 0), end_time=time(9, 30),
+                )
+        Schedule.objects.create(
+            doctor=self.doctor, date=tomorrow, start_time=time(10, 0), end_time=time(10, 30), status="booked"
+        )
+        self.url = reverse("users:availability_api")
+
+    def test_window_per_doctor(self):
+        tomorrow = date.today() + timedelta(days=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"doctor": self.doctor.slug, "start": tomorrow, "days": 7})
+
+        data = response.json()
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(data["end"], (tomorrow + timedelta(days=6)).isoformat())
+        [doctor] = data["doctors"]
+        self.assertEqual(doctor["slug"], self.doctor.slug)
+        # Занятый слот не попадает, дни вне окна - тоже
+        self.assertEqual(list(doctor["days"]), [(tomorrow + timedelta(days=day)).isoformat() for day in (0, 3, 6)])
+        self.assertEqual(doctor["days"][tomorrow.isoformat()][0][1], "09:00")
+        self.assertIn("max-age=", response["Cache-Control"])
+
+    def test_specialization_and_window_limit(self):
+        response = self.client.get(self.url, {"specialization": "хирург", "days": 1000})
+
+        data = response.json()
+        self.assertEqual([doctor["slug"] for doctor in data["doctors"]], [self.other.slug])
+        self.assertEqual(date.fromisoformat(data["end"]) - date.fromisoformat(data["start"]), timedelta(days=30))
+
+    def test_impossible_start_falls_back_to_today(self):
+        response = self.client.get(self.url, {"start": "2026-02-30"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["start"], date.today().isoformat())
+
+    def test_patient_page_shows_one_week(self):
+        patient = CustomUser.objects.create_user(username="patient", password="pass")
+        self.client.force_login(patient)
+        url = reverse("users:available_schedule_by_doctor", args=[self.doctor.slug])
+
+        response = self.client.get(url)
+        # Слоты каждые 3 дня с завтрашнего - в первую неделю попадают два дня
+        self.assertEqual(
+            {slot.date for slot in response.context["schedules"]},
+            {date.today() + timedelta(days=1), date.today() + timedelta(days=4)},
+        )
+
+        response = self.client.get(url, {"start": response.context["next_start"].isoformat()})
+        self.assertTrue(all(
+            date.today() + timedelta(days=7) <= slot.date < date.today() + timedelta(days=14)
+            for slot in response.context["schedules"]
+        ))
+        self.assertEqual(response.context["previous_start"], date.today())
+
+    def test_unchanged_window_returns_304(self):
+        response = self.client.get(self.url)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(response.status_code, 304)
+
+
+class BulkShiftToggleTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.patient = CustomUser.objects.create_user(username="patient", password="pass", last_name="Иванов")
+        self.doctors = [
+            Doctor.objects.create(last_name=name, first_name="Иван", specialization="Терапевт", start_work_year=2000)
+            for name in ("Павлов", "Орлов", "Ершов")
+        ]
+        today = date.today()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        for doctor in self.doctors:
+            Schedule.objects.bulk_create(
+                Schedule(doctor=doctor, date=self.monday + timedelta(days=day), start_time=time(9), end_time=time(9, 30))
+                for day in range(14)
+            )
+        Schedule.objects.filter(doctor=self.doctors[0], date=self.monday + timedelta(days=2)).update(
+            status="booked", booked_by=self.patient
+        )
+        self.client.force_login(self.staff)
+        self.url = reverse("users:admin_schedule_toggle_day")
+
+    def test_close_range_for_several_doctors_with_weekdays(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {
+                "doctor": [self.doctors[0].id, self.doctors[1].id],
+                "date_from": self.monday, "date_to": self.monday + timedelta(days=13),
+                "weekday": ["0", "2"],
+                "action": "close",
+            }, follow=True)
+
+        # Понедельники и среды двух недель; запись пациента не закрывается
+        closed = Schedule.objects.filter(status="closed")
+        self.assertEqual(closed.filter(doctor=self.doctors[0]).count(), 3)
+        self.assertEqual(closed.filter(doctor=self.doctors[1]).count(), 4)
+        self.assertFalse(closed.filter(doctor=self.doctors[2]).exists())
+        self.assertEqual(Schedule.objects.filter(status="booked").count(), 1)
+        self.assertEqual(len([q for q in queries if q["sql"].startswith('UPDATE "core_schedule"')]), 1)
+
+        text = [str(message) for message in response.context["messages"]]
+        self.assertIn("Павлов Иван: 3 слотов", text)
+        self.assertTrue(any("остаются записи" in line and "Иванов" in line for line in text))
+
+        self.doctors[1].refresh_from_db()
+        self.assertEqual(self.doctors[1].free_slots_30d, 10)
+
+    def test_single_day_form_still_works(self):
+        self.client.post(self.url, {"doctor": self.doctors[2].id, "date": self.monday, "action": "close"})
+        self.client.post(self.url, {"doctor": self.doctors[2].id, "date": self.monday, "action": "open"})
+
+        self.assertFalse(Schedule.objects.filter(status="closed").exists())
+
+    def test_invalid_range_is_rejected(self):
+        self.client.post(self.url, {
+            "doctor": self.doctors[0].id, "date_from": self.monday, "date_to": self.monday - timedelta(days=1),
+            "action": "close",
+        })
+
+        self.assertFalse(Schedule.objects.filter(status="closed").exists())
+
+    def test_impossible_dates_are_rejected(self):
+        for dates in ({"date_from": "2026-13-01"}, {"date_from": self.monday, "date_to": "2026-02-30"}):
+            with self.subTest(**dates):
+                response = self.client.post(
+                    self.url, {"doctor": self.doctors[0].id, "action": "close", **dates}, follow=True
+                )
+                self.assertIn("Некорректные данные", [str(m) for m in response.context["messages"]])
+
+        self.assertFalse(Schedule.objects.filter(status="closed").exists())
+
+
+@override_settings(ADMIN_PATIENTS_PAGE_SIZE=2)
+class PatientSearchTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(username="admin", password="pass", is_staff=True, role="admin")
+        people = [
+            ("Иванов", "Пётр", "+7 (916) 123-45-67"),
+            ("Иванова", "Анна", "89161112233"),
+            ("Петров", "Иван", "+79035550000"),
+            (None, "Безфамильный", ""),
+        ]
+        # bulk_create в обход save() - индекс ведут триггеры БД
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f"p{number}", role="patient", last_name=last, first_name=first, phone=phone)
+            for number, (last, first, phone) in enumerate(people)
+        )
+        self.client.force_login(self.staff)
+
+    def search(self, query):
+        response = self.client.get(reverse("users:search_patients"), {"q": query})
+        return [row["text"].split(" |")[0].strip() for row in response.json()["results"]]
+
+    def test_prefix_names_and_phone_digits(self):
+        self.assertEqual(self.search("иван"), ["Иванов Пётр", "Иванова Анна", "Петров Иван"])
+        self.assertEqual(self.search("ИВАНОВ петр"), ["Иванов Пётр"])
+        self.assertEqual(self.search("916"), ["Иванов Пётр", "Иванова Анна"])
+        self.assertEqual(self.search("8 903 555"), ["Петров Иван"])
+
+    def test_index_follows_changes(self):
+        patient = CustomUser.objects.get(username="p2")
+        patient.last_name = "Сидоров"
+        patient.save()
+        self.assertEqual(self.search("сидор"), ["Сидоров Иван"])
+
+        CustomUser.objects.filter(username="p2").update(role="admin")
+        self.assertEqual(self.search("сидор"), [])
+
+        CustomUser.objects.filter(username="p0").delete()
+        self.assertEqual(self.search("иванов"), ["Иванова Анна"])
+
+    def test_list_pages_by_cursor(self):
+        url = reverse("users:admin_patients_list")
+        names = []
+        for query in ("", "иван"):
+            seen = []
+            page = url + f"?q={query}"
+            while page:
+                response = self.client.get(page)
+                seen += [patient.first_name for patient in response.context["patients"]]
+                page = response.context.get("next_page_url") and url + response.context["next_page_url"]
+            names.append(seen)
+
+        self.assertEqual(names[0], ["Безфамильный", "Пётр", "Анна", "Иван"])
+        self.assertEqual(names[1], ["Пётр", "Анна", "Иван"])
+
+    @override_settings(PATIENT_SEARCH_CANDIDATES=2, ADMIN_PATIENTS_PAGE_SIZE=1)
+    def test_search_pages_past_candidate_window(self):
+        url = reverse("users:admin_patients_list")
+        seen = []
+        page = url + "?q=иван"
+        while page:
+            response = self.client.get(page)
+            seen += [patient.first_name for patient in response.context["patients"]]
+            page = response.context.get("next_page_url") and url + response.context["next_page_url"]
+
+        # Окна по 2 совпадения от новых к старым, внутри окна - по релевантности
+        self.assertEqual(seen, ["Анна", "Иван", "Пётр"])
+
+    def test_search_triggers_exist(self):
+        # Миграция, пересоздающая users_customuser на SQLite, удалит триггеры - тест это поймает
+        if not search_index_available():
+            self.skipTest("Поисковый индекс только на SQLite")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'users_customuser'"
+            )
+            triggers = {name for name, in cursor.fetchall()}
+        self.assertEqual(
+            triggers,
+            {"users_patient_search_insert", "users_patient_search_update", "users_patient_search_delete"},
+        )
+
+
+class PatientPhoneTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user(username="admin", password="pass", is_staff=True, role="admin")
+        self.client.force_login(self.staff)
+
+    def create_guest(self, phone):
+        return self.client.post(reverse("users:admin_patient_add"), {
+            "last_name": "Иванов", "first_name": "Пётр", "gender": "male", "birth_date": "1980-01-01", "phone": phone,
+        })
+
+    def test_admin_form_normalizes_and_does_not_duplicate(self):
+        self.create_guest("+7 (916) 123 45 67")
+        self.create_guest("8 916 123-45-67")
+
+        guest = CustomUser.objects.get(role="patient")
+        self.assertEqual((guest.phone, guest.phone_key), ("+79161234567", "+79161234567"))
+        self.assertFalse(guest.is_active)
+
+    def test_signup_activates_guest_by_phone_key(self):
+        self.create_guest("+7 (916) 123 45 67")
+        form = CustomSignupForm(data={
+            "email": "ivanov@example.com", "password1": "Sl0zhny-parol", "password2": "Sl0zhny-parol",
+            "last_name": "Иванов", "first_name": "Пётр", "gender": "male", "birth_date": "1980-01-01",
+            "phone": "9161234567", "consent_personal": "on", "subscribe_promotions": "on",
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+        lookup = CustomUser.objects.filter(phone_key=form.cleaned_data["phone"], role="patient", is_active=False)
+        self.assertIn("user_phone_key_idx", lookup.explain())
+        guest = lookup.get()
+        user = form.save(RequestFactory().post("/"))
+
+        self.assertEqual(user.pk, guest.pk)
+        self.assertTrue(user.is_active)
+        # Второй раз тот же номер не регистрируется
+        form = CustomSignupForm(data={"phone": "+79161234567"})
+        form.is_valid()
+        self.assertIn("phone", form.errors)
+
+    def test_merge_command_backfills_and_merges_guests(self):
+        doctor = Doctor.objects.create(last_name="Павлов", first_name="Иван", specialization="Терапевт", start_work_year=2000)
+        # Записи до появления phone_key: bulk_create в обход save()
+        active, guest, other_guest, twin = CustomUser.objects.bulk_create([
+            CustomUser(username="active", role="patient", phone="8 (916) 123-45-67", is_active=True),
+            CustomUser(username="guest", role="patient", phone="+7 916 1234567", is_active=False),
+            CustomUser(username="guest2", role="patient", phone="9035550000", is_active=False),
+            CustomUser(username="twin", role="patient", phone="89035550000", is_active=False),
+        ])
+        slot = Schedule.objects.create(
+            doctor=doctor, date=date.today(), start_time=time(9), end_time=time(9, 30), status="completed", booked_by=guest
+        )
+
+        out = StringIO()
+        call_command("merge_patient_phones", "--dry-run", stdout=out)
+        self.assertIn("слито дублей: 2", out.getvalue())
+        self.assertEqual(CustomUser.objects.filter(role="patient").count(), 4)
+
+        call_command("merge_patient_phones", "--chunk-size", "2", stdout=StringIO())
+
+        self.assertEqual(
+            set(CustomUser.objects.filter(role="patient").values_list("username", "phone_key")),
+            {("active", "+79161234567"), ("guest2", "+79035550000")},
+        )
+        slot.refresh_from_db()
+        self.assertEqual(slot.booked_by_id, active.id)
+        self.assertEqual(CustomUser.objects.get(username="guest2").phone, "+79035550000")
+
+    def test_save_keeps_conflicting_key_cleared(self):
+        CustomUser.objects.bulk_create([
+            CustomUser(username="first", role="patient", phone="+79161234567", is_active=True),
+            CustomUser(username="second", role="patient", phone="89161234567", is_active=True),
+        ])
+        call_command("merge_patient_phones", stdout=StringIO())
+
+        second = CustomUser.objects.get(username="second", phone_key=None)
+        second.first_name = "пётр"
+        second.save()
+        self.assertIsNone(CustomUser.objects.get(pk=second.pk).phone_key)
+
+        # Новый номер - ключ пересчитывается
+        second.phone = "+79035550000"
+        second.save()
+        self.assertEqual(CustomUser.objects.get(pk=second.pk).phone_key, "+79035550000")
+
+    def test_taken_phone_is_a_form_error(self):
+        CustomUser.objects.create(username="first", role="patient", phone="+79161234567", is_active=True)
+        self.client.logout()
+        # Номер заняли между проверкой формы и записью
+        with patch.object(CustomSignupForm, "clean_phone", lambda form: "+79161234567"):
+            response = self.client.post(reverse("account_signup"), {
+                "email": "ivanov@example.com", "password1": "Sl0zhny-parol", "password2": "Sl0zhny-parol",
+                "last_name": "Иванов", "first_name": "Пётр", "gender": "male", "birth_date": "1980-01-01",
+                "phone": "+79161234567", "consent_personal": "on", "subscribe_promotions": "on",
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("phone", response.context["form"].errors)
+        self.assertEqual(CustomUser.objects.filter(phone_key="+79161234567").count(), 1)
@@ -9,6 +9,8 @@ from .views import (
                     MyAppointmentsView, ScheduleUpdateView,
                     ScheduleDeleteView, AdminPatientsListView,
                     AdminPatientDetailView, new_requests_count_api,
+                    new_requests_stream, llm_metrics_api,
+                    availability_api,
 )
 
 app_name = 'users'
@@ -33,5 +35,8 @@ urlpatterns = [
     path('profile/schedules/requests/<int:pk>/cancel/', cancel_request, name="cancel_request"),
     path('profile/my-appointments/', MyAppointmentsView.as_view(), name="my_appointments"),
     path('api/new_requests_count/', new_requests_count_api, name='new_requests_count_api'),
+    path('api/new_requests_stream/', new_requests_stream, name='new_requests_stream'),
+    path('api/llm_metrics/', llm_metrics_api, name='llm_metrics_api'),
+    path('api/availability/', availability_api, name='availability_api'),
     
 ]
@@ -1,9 +1,9 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 import uuid
 from django.utils import timezone
 from django.shortcuts import redirect, render
 from allauth.account.views import SignupView
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import etag, require_POST
 from core.signals import send_confirmation_email
 from .forms import AdminPatientForm, CustomSignupForm, ProfileForm, ScheduleForm
 from django.contrib import messages
@@ -16,18 +16,29 @@ from django.views.generic import (
     View,
 )
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from core.models import Schedule, Doctor
+from core.models import Schedule, Doctor, ShiftTemplate
 from users.models import CustomUser
 from django.urls import reverse_lazy
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from django.http import JsonResponse
-from django.contrib.auth.decorators import user_passes_test
-from core.utils.telegram import send_telegram_message
+from django.db.models import Count, Q
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.utils.dateparse import parse_date
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.auth.decorators import login_required, user_passes_test
+from core.utils.admission import llm_limiter
+from core.utils.availability import refresh_doctor_availability
+from core.utils.patient_search import search_patients
+from core.utils.pending_requests import get_pending_count, pending_requests_events
+from core.utils.shifts import set_shifts_status
+from core.utils.specializations import specialization_index
+from core.utils.telegram import enqueue_telegram_message
+from django.db import IntegrityError, transaction
 
 
 # Helper для фильтрации врачей в списке
-def get_available_slots_queryset(doctor_slug=None):
+def get_available_slots_queryset(doctor_slug=None, date_to=None):
     today = timezone.localdate()
     current_time = timezone.localtime().time()
 
@@ -42,6 +53,8 @@ def get_available_slots_queryset(doctor_slug=None):
 
     if doctor_slug:
         qs = qs.filter(doctor__slug=doctor_slug)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
 
     return qs
 
@@ -56,12 +69,21 @@ def group_slots_by_doctor_and_date(slots):
     return doctors
 
 
+PHONE_TAKEN = "Этот номер уже зарегистрирован у другого пациента"
+
+
 # Кастомная регистрация пациента
 class CustomSignupView(SignupView):
     form_class = CustomSignupForm
 
     def form_valid(self, form):
-        response = super().form_valid(form)
+        # Номер мог занять параллельный запрос после проверки в форме
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except IntegrityError:
+            form.add_error("phone", PHONE_TAKEN)
+            return self.form_invalid(form)
         messages.success(
             self.request, "На ваш email отправлено письмо с подтверждением."
         )
@@ -89,45 +111,161 @@ class AdminRequiredMixin(UserPassesTestMixin):
         return self.request.user.is_staff
 
 
-# Список расписаний врачей для админа
+# Курсор страницы расписания: последний показанный слот (врач, дата, начало)
+def encode_schedule_cursor(slot):
+    return f"{slot.doctor_id}_{slot.date.isoformat()}_{slot.start_time.isoformat()}"
+
+
+def decode_schedule_cursor(value):
+    try:
+        doctor_id, day, start = value.split("_")
+        return int(doctor_id), date.fromisoformat(day), time.fromisoformat(start)
+    except (AttributeError, ValueError):
+        return None
+
+
+# Дата из параметра запроса; пустая или некорректная (2026-02-30, 2026-13-01) - None
+def parse_day(value):
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
+# Список расписаний врачей для админа: по умолчанию с сегодняшнего дня,
+# постранично по ключу (врач, дата, начало) - время ответа не растёт с историей
 class ScheduleListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
     model = Schedule
     template_name = "admin_panel/admin_schedule_list.html"
     context_object_name = "schedules"
 
-    # Все графики и сортировка
-    def get_queryset(self):
-        qs = Schedule.objects.select_related("doctor", "booked_by").order_by(
-            "doctor__last_name", "date", "start_time"
-        )
-
-        doctor = self.request.GET.get("doctor")
-        date = self.request.GET.get("date")
-        status = self.request.GET.get("status")
+    def get_filters(self):
+        params = self.request.GET
+        # Старый параметр date - один день
+        day = parse_day(params.get("date"))
+        date_from = day or parse_day(params.get("date_from"))
+        date_to = day or parse_day(params.get("date_to"))
+        # Пустое date_from - без нижней границы; нет параметра или дата некорректна - с сегодняшнего дня
+        if date_from is None and params.get("date_from") != "":
+            date_from = timezone.localdate()
+        return {
+            "doctor": params.get("doctor") if (params.get("doctor") or "").isdigit() else "",
+            "status": params.get("status") if params.get("status") in dict(Schedule.STATUS_CHOICES) else "",
+            "date_from": date_from,
+            "date_to": date_to,
+        }
+
+    # Слоты в диапазоне дат (без фильтров по врачу и статусу - они считаются фасетами)
+    def base_queryset(self):
+        qs = Schedule.objects.all()
+        if self.filters["date_from"]:
+            qs = qs.filter(date__gte=self.filters["date_from"])
+        if self.filters["date_to"]:
+            qs = qs.filter(date__lte=self.filters["date_to"])
+        return qs
 
-        if doctor:
-            qs = qs.filter(doctor_id=doctor)
-        if date:
-            qs = qs.filter(date=date)
-        if status:
-            qs = qs.filter(status=status)
+    def get_queryset(self):
+        self.filters = self.get_filters()
+        qs = self.base_queryset().select_related("doctor", "booked_by").order_by("doctor_id", "date", "start_time")
+
+        if self.filters["doctor"]:
+            qs = qs.filter(doctor_id=self.filters["doctor"])
+        if self.filters["status"]:
+            qs = qs.filter(status=self.filters["status"])
+
+        cursor = decode_schedule_cursor(self.request.GET.get("after"))
+        if cursor:
+            doctor_id, day, start = cursor
+            qs = qs.filter(
+                Q(doctor_id__gt=doctor_id)
+                | Q(doctor_id=doctor_id, date__gt=day)
+                | Q(doctor_id=doctor_id, date=day, start_time__gt=start)
+            )
 
-        return qs
+        page_size = settings.ADMIN_SCHEDULE_PAGE_SIZE
+        page = list(qs[: page_size + 1])
+        self.next_cursor = encode_schedule_cursor(page[page_size - 1]) if len(page) > page_size else None
+        return page[:page_size]
+
+    # Счётчики по статусам и врачам одним GROUP BY
+    def get_facets(self):
+        by_status, by_doctor = {}, {}
+        rows = self.base_queryset().values_list("doctor_id", "status").annotate(count=Count("id")).order_by()
+        for doctor_id, status, count in rows:
+            if not self.filters["doctor"] or str(doctor_id) == self.filters["doctor"]:
+                by_status[status] = by_status.get(status, 0) + count
+            if not self.filters["status"] or status == self.filters["status"]:
+                by_doctor[doctor_id] = by_doctor.get(doctor_id, 0) + count
+        return by_status, by_doctor
+
+    def page_url(self, **changes):
+        params = self.request.GET.copy()
+        params.pop("after", None)
+        params.pop("date", None)
+        params["date_from"] = self.filters["date_from"].isoformat() if self.filters["date_from"] else ""
+        params["date_to"] = self.filters["date_to"].isoformat() if self.filters["date_to"] else ""
+        for key, value in changes.items():
+            params[key] = value
+        return f"?{params.urlencode()}"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        by_status, by_doctor = self.get_facets()
+
+        doctors = list(Doctor.objects.only("id", "last_name", "first_name", "patronymic"))
+        for doctor in doctors:
+            doctor.slot_count = by_doctor.get(doctor.id, 0)
 
-        context["doctors"] = Doctor.objects.all()
+        context["doctors"] = doctors
         context["status_choices"] = Schedule.STATUS_CHOICES
+        context["weekday_choices"] = ShiftTemplate.WEEKDAY_CHOICES
+        context["status_facets"] = [
+            (value, label, by_status.get(value, 0)) for value, label in Schedule.STATUS_CHOICES
+        ]
+        context["filters"] = self.filters
+        context["next_page_url"] = self.page_url(after=self.next_cursor) if self.next_cursor else None
+        context["first_page_url"] = self.page_url() if self.request.GET.get("after") else None
 
         return context
 
 
+def new_requests_etag(request):
+    return str(get_pending_count())
+
+
 # Декоратор: только админ (для подсчета запросов)
+# Число берётся из кэша, неизменившееся число отдаётся как 304 по ETag
+# (без подсчёта заявок; с кэшем в таблице БД - одно чтение django_cache)
 @user_passes_test(lambda u: u.is_staff)
+@etag(new_requests_etag)
 def new_requests_count_api(request):
-    count = Schedule.objects.filter(status="booked").count()
-    return JsonResponse({"count": count})
+    response = JsonResponse({"count": get_pending_count()})
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# Нагрузка на ИИ-ассистента: занятые слоты, очередь и отказы (для подбора числа воркеров)
+@user_passes_test(lambda u: u.is_staff)
+def llm_metrics_api(request):
+    response = JsonResponse(llm_limiter.metrics())
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+# Поток SSE с числом заявок (нужен ASGI-сервер; иначе 204 и клиент переходит на опрос API)
+async def new_requests_stream(request):
+    user = await request.auser()
+    if not user.is_staff:
+        return HttpResponse(status=403)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        pending_requests_events(), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 # Создание расписания врачей
@@ -155,7 +293,10 @@ class ScheduleCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
             )
             start += timedelta(minutes=30)
 
-        Schedule.objects.bulk_create(slots)
+        # Уже существующие слоты дня пропускаются, а не роняют всю вставку
+        Schedule.objects.bulk_create(slots, ignore_conflicts=True)
+        # bulk_create не вызывает сигналы - сводку врача обновляем явно
+        refresh_doctor_availability([work_day.doctor_id])
         return redirect(self.success_url)
 
 
@@ -167,8 +308,6 @@ class ScheduleUpdateView(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
     success_url = reverse_lazy("users:admin_schedule_list")
 
     def form_valid(self, form):
-        old_appointment = Schedule.objects.get(pk=self.object.pk)
-
         appointment = form.save(commit=False)
 
         if appointment.status == "available":
@@ -178,16 +317,20 @@ class ScheduleUpdateView(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
             appointment.status = "completed"
             appointment.completed_at = timezone.now()
 
+        # Переход в "подтверждено" обрабатывает сигнал, здесь - смена пациента в подтверждённой записи
+        patient_changed = (
+            appointment.status == "confirmed"
+            and appointment.status_transition is None
+            and appointment.booked_by_changed
+        )
+
         appointment.save()
 
-        if appointment.status == "confirmed":
-            if (
-                not old_appointment.booked_by
-                or old_appointment.booked_by != appointment.booked_by
-            ):
-                send_confirmation_email(appointment)
+        if patient_changed:
+            send_confirmation_email(appointment)
 
-        return super().form_valid(form)
+        self.object = appointment
+        return redirect(self.get_success_url())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -208,19 +351,78 @@ class AvailableScheduleListView(LoginRequiredMixin, ListView):
     template_name = "profile/available_schedule.html"
     context_object_name = "schedules"
 
+    # Неделя (PATIENT_SCHEDULE_DAYS) с даты start: объём страницы не зависит от того,
+    # на сколько вперёд сгенерированы слоты
+    def get_window(self):
+        today = timezone.localdate()
+        start = max(parse_day(self.request.GET.get("start")) or today, today)
+        return start, start + timedelta(days=settings.PATIENT_SCHEDULE_DAYS - 1)
+
     # Доступные слоты
     def get_queryset(self):
+        self.start, self.end = self.get_window()
         doctor_slug = self.kwargs.get("doctor_slug")
-        return get_available_slots_queryset(doctor_slug)
+        return get_available_slots_queryset(doctor_slug, date_to=self.end).filter(date__gte=self.start)
 
-    # Группировка по врачам
+    # Группировка по врачам (по уже выбранным слотам, без повторного запроса)
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context["doctors"] = group_slots_by_doctor_and_date(context["schedules"])
+        days = timedelta(days=settings.PATIENT_SCHEDULE_DAYS)
+        context["window_start"], context["window_end"] = self.start, self.end
+        context["next_start"] = self.start + days
+        if self.start > timezone.localdate():
+            context["previous_start"] = max(self.start - days, timezone.localdate())
+        return context
 
-        slots = self.get_queryset()
 
-        context["doctors"] = group_slots_by_doctor_and_date(slots)
-        return context
+# Свободное время за окно дат для календаря: {врач: {день: [[id слота, "ЧЧ:ММ"], ...]}}.
+# Параметры: doctor (slug) или specialization, start (по умолчанию сегодня), days
+def availability_api(request):
+    today = timezone.localdate()
+    start = max(parse_day(request.GET.get("start")) or today, today)
+    try:
+        days = int(request.GET.get("days", 7))
+    except ValueError:
+        days = 7
+    days = min(max(days, 1), settings.AVAILABILITY_API_MAX_DAYS)
+    end = start + timedelta(days=days - 1)
+
+    doctors = Doctor.objects.order_by("last_name", "first_name")
+    if request.GET.get("doctor"):
+        doctors = doctors.filter(slug=request.GET["doctor"])
+    elif request.GET.get("specialization"):
+        doctors = doctors.filter(specialization__in=specialization_index.lookup(request.GET["specialization"]))
+    doctors = list(doctors.values_list("id", "slug", "last_name", "first_name", "patronymic", "specialization"))
+
+    slots = (
+        get_available_slots_queryset(date_to=end)
+        .filter(date__gte=start, doctor_id__in=[doctor[0] for doctor in doctors])
+        .values_list("doctor_id", "date", "start_time", "id")
+    )
+    days_by_doctor = {}
+    for doctor_id, day, start_time, slot_id in slots:
+        days_by_doctor.setdefault(doctor_id, {}).setdefault(day.isoformat(), []).append(
+            [slot_id, start_time.strftime("%H:%M")]
+        )
+
+    response = JsonResponse({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "doctors": [
+            {
+                "slug": slug,
+                "name": " ".join(filter(None, [last_name, first_name, patronymic])),
+                "specialization": specialization,
+                "days": days_by_doctor.get(doctor_id, {}),
+            }
+            for doctor_id, slug, last_name, first_name, patronymic, specialization in doctors
+        ],
+    })
+    # Короткий кэш: занятость слота всё равно проверяется при записи
+    patch_cache_control(response, public=True, max_age=settings.AVAILABILITY_API_MAX_AGE)
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response["ETag"], response=response)
 
 
 # Подтверждение записи при выборе времени
@@ -230,12 +432,12 @@ def confirm_appointment_view(request, slot_id):
     return render(request, "profile/confirm_appointment.html", {"slot": slot})
 
 
-# Запись пациента на слот + уведомление для админа в тг
+# Запись пациента на слот + уведомление для админа в тг.
+# Слот занимается условным UPDATE - при одновременных нажатиях запишется только один пациент
+@require_POST
+@login_required
 def book_appointment(request, slot_id):
-    slot = get_object_or_404(Schedule, id=slot_id, status="available")
-    slot.booked_by = request.user
-    slot.status = "booked"
-    slot.save()
+    slot = get_object_or_404(Schedule.objects.select_related("doctor"), id=slot_id)
 
     patient_name = " ".join(
         [
@@ -245,14 +447,20 @@ def book_appointment(request, slot_id):
         ]
     )
 
-    send_telegram_message(
-        f"🩺 <b>Новая запись</b>\n"
-        f"Пациент: {patient_name}\n"
-        f"Номер телефона: {request.user.phone}\n"
-        f"Врач: {slot.doctor}\n"
-        f"Дата: {slot.date}\n"
-        f"Время: {slot.start_time}"
-    )
+    # Уведомление уходит в очередь вместе с записью, отправляет его telegram_worker
+    with transaction.atomic():
+        if not slot.book(request.user):
+            messages.error(request, "Это время уже занято, выберите другое")
+            return redirect("users:available_schedule")
+
+        enqueue_telegram_message(
+            f"🩺 <b>Новая запись</b>\n"
+            f"Пациент: {patient_name}\n"
+            f"Номер телефона: {request.user.phone}\n"
+            f"Врач: {slot.doctor}\n"
+            f"Дата: {slot.date}\n"
+            f"Время: {slot.start_time}"
+        )
 
     messages.success(
         request, f"Вы записаны к {slot.doctor} на {slot.date} в {slot.start_time}"
@@ -274,10 +482,9 @@ class ScheduleRequestsView(LoginRequiredMixin, AdminRequiredMixin, ListView):
 def confirm_request(request, pk):
     slot = get_object_or_404(Schedule, id=pk)
     if slot.status != "confirmed":
+        # Письмо пациенту отправляет обработчик перехода в "подтверждено"
         slot.status = "confirmed"
-        slot.save()
-
-        send_confirmation_email(slot)
+        slot.save(update_fields=["status"])
 
     messages.success(request, "Запись подтверждена")
     return redirect("users:schedule_requests")
@@ -288,7 +495,7 @@ def cancel_request(request, pk):
     slot = get_object_or_404(Schedule, id=pk)
     slot.status = "available"
     slot.booked_by = None
-    slot.save()
+    slot.save(update_fields=["status", "booked_by"])
     messages.success(request, "Запись отменена")
     return redirect("users:schedule_requests")
 
@@ -339,26 +546,52 @@ class AdminPatientsListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
     template_name = "admin_panel/patients_list.html"
     context_object_name = "patients"
 
-    # Фильтр пациентов по поиску
+    # Страница пациентов: по запросу - в порядке релевантности (поисковый индекс),
+    # без запроса - по фамилии. Листание по ключу: курсор after - последний показанный
     def get_queryset(self):
-        queryset = CustomUser.objects.filter(role="patient")
+        query = self.request.GET.get("q", "").strip()
+        after = self.request.GET.get("after", "")
+        page_size = settings.ADMIN_PATIENTS_PAGE_SIZE
 
-        query = self.request.GET.get("q")
         if query:
-            query = query.lower().strip()
-        if query:
-            queryset = queryset.filter(
-                Q(last_name__icontains=query)
-                | Q(first_name__icontains=query)
-                | Q(phone__icontains=query)
-            )
-
-        return queryset.order_by("last_name", "first_name")  # Сортировка
-
-    # Запрос поиска
+            try:
+                window, score, patient_id = after.split("_")
+                cursor = (int(window), float(score), int(patient_id))
+            except ValueError:
+                cursor = None
+            found = search_patients(query, page_size + 1, cursor)
+            if len(found) > page_size:
+                last, (window, score) = found[page_size - 1]
+                self.next_cursor = f"{window}_{score!r}_{last.id}"
+            else:
+                self.next_cursor = None
+            return [patient for patient, _ in found[:page_size]]
+
+        patients = CustomUser.objects.filter(role="patient").order_by("last_name", "id")
+        last = None
+        if after.isdigit():
+            last = CustomUser.objects.filter(role="patient", id=after).values_list("last_name", "id").first()
+        if last:
+            last_name, patient_id = last
+            # NULL в SQLite идёт первым
+            if last_name is None:
+                patients = patients.filter(Q(last_name__isnull=True, id__gt=patient_id) | Q(last_name__isnull=False))
+            else:
+                patients = patients.filter(Q(last_name__gt=last_name) | Q(last_name=last_name, id__gt=patient_id))
+
+        page = list(patients[: page_size + 1])
+        self.next_cursor = str(page[page_size - 1].id) if len(page) > page_size else None
+        return page[:page_size]
+
+    # Запрос поиска и ссылка на следующую страницу
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["query"] = self.request.GET.get("q", "")
+        if self.next_cursor:
+            params = self.request.GET.copy()
+            params["after"] = self.next_cursor
+            context["next_page_url"] = f"?{params.urlencode()}"
+        context["is_first_page"] = not self.request.GET.get("after")
         return context
 
 
@@ -380,31 +613,43 @@ class AdminPatientDetailView(LoginRequiredMixin, AdminRequiredMixin, DetailView)
         return context
 
 
-# Закрытие/открытие смены врача
+# Закрытие/открытие смен: несколько врачей, период (date_from-date_to или один date)
+# и, при желании, только выбранные дни недели. Записи пациентов не трогаются
 @require_POST
 @user_passes_test(lambda u: u.is_staff)
 def toggle_day_status(request):
-    doctor_id = request.POST.get("doctor")
-    date_str = request.POST.get("date")
+    doctor_ids = [int(pk) for pk in request.POST.getlist("doctor") if pk.isdigit()]
+    date_from = parse_day(request.POST.get("date_from") or request.POST.get("date"))
+    # Без date_to - один день; некорректная дата - ошибка, а не молча один день
+    date_to = parse_day(request.POST["date_to"]) if request.POST.get("date_to") else date_from
+    weekdays = [int(day) for day in request.POST.getlist("weekday") if day.isdigit() and int(day) < 7]
     action = request.POST.get("action")
 
-    if not doctor_id or not date_str or action not in ("close", "open"):
+    if not doctor_ids or not date_from or not date_to or date_to < date_from or action not in ("close", "open"):
         messages.error(request, "Некорректные данные")
         return redirect("users:admin_schedule_list")
 
-    new_status = "closed" if action == "close" else "available"
-
-    updated = (
-        Schedule.objects.filter(doctor_id=doctor_id, date=date_str)
-        .exclude(status="booked")
-        .exclude(status="confirmed")
-        .update(status=new_status)
-    )
+    report = set_shifts_status(action, doctor_ids, date_from, date_to, weekdays)
 
-    msg = f"Смена {date_str} {'закрыта' if action == 'close' else 'открыта'} ({updated} слотов)"
-    messages.success(request, msg) if updated else messages.info(
-        request, "Нечего менять"
-    )
+    period = str(date_from) if date_to == date_from else f"{date_from} - {date_to}"
+    names = {doctor.id: str(doctor) for doctor in Doctor.objects.filter(id__in=report)}
+    updated = sum(row["changed"] for row in report.values())
+    if updated:
+        messages.success(
+            request, f"Смены {period} {'закрыты' if action == 'close' else 'открыты'} ({updated} слотов)"
+        )
+    else:
+        messages.info(request, "Нечего менять")
+
+    for doctor_id, row in report.items():
+        if row["changed"] and len(report) > 1:
+            messages.info(request, f"{names.get(doctor_id, doctor_id)}: {row['changed']} слотов")
+        if row["blocking"]:
+            bookings = ", ".join(
+                f"{slot.date} {slot.start_time:%H:%M} ({slot.booked_by or 'без пациента'})"
+                for slot in row["blocking"]
+            )
+            messages.warning(request, f"{names.get(doctor_id, doctor_id)}: остаются записи - {bookings}")
 
     return redirect("users:admin_schedule_list")
 
@@ -419,12 +664,7 @@ class SearchPatientsView(UserPassesTestMixin, View):
         if len(q) < 2:
             return JsonResponse({"results": []})
 
-        patients = CustomUser.objects.filter(role="patient").filter(
-            Q(last_name__icontains=q)
-            | Q(first_name__icontains=q)
-            | Q(patronymic__icontains=q)
-            | Q(phone__icontains=q)
-        )[:20]
+        patients = [patient for patient, _ in search_patients(q, 20)]
 
         results = [
             {
@@ -452,14 +692,29 @@ class AdminPatientCreateView(LoginRequiredMixin, AdminRequiredMixin, View):
                 request, "admin_panel/admin_patient_form.html", {"patient_form": form}
             )
 
+        # Пациент с этим телефоном уже есть - новую (дублирующую) запись не создаём
+        existing = CustomUser.objects.filter(phone_key=form.cleaned_data["phone"], role="patient").order_by("id").first()
+        if existing:
+            messages.info(request, f"Пациент с этим номером уже есть: {existing}")
+        else:
+            try:
+                with transaction.atomic():
+                    self.create_guest(form)
+            except IntegrityError:
+                form.add_error("phone", PHONE_TAKEN)
+                return render(
+                    request, "admin_panel/admin_patient_form.html", {"patient_form": form}
+                )
+
+        schedule_pk = self.request.POST.get("schedule_pk")
+        if schedule_pk:
+            return redirect("users:admin_schedule_edit", pk=schedule_pk)
+        return redirect("users:admin_patients_list")
+
+    def create_guest(self, form):
         user = form.save(commit=False)
         user.role = "patient"
         user.is_active = False
         user.username = f"guest_{user.phone or uuid.uuid4().hex[:8]}"
         user.set_unusable_password()
         user.save()
-
-        schedule_pk = self.request.POST.get("schedule_pk")
-        if schedule_pk:
-            return redirect("users:admin_schedule_edit", pk=schedule_pk)
-        return redirect("users:admin_patients_list")